@@ -8,12 +8,14 @@ Data: Novembro 2025
 
 import os
 import json
+import math
 import requests
 import pandas as pd
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Callable, Optional
 import time
 from tqdm import tqdm
+from pipeline_utils import import_script
 
 
 class XenoCantoDownloader:
@@ -228,6 +230,215 @@ class XenoCantoDownloader:
         return df
 
 
+class AcquisitionPlanner:
+    """
+    Aquisição guiada por orçamento de segmentos
+    
+    Em vez de baixar um número fixo de gravações na ordem da API, ordena os
+    candidatos pelos metadados da busca (qualidade, duração, diversidade de
+    gravadores), baixa em ordem de prioridade e, a cada gravação, recebe
+    de volta quantos segmentos utilizáveis (não silenciosos) ela rendeu.
+    A espécie para assim que atinge a meta de segmentos: espécies abundantes
+    gastam menos banda e disco, e as raras continuam até esgotar a busca.
+    """
+    
+    QUALITY_WEIGHTS = {'A': 1.0, 'B': 0.8, 'C': 0.5, 'D': 0.3, 'E': 0.1}
+    
+    def __init__(self,
+                 downloader: XenoCantoDownloader,
+                 segment_counter: Callable[[Path, str], int],
+                 target_segments: int = 300,
+                 segment_seconds: float = 3.0,
+                 max_recordings: int = 500,
+                 recordist_penalty: float = 0.5,
+                 exclude: Optional[set] = None):
+        """
+        Inicializa o planejador
+        
+        Args:
+            downloader: Downloader usado para busca e download
+            segment_counter: Função (arquivo de áudio, espécie) -> segmentos
+                utilizáveis; tipicamente AudioPreprocessor.process_audio_file
+            target_segments: Segmentos utilizáveis desejados por espécie
+            segment_seconds: Duração de um segmento (s)
+            max_recordings: Limite de gravações por espécie
+            recordist_penalty: Penalidade por gravação já escolhida do mesmo gravador
+            exclude: Gravações a ignorar, como 'Especie/XC123.mp3' (ex: duplicatas)
+        """
+        self.downloader = downloader
+        self.segment_counter = segment_counter
+        self.target_segments = target_segments
+        self.segment_seconds = segment_seconds
+        self.max_recordings = max_recordings
+        self.recordist_penalty = recordist_penalty
+        self.exclude = exclude or set()
+    
+    @staticmethod
+    def parse_length(length: str) -> float:
+        """
+        Converte a duração do Xeno-canto ('m:ss' ou 'h:mm:ss') em segundos
+        """
+        try:
+            seconds = 0.0
+            for part in str(length).split(':'):
+                seconds = seconds * 60 + float(part)
+            return seconds
+        except ValueError:
+            return 0.0
+    
+    def score(self, recording: Dict) -> float:
+        """
+        Prioridade de uma gravação pelos metadados da busca
+        
+        Qualidade multiplicada pelo rendimento esperado de segmentos, com
+        retorno decrescente para que gravações muito longas (um único local
+        e noite) não dominem.
+        """
+        expected_segments = self.parse_length(recording.get('length', '')) / self.segment_seconds
+        if expected_segments < 1:
+            return 0.0
+        quality = self.QUALITY_WEIGHTS.get(str(recording.get('q', '')).upper(), 0.4)
+        return quality * math.log1p(expected_segments)
+    
+    def rank(self, recordings: List[Dict]) -> List[Dict]:
+        """
+        Ordena os candidatos por prioridade, favorecendo gravadores diferentes
+        
+        Args:
+            recordings: Resultado da busca
+            
+        Returns:
+            Candidatos em ordem de download (sem os curtos demais)
+        """
+        candidates = [(self.score(r), r) for r in recordings]
+        candidates = [(s, r) for s, r in candidates if s > 0]
+        
+        ranked, per_recordist = [], {}
+        while candidates:
+            # Escolha gulosa: o score cai a cada gravação do mesmo gravador
+            best = max(range(len(candidates)), key=lambda i: candidates[i][0] / (
+                1 + self.recordist_penalty * per_recordist.get(candidates[i][1].get('rec'), 0)))
+            _, recording = candidates.pop(best)
+            per_recordist[recording.get('rec')] = per_recordist.get(recording.get('rec'), 0) + 1
+            ranked.append(recording)
+        
+        return ranked[:self.max_recordings]
+    
+    def acquire_species(self, species_name: str, country: str = "Brazil", quality: str = "C") -> Dict:
+        """
+        Baixa gravações de uma espécie até atingir a meta de segmentos
+        
+        Os segmentos de cada gravação ficam em acquisition.json na pasta da
+        espécie, então uma nova execução não reprocessa o que já foi contado.
+        
+        Args:
+            species_name: Nome científico da espécie
+            country: País
+            quality: Piso de qualidade da busca; acima dele a qualidade só
+                pesa na ordenação (score), então gravações B/C longas ainda
+                entram quando as A não bastam para a meta
+            
+        Returns:
+            Dicionário com estatísticas da aquisição
+        """
+        species_safe_name = species_name.replace(" ", "_")
+        species_dir = self.downloader.output_dir / species_safe_name
+        species_dir.mkdir(parents=True, exist_ok=True)
+        
+        state_path = species_dir / "acquisition.json"
+        counted = {}
+        if state_path.exists():
+            with open(state_path, 'r', encoding='utf-8') as f:
+                counted = json.load(f)
+        
+        print(f"\n📦 Processando: {species_name} (meta: {self.target_segments} segmentos)")
+        
+        recordings = self.downloader.search_species(
+            species_name, country=country, quality=quality, max_results=self.max_recordings * 4
+        )
+        ranked = self.rank(recordings)
+        
+        segments, downloaded, failed, used, excluded = 0, 0, 0, 0, 0
+        for recording in ranked:
+            if segments >= self.target_segments:
+                break
+            
+            xc_id = str(recording.get("id"))
+            if f"{species_safe_name}/XC{xc_id}.mp3" in self.exclude:
+                # Duplicata (08_deduplicate_audio.py): não rende segmentos novos
+                excluded += 1
+                continue
+            
+            if xc_id not in counted:
+                if not self.downloader.download_recording(recording, species_dir):
+                    failed += 1
+                    continue
+                downloaded += 1
+                counted[xc_id] = int(self.segment_counter(species_dir / f"XC{xc_id}.mp3", species_safe_name))
+                
+                with open(state_path, 'w', encoding='utf-8') as f:
+                    json.dump(counted, f, indent=2)
+                
+                # Rate limiting (ser gentil com o servidor)
+                time.sleep(0.5)
+            
+            segments += counted[xc_id]
+            used += 1
+            print(f"   XC{xc_id}: {counted[xc_id]} segmentos (total {segments}/{self.target_segments})")
+        
+        summary = {
+            "species": species_name,
+            "total_found": len(recordings),
+            "candidates": len(ranked),
+            "downloaded": downloaded,
+            "used": used,
+            "failed": failed,
+            "excluded": excluded,
+            "segments": segments,
+            "target_reached": segments >= self.target_segments,
+            "skipped": len(ranked) - used - failed - excluded,
+            "country": country,
+            "quality": quality
+        }
+        
+        with open(species_dir / "download_summary.json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        
+        status = "✅ Meta atingida" if summary["target_reached"] else "⚠️  Meta não atingida (busca esgotada)"
+        print(f"{status}: {segments} segmentos de {used} gravações ({summary['skipped']} candidatos não baixados)")
+        
+        return summary
+    
+    def acquire_multiple_species(self, species_list: List[str], quality: str = "C") -> pd.DataFrame:
+        """
+        Aquisição guiada por orçamento para várias espécies
+        
+        Args:
+            species_list: Lista de nomes científicos
+            quality: Piso de qualidade da busca (ver acquire_species)
+            
+        Returns:
+            DataFrame com resumo da aquisição
+        """
+        results = []
+        for species in species_list:
+            results.append(self.acquire_species(species, quality=quality))
+            
+            # Pausa entre espécies
+            time.sleep(2)
+        
+        df = pd.DataFrame(results)
+        df.to_csv(self.downloader.output_dir / "dataset_summary.csv", index=False)
+        
+        print("\n" + "="*60)
+        print("📊 RESUMO GERAL DA AQUISIÇÃO")
+        print("="*60)
+        print(df[["species", "used", "segments", "target_reached", "skipped"]].to_string(index=False))
+        print(f"\nTotal de gravações baixadas: {df['downloaded'].sum()}")
+        
+        return df
+
+
 def main():
     """
     Função principal de exemplo
@@ -248,9 +459,57 @@ def main():
     OUTPUT_DIR = "./backend/data/raw"
     RECORDINGS_PER_SPECIES = 50  # Começar pequeno para teste
     
+    # Aquisição guiada por orçamento (processa cada gravação ao baixar)
+    BUDGET_MODE = False  # True = parar cada espécie ao atingir a meta de segmentos
+    TARGET_SEGMENTS_PER_SPECIES = 300
+    SPECTROGRAM_DIR = "./backend/data/processed/spectrograms"
+    DUPLICATES_FILE = "./backend/data/raw/duplicates.json"  # Gerado por 08_deduplicate_audio.py
+    
     # Inicializar downloader
     downloader = XenoCantoDownloader(output_dir=OUTPUT_DIR)
     
+    if BUDGET_MODE:
+        preprocessing = import_script('02_preprocess_audio')
+        preprocessor = preprocessing.AudioPreprocessor()
+        
+        exclude = None
+        if Path(DUPLICATES_FILE).exists():
+            with open(DUPLICATES_FILE, 'r', encoding='utf-8') as f:
+                exclude = set(json.load(f)['exclude'])
+            print(f"🧹 {len(exclude)} gravações duplicadas serão ignoradas ({DUPLICATES_FILE})")
+        
+        planner = AcquisitionPlanner(
+            downloader,
+            segment_counter=lambda audio_path, species: preprocessor.process_audio_file(
+                str(audio_path), str(Path(SPECTROGRAM_DIR) / species)
+            ),
+            target_segments=TARGET_SEGMENTS_PER_SPECIES,
+            exclude=exclude
+        )
+        
+        print("🐸 Iniciando aquisição guiada por orçamento...")
+        print(f"📝 Espécies: {len(SPECIES_LIST)}")
+        print(f"🎯 Meta: {TARGET_SEGMENTS_PER_SPECIES} segmentos de {preprocessor.duration}s por espécie\n")
+        
+        df_summary = planner.acquire_multiple_species(SPECIES_LIST)
+        
+        # Mesmo formato de AudioPreprocessor.process_dataset (lido pelo treino)
+        species_names = [name.replace(" ", "_") for name in df_summary["species"]]
+        Path(SPECTROGRAM_DIR).mkdir(parents=True, exist_ok=True)
+        with open(Path(SPECTROGRAM_DIR) / "preprocessing_summary.json", 'w', encoding='utf-8') as f:
+            json.dump({
+                "config": preprocessor.describe(),
+                "species": species_names,
+                "audio_files": [int(n) for n in df_summary["used"]],
+                "spectrograms_generated": [int(n) for n in df_summary["segments"]],
+                "total_spectrograms": int(df_summary["segments"].sum())
+            }, f, indent=2)
+        
+        print("\n✅ Aquisição completa!")
+        print(f"📁 Áudios: {OUTPUT_DIR}")
+        print(f"📁 Espectrogramas: {SPECTROGRAM_DIR}")
+        return
+    
     # Download
     print("🐸 Iniciando download de vocalizações de anfíbios...")
     print(f"📝 Espécies: {len(SPECIES_LIST)}")
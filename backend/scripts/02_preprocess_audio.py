@@ -6,19 +6,559 @@ Autor: Projeto BioAcustic
 Data: Novembro 2025
 """
 
+import io
 import os
+import time
+import struct
+import hashlib
+import tempfile
+import queue
+import threading
+import functools
+import contextlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import numpy as np
 import librosa
 import librosa.display
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Callable, Iterator
 import json
 from tqdm import tqdm
 import warnings
 warnings.filterwarnings('ignore')
 
 
+# Perfis de reamostragem (nome -> res_type do librosa.resample)
+RESAMPLE_PROFILES = {
+    'soxr_vhq': 'soxr_vhq',   # Referência (mais lento)
+    'soxr_hq': 'soxr_hq',     # Padrão do librosa
+    'polyphase': 'polyphase', # scipy.signal.resample_poly
+    'fast': 'soxr_qq'         # Iterações rápidas (baixa qualidade)
+}
+
+
+# Features extras do banco (a Mel em dB é sempre gerada)
+FEATURE_TYPES = ('stft', 'mfcc', 'pcen')
+
+
+def feature_dir(output_dir, feature: str) -> Path:
+    """
+    Diretório de uma feature extra, irmão do diretório principal
+    
+    Ex: processed/spectrograms/Boana_faber -> processed/spectrograms_mfcc/Boana_faber
+    
+    Args:
+        output_dir: Diretório da espécie no dataset principal (Mel)
+        feature: Nome da feature
+    """
+    output_dir = Path(output_dir)
+    base = output_dir.parent
+    return base.with_name(f"{base.name}_{feature}") / output_dir.name
+
+
+# Codificação dos espectrogramas em disco
+SPECTROGRAM_CODECS = ('float32', 'float16', 'uint8')
+SPECTROGRAM_COMPRESSIONS = (None, 'zstd', 'blosc')
+
+# Contêiner para uint8 quantizado e/ou comprimido (float32/float16 sem
+# compressão continuam .npy padrão). A extensão .npy é mantida para que
+# o layout do dataset não mude; load_spectrogram distingue pelo início.
+_SPEC_MAGIC = b'BIOSPEC1'
+_NPY_MAGIC = b'\x93NUMPY'
+
+
+def _compressor(compression: str):
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("Compressão zstd requer zstandard: pip install zstandard") from e
+        return zstandard
+    if compression == 'blosc':
+        try:
+            import blosc
+        except ImportError as e:
+            raise ImportError("Compressão blosc requer blosc: pip install blosc") from e
+        return blosc
+    raise ValueError(f"Compressão desconhecida: {compression} (opções: zstd, blosc)")
+
+
+def encode_spectrogram(spec: np.ndarray, codec: str = 'float32',
+                       compression: Optional[str] = None, level: int = 3) -> bytes:
+    """
+    Codifica um espectrograma para gravação em disco
+    
+    Args:
+        spec: Espectrograma (qualquer dtype de ponto flutuante)
+        codec: 'float32', 'float16' ou 'uint8' (quantizado com escala/offset)
+        compression: None, 'zstd' ou 'blosc'
+        level: Nível de compressão
+        
+    Returns:
+        Conteúdo do arquivo
+    """
+    if codec not in SPECTROGRAM_CODECS:
+        raise ValueError(f"Codec desconhecido: {codec} (opções: {', '.join(SPECTROGRAM_CODECS)})")
+    
+    header = {'shape': list(spec.shape), 'dtype': codec, 'compression': compression}
+    if codec == 'uint8':
+        # Quantização linear no intervalo do próprio espectrograma
+        offset = float(spec.min())
+        scale = float(spec.max() - offset) / 255.0 or 1.0
+        data = np.round((spec - offset) / scale).astype(np.uint8)
+        header.update(scale=scale, offset=offset)
+    else:
+        data = np.ascontiguousarray(spec, dtype=codec)
+    
+    if compression is None and codec != 'uint8':
+        buffer = io.BytesIO()
+        np.save(buffer, data)
+        return buffer.getvalue()
+    
+    payload = data.tobytes()
+    if compression == 'zstd':
+        payload = _compressor('zstd').ZstdCompressor(level=level).compress(payload)
+    elif compression is not None:
+        blosc = _compressor(compression)
+        payload = blosc.compress(payload, typesize=data.itemsize, clevel=level, shuffle=blosc.SHUFFLE)
+    
+    header_bytes = json.dumps(header).encode('utf-8')
+    return _SPEC_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes + payload
+
+
+def decode_spectrogram(content: bytes) -> np.ndarray:
+    """
+    Decodifica o conteúdo gerado por encode_spectrogram (ou um .npy padrão)
+    
+    Returns:
+        Espectrograma em float32
+    """
+    if not content.startswith(_SPEC_MAGIC):
+        return np.load(io.BytesIO(content)).astype(np.float32, copy=False)
+    
+    start = len(_SPEC_MAGIC)
+    (header_len,) = struct.unpack('<I', content[start:start + 4])
+    header = json.loads(content[start + 4:start + 4 + header_len].decode('utf-8'))
+    payload = content[start + 4 + header_len:]
+    
+    if header['compression'] == 'zstd':
+        payload = _compressor('zstd').ZstdDecompressor().decompress(payload)
+    elif header['compression'] == 'blosc':
+        payload = _compressor('blosc').decompress(payload)
+    
+    data = np.frombuffer(payload, dtype=header['dtype']).reshape(header['shape'])
+    if header['dtype'] == 'uint8':
+        return (data.astype(np.float32) * np.float32(header['scale']) + np.float32(header['offset']))
+    return data.astype(np.float32)
+
+
+def load_spectrogram(path) -> np.ndarray:
+    """
+    Lê um espectrograma salvo em qualquer codec (sempre retorna float32)
+    
+    Args:
+        path: Caminho do arquivo .npy
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(_NPY_MAGIC)) == _NPY_MAGIC:
+            f.seek(0)
+            return np.load(f).astype(np.float32, copy=False)
+        f.seek(0)
+        return decode_spectrogram(f.read())
+
+
+# Tabela de cores viridis, calculada uma vez por processo
+_VIRIDIS_LUT = None
+
+
+def viridis_lut() -> np.ndarray:
+    """
+    Tabela de cores viridis com 256 entradas RGB (uint8)
+    """
+    global _VIRIDIS_LUT
+    if _VIRIDIS_LUT is None:
+        import matplotlib
+        colors = matplotlib.colormaps['viridis'](np.linspace(0.0, 1.0, 256))[:, :3]
+        _VIRIDIS_LUT = np.round(colors * 255).astype(np.uint8)
+    return _VIRIDIS_LUT
+
+
+def spectrogram_to_rgb(mel_spec_db: np.ndarray,
+                       vmin: float = -80.0,
+                       vmax: float = 0.0,
+                       scale: int = 1) -> np.ndarray:
+    """
+    Converte espectrograma(s) em dB para imagem RGB via tabela de cores
+    
+    Aceita um espectrograma (n_mels, frames) ou um lote (N, n_mels, frames).
+    O range padrão [-80, 0] dB é o de power_to_db(ref=np.max).
+    
+    Args:
+        mel_spec_db: Espectrograma(s) em dB
+        vmin: Valor (dB) mapeado para a primeira cor
+        vmax: Valor (dB) mapeado para a última cor
+        scale: Fator de ampliação (vizinho mais próximo)
+        
+    Returns:
+        Array uint8 (..., altura, largura, 3), frequências baixas embaixo
+    """
+    index = np.clip((mel_spec_db - vmin) * (255.0 / (vmax - vmin)), 0, 255).astype(np.uint8)
+    index = index[..., ::-1, :]
+    if scale > 1:
+        index = index.repeat(scale, axis=-2).repeat(scale, axis=-1)
+    return viridis_lut()[index]
+
+
+def encode_png(rgb: np.ndarray, output_path, compress_level: int = 1):
+    """
+    Codifica uma imagem RGB uint8 em PNG
+    
+    Args:
+        rgb: Imagem (altura, largura, 3)
+        output_path: Caminho ou arquivo aberto
+        compress_level: Nível zlib (1 = rápido)
+    """
+    from PIL import Image
+    Image.fromarray(rgb).save(output_path, format='PNG', compress_level=compress_level)
+
+
+def _render_png_batch(tasks: list) -> int:
+    """
+    Renderiza um lote de .npy em PNG (executado no pool de processos)
+    """
+    for npy_path, png_path, scale in tasks:
+        encode_png(spectrogram_to_rgb(load_spectrogram(npy_path), scale=scale), png_path)
+    return len(tasks)
+
+
+class AsyncSpectrogramWriter:
+    """
+    Escritor assíncrono de arquivos de saída (thread dedicada)
+    
+    O cálculo dos espectrogramas só enfileira as escritas; a thread de
+    escrita agrupa os arquivos em lotes, faz fsync de cada arquivo antes de
+    fechá-lo e, opcionalmente, dos diretórios de saída uma vez por lote
+    (para que as entradas novas também sobrevivam a uma queda).
+    A fila é limitada: se o disco (ou a rede) não acompanhar, o cálculo
+    espera em vez de acumular espectrogramas na memória.
+    """
+    
+    def __init__(self, max_pending: int = 64, batch_size: int = 32, fsync: bool = True,
+                 fsync_dirs: bool = True):
+        """
+        Inicializa e inicia a thread de escrita
+        
+        Args:
+            max_pending: Máximo de arquivos aguardando escrita
+            batch_size: Arquivos por lote (diretórios sincronizados uma vez por lote)
+            fsync: Se deve garantir cada arquivo em disco antes de fechá-lo
+            fsync_dirs: Com fsync, também sincroniza os diretórios do lote
+        """
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.fsync_dirs = fsync_dirs
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.stats = {'files': 0, 'batches': 0, 'bytes': 0, 'write_seconds': 0.0, 'wait_seconds': 0.0}
+        
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def submit(self, output_path: str, write_fn: Callable):
+        """
+        Enfileira uma escrita (bloqueia se a fila estiver cheia)
+        
+        Args:
+            output_path: Caminho do arquivo
+            write_fn: Função que recebe o arquivo aberto ('wb') e escreve o conteúdo
+        """
+        self._raise_error()
+        start = time.perf_counter()
+        self.queue.put((str(output_path), write_fn))
+        self.stats['wait_seconds'] += time.perf_counter() - start
+    
+    def _write_batch(self, batch: list):
+        start = time.perf_counter()
+        files = []
+        try:
+            for output_path, write_fn in batch:
+                f = open(output_path, 'wb')
+                files.append(f)
+                write_fn(f)
+                f.flush()
+                if self.fsync:
+                    # Apenas este arquivo (os.sync esvaziaria o cache da máquina toda)
+                    os.fsync(f.fileno())
+            
+            if self.fsync and self.fsync_dirs:
+                for directory in {os.path.dirname(os.path.abspath(path)) for path, _ in batch}:
+                    self._fsync_dir(directory)
+            
+            self.stats['files'] += len(files)
+            self.stats['bytes'] += sum(f.tell() for f in files)
+            self.stats['batches'] += 1
+        finally:
+            for f in files:
+                f.close()
+        self.stats['write_seconds'] += time.perf_counter() - start
+    
+    @staticmethod
+    def _fsync_dir(directory: str):
+        """
+        Garante em disco as entradas de um diretório (POSIX; ignorado no Windows)
+        """
+        if os.name == 'nt':
+            return
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch = [item] if item is not None else []
+            stop = item is None
+            
+            # Juntar o que já estiver na fila, até o tamanho do lote
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            
+            try:
+                if batch and self.error is None:
+                    self._write_batch(batch)
+            except Exception as e:
+                self.error = e
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self.queue.task_done()
+            
+            if stop:
+                return
+    
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError(f"Falha na escrita assíncrona: {self.error}") from self.error
+    
+    def flush(self):
+        """
+        Aguarda todas as escritas pendentes
+        """
+        self.queue.join()
+        self._raise_error()
+    
+    def close(self, raise_error: bool = True):
+        """
+        Escreve o que falta e encerra a thread
+        
+        Args:
+            raise_error: Se deve propagar uma falha de escrita
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if raise_error:
+            self._raise_error()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        # Não mascarar a exceção que já está sendo propagada
+        self.close(raise_error=exc_type is None)
+
+
+class AudioCache:
+    """
+    Cache de áudio decodificado (decodifica cada gravação uma única vez)
+    
+    Cada gravação é salva já reamostrada como float32 (.npy) e lida depois
+    por memory map, sem cópia. A chave é o checksum do arquivo de origem
+    mais a taxa e o perfil de reamostragem, então reprocessar com outros parâmetros Mel
+    reaproveita o cache. Entradas menos usadas recentemente são removidas
+    quando o tamanho passa do orçamento. Escritas são atômicas, então
+    vários processos podem compartilhar o mesmo diretório.
+    """
+    
+    def __init__(self, cache_dir: str, sample_rate: int, max_bytes: int = 20 * 1024**3,
+                 resample_profile: str = 'soxr_hq'):
+        """
+        Inicializa o cache
+        
+        Args:
+            cache_dir: Diretório do cache
+            sample_rate: Taxa de amostragem dos áudios armazenados (Hz)
+            max_bytes: Orçamento de tamanho do cache
+            resample_profile: Perfil de reamostragem dos áudios armazenados
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.sample_rate = sample_rate
+        self.resample_profile = resample_profile
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+        self.lock = threading.Lock()
+        self.total_bytes = sum(f.stat().st_size for f in self.cache_dir.glob("*.npy"))
+    
+    @staticmethod
+    def checksum(file_path: str) -> str:
+        """
+        SHA-1 do conteúdo do arquivo de origem
+        """
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def entry_path(self, file_path: str) -> Path:
+        return self.cache_dir / f"{self.checksum(file_path)}_{self.sample_rate}_{self.resample_profile}.npy"
+    
+    def load(self, file_path: str, decode_fn: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Retorna o áudio em cache ou decodifica e armazena
+        
+        Args:
+            file_path: Arquivo de áudio de origem
+            decode_fn: Função que decodifica e reamostra o arquivo
+            
+        Returns:
+            Memory map somente leitura (acerto) ou o áudio decodificado
+        """
+        entry = self.entry_path(file_path)
+        try:
+            y = np.load(entry, mmap_mode='r')
+            os.utime(entry)  # Marca como usado recentemente
+            with self.lock:
+                self.stats['hits'] += 1
+            return y
+        except (FileNotFoundError, ValueError):
+            pass
+        
+        y = decode_fn()
+        self._store(entry, y)
+        with self.lock:
+            self.stats['misses'] += 1
+        return y
+    
+    def _store(self, entry: Path, y: np.ndarray):
+        """
+        Escreve a entrada (atômico) e aplica o orçamento de tamanho
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.ascontiguousarray(y, dtype=np.float32))
+        os.replace(tmp_path, entry)
+        
+        with self.lock:
+            self.total_bytes += entry.stat().st_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+    
+    def _evict(self):
+        """
+        Remove as entradas usadas há mais tempo até caber no orçamento
+        """
+        entries = []
+        for f in self.cache_dir.glob("*.npy"):
+            try:
+                stat = f.stat()
+            except FileNotFoundError:
+                continue  # Removido por outro processo
+            entries.append((stat.st_mtime, stat.st_size, f))
+        entries.sort()
+        
+        self.total_bytes = sum(size for _, size, _ in entries)
+        for _, size, f in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                f.unlink()  # Memory maps abertos continuam válidos (POSIX)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            self.stats['evicted'] += 1
+
+
+class SegmentPruner:
+    """
+    Remove segmentos quase idênticos dentro de uma mesma gravação
+    
+    Cada Mel-espectrograma (centralizado) recebe uma assinatura de bits por
+    projeções aleatórias: a distância de Hamming entre assinaturas estima o
+    ângulo entre os espectrogramas. Só os pares com Hamming pequeno têm a
+    similaridade de cosseno calculada; um segmento é descartado se for
+    similar acima do limiar a algum segmento já mantido da gravação.
+    """
+    
+    def __init__(self, threshold: float = 0.97, n_bits: int = 64, seed: int = 0):
+        """
+        Inicializa o podador
+        
+        Args:
+            threshold: Similaridade de cosseno a partir da qual o segmento é descartado
+            n_bits: Bits da assinatura
+            seed: Semente das projeções
+        """
+        self.threshold = threshold
+        self.n_bits = n_bits
+        self.seed = seed
+        self.projection = None
+        # Hamming esperado no limiar, com folga para a variância da estimativa
+        self.max_hamming = int(np.ceil(1.5 * n_bits * np.arccos(threshold) / np.pi)) + 2
+        self.stats = {'segments': 0, 'pruned': 0}
+    
+    def start_recording(self) -> dict:
+        """
+        Estado de uma nova gravação (segmentos mantidos até agora)
+        """
+        return {'signatures': np.empty((0, self.n_bits), dtype=bool), 'vectors': None}
+    
+    def select(self, mel_specs: np.ndarray, state: dict) -> np.ndarray:
+        """
+        Decide quais segmentos de um lote manter
+        
+        Args:
+            mel_specs: Lote de Mel-espectrogramas (N, n_mels, frames)
+            state: Estado da gravação (start_recording), atualizado no lugar
+            
+        Returns:
+            Máscara booleana (N,) dos segmentos mantidos
+        """
+        X = mel_specs.reshape(len(mel_specs), -1).astype(np.float32)
+        X -= X.mean(axis=1, keepdims=True)
+        X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-8)
+        
+        if self.projection is None or self.projection.shape[0] != X.shape[1]:
+            rng = np.random.default_rng(self.seed)
+            self.projection = rng.standard_normal((X.shape[1], self.n_bits)).astype(np.float32)
+        signatures = (X @ self.projection) > 0
+        
+        keep = np.ones(len(X), dtype=bool)
+        for i in range(len(X)):
+            candidates = np.count_nonzero(state['signatures'] != signatures[i], axis=1) <= self.max_hamming
+            if candidates.any() and (state['vectors'][candidates] @ X[i]).max() >= self.threshold:
+                keep[i] = False
+                continue
+            
+            state['signatures'] = np.vstack([state['signatures'], signatures[i:i + 1]])
+            state['vectors'] = X[i:i + 1] if state['vectors'] is None else np.vstack([state['vectors'], X[i:i + 1]])
+        
+        self.stats['segments'] += len(X)
+        self.stats['pruned'] += int((~keep).sum())
+        return keep
+
+
 class AudioPreprocessor:
     """
     Classe para pré-processamento de áudio e extração de features
@@ -31,7 +571,17 @@ class AudioPreprocessor:
                  n_fft: int = 2048,
                  hop_length: int = 512,
                  fmin: float = 50.0,
-                 fmax: float = 8000.0):
+                 fmax: float = 8000.0,
+                 cache_dir: Optional[str] = None,
+                 cache_max_gb: float = 20.0,
+                 resample_profile: str = 'soxr_hq',
+                 extra_features: Tuple[str, ...] = (),
+                 n_mfcc: int = 20,
+                 feature_batch_size: int = 32,
+                 codec: str = 'float32',
+                 compression: Optional[str] = None,
+                 compression_level: int = 3,
+                 prune_threshold: Optional[float] = None):
         """
         Inicializa o preprocessador
         
@@ -43,7 +593,29 @@ class AudioPreprocessor:
             hop_length: Stride entre janelas
             fmin: Frequência mínima (Hz)
             fmax: Frequência máxima (Hz)
+            cache_dir: Cache de áudio decodificado (None = sem cache)
+            cache_max_gb: Orçamento de tamanho do cache (GB)
+            resample_profile: Perfil de reamostragem (ver RESAMPLE_PROFILES)
+            extra_features: Features além da Mel, da mesma STFT (ver FEATURE_TYPES)
+            n_mfcc: Número de coeficientes MFCC
+            feature_batch_size: Segmentos por STFT em lote
+            codec: Codificação dos espectrogramas ('float32', 'float16', 'uint8')
+            compression: Compressão dos espectrogramas (None, 'zstd', 'blosc')
+            compression_level: Nível de compressão
+            prune_threshold: Similaridade a partir da qual segmentos da mesma
+                gravação são descartados (None = não podar)
         """
+        if resample_profile not in RESAMPLE_PROFILES:
+            raise ValueError(f"Perfil de reamostragem desconhecido: {resample_profile} "
+                             f"(opções: {', '.join(RESAMPLE_PROFILES)})")
+        unknown = [f for f in extra_features if f not in FEATURE_TYPES]
+        if unknown:
+            raise ValueError(f"Features desconhecidas: {unknown} (opções: {', '.join(FEATURE_TYPES)})")
+        if codec not in SPECTROGRAM_CODECS:
+            raise ValueError(f"Codec desconhecido: {codec} (opções: {', '.join(SPECTROGRAM_CODECS)})")
+        if compression is not None:
+            _compressor(compression)  # Falha cedo se a biblioteca não estiver instalada
+        
         self.sample_rate = sample_rate
         self.duration = duration
         self.n_mels = n_mels
@@ -51,20 +623,44 @@ class AudioPreprocessor:
         self.hop_length = hop_length
         self.fmin = fmin
         self.fmax = fmax
+        self.resample_profile = resample_profile
+        self.extra_features = tuple(extra_features)
+        self.n_mfcc = n_mfcc
+        self.feature_batch_size = feature_batch_size
+        self.codec = codec
+        self.compression = compression
+        self.compression_level = compression_level
+        self.pruner = SegmentPruner(prune_threshold) if prune_threshold is not None else None
         
         # Calcular número de amostras por segmento
         self.n_samples = int(sample_rate * duration)
         
+        # Cache de decodificação (compartilhável entre configurações Mel)
+        self.audio_cache = (AudioCache(cache_dir, sample_rate, int(cache_max_gb * 1024**3), resample_profile)
+                            if cache_dir else None)
+        
         print("🎛️  Configuração do Preprocessador:")
         print(f"   Sample Rate: {sample_rate} Hz")
         print(f"   Duração: {duration}s ({self.n_samples} samples)")
         print(f"   Mel bands: {n_mels}")
         print(f"   Range de frequência: {fmin}-{fmax} Hz")
+        print(f"   Reamostragem: {resample_profile}")
+        if self.extra_features:
+            print(f"   Features extras: {', '.join(self.extra_features)}")
+        if codec != 'float32' or compression:
+            print(f"   Armazenamento: {codec}" + (f" + {compression}" if compression else ""))
+        if self.pruner is not None:
+            print(f"   Poda de segmentos similares: cosseno >= {prune_threshold}")
+        if self.audio_cache is not None:
+            print(f"   Cache de áudio: {cache_dir} (até {cache_max_gb:g} GB)")
     
     def load_audio(self, file_path: str) -> Tuple[np.ndarray, int]:
         """
         Carrega arquivo de áudio
         
+        Com cache, só a primeira leitura decodifica e reamostra o arquivo;
+        as seguintes devolvem um memory map somente leitura.
+        
         Args:
             file_path: Caminho do arquivo
             
@@ -72,12 +668,60 @@ class AudioPreprocessor:
             Tupla (áudio, sample_rate)
         """
         try:
-            y, sr = librosa.load(file_path, sr=self.sample_rate)
-            return y, sr
+            if self.audio_cache is not None:
+                y = self.audio_cache.load(file_path, lambda: self._decode(file_path))
+            else:
+                y = self._decode(file_path)
+            return y, self.sample_rate
         except Exception as e:
             print(f"❌ Erro ao carregar {file_path}: {e}")
             return None, None
     
+    def _decode(self, file_path: str) -> np.ndarray:
+        """
+        Decodifica na taxa original e reamostra com o perfil configurado
+        """
+        y, sr = librosa.load(file_path, sr=None)
+        return self.resample(y, sr)
+    
+    def resample(self, y: np.ndarray, orig_sr: int) -> np.ndarray:
+        """
+        Reamostra para self.sample_rate com o perfil configurado
+        
+        Args:
+            y: Áudio na taxa original
+            orig_sr: Taxa original (Hz)
+            
+        Returns:
+            Áudio reamostrado (float32)
+        """
+        if orig_sr == self.sample_rate:
+            return y
+        y = librosa.resample(y, orig_sr=orig_sr, target_sr=self.sample_rate,
+                             res_type=RESAMPLE_PROFILES[self.resample_profile])
+        return y.astype(np.float32, copy=False)
+    
+    def describe(self) -> dict:
+        """
+        Configuração do pré-processamento (gravada nos metadados de saída)
+        """
+        return {
+            'sample_rate': self.sample_rate,
+            'duration': self.duration,
+            'n_mels': self.n_mels,
+            'n_fft': self.n_fft,
+            'hop_length': self.hop_length,
+            'fmin': self.fmin,
+            'fmax': self.fmax,
+            'resample_profile': self.resample_profile,
+            'feature': 'mel',
+            'extra_features': list(self.extra_features),
+            'n_mfcc': self.n_mfcc,
+            'codec': self.codec,
+            'compression': self.compression,
+            'prune_threshold': self.pruner.threshold if self.pruner is not None else None
+        }
+    
     def normalize_audio(self, y: np.ndarray) -> np.ndarray:
         """
         Normaliza áudio para range [-1, 1]
@@ -164,19 +808,80 @@ class AudioPreprocessor:
         
         return mel_spec_db
     
+    def compute_features(self, segments: np.ndarray) -> dict:
+        """
+        Calcula a Mel e as features extras de um lote com uma única STFT
+        
+        A Mel é idêntica à de compute_mel_spectrogram; STFT em dB, MFCC e
+        PCEN são derivadas do mesmo espectro, sem recalcular a STFT.
+        
+        Args:
+            segments: Lote de segmentos (N, n_samples)
+            
+        Returns:
+            Dicionário feature -> array (N, bandas, frames)
+        """
+        stft = librosa.stft(segments, n_fft=self.n_fft, hop_length=self.hop_length)
+        magnitude = np.abs(stft)
+        # Mesmo banco de filtros de melspectrogram, aplicado à potência e (PCEN) à magnitude
+        mel_basis = librosa.filters.mel(
+            sr=self.sample_rate,
+            n_fft=self.n_fft,
+            n_mels=self.n_mels,
+            fmin=self.fmin,
+            fmax=self.fmax
+        )
+        mel_power = mel_basis @ magnitude ** 2
+        
+        # ref=np.max por segmento, como em compute_mel_spectrogram
+        features = {'mel': np.stack([librosa.power_to_db(m, ref=np.max) for m in mel_power])}
+        
+        if 'stft' in self.extra_features:
+            features['stft'] = np.stack([librosa.amplitude_to_db(m, ref=np.max) for m in magnitude])
+        if 'mfcc' in self.extra_features:
+            features['mfcc'] = librosa.feature.mfcc(S=features['mel'], n_mfcc=self.n_mfcc)
+        if 'pcen' in self.extra_features:
+            # PCEN espera a Mel de magnitude (não de potência), na escala
+            # recomendada pelo librosa para áudio em ponto flutuante
+            features['pcen'] = librosa.pcen((mel_basis @ magnitude) * (2 ** 31), sr=self.sample_rate,
+                                            hop_length=self.hop_length)
+        
+        return {name: values.astype(np.float32, copy=False) for name, values in features.items()}
+    
+    def _save_npy(self, array: np.ndarray, npy_path: Path,
+                  writer: Optional[AsyncSpectrogramWriter] = None):
+        if writer is not None:
+            writer.submit(npy_path, functools.partial(self.save_spectrogram_npy, array))
+        else:
+            self.save_spectrogram_npy(array, str(npy_path))
+    
     def save_spectrogram_image(self, mel_spec_db: np.ndarray, 
-                                output_path: str, 
-                                title: Optional[str] = None):
+                                output_path, 
+                                title: Optional[str] = None,
+                                debug: bool = False,
+                                scale: int = 2):
         """
         Salva espectrograma como imagem PNG
         
+        Por padrão mapeia os valores em dB direto pela tabela viridis, sem
+        matplotlib. Com debug=True gera a figura completa (eixos, colorbar,
+        título) usando a API orientada a objetos do matplotlib, que pode
+        rodar na thread de escrita.
+        
         Args:
             mel_spec_db: Mel-espectrograma em dB
-            output_path: Caminho para salvar
-            title: Título do plot (opcional)
+            output_path: Caminho ou arquivo aberto para salvar
+            title: Título do plot (apenas debug)
+            debug: Se deve gerar a figura com eixos e legendas
+            scale: Fator de ampliação da imagem rápida
         """
-        plt.figure(figsize=(10, 4))
-        librosa.display.specshow(
+        if not debug:
+            encode_png(spectrogram_to_rgb(mel_spec_db, scale=scale), output_path)
+            return
+        
+        fig = Figure(figsize=(10, 4))
+        ax = fig.add_subplot()
+        img = librosa.display.specshow(
             mel_spec_db,
             sr=self.sample_rate,
             hop_length=self.hop_length,
@@ -184,35 +889,76 @@ class AudioPreprocessor:
             y_axis='mel',
             fmin=self.fmin,
             fmax=self.fmax,
-            cmap='viridis'
+            cmap='viridis',
+            ax=ax
         )
-        plt.colorbar(format='%+2.0f dB')
+        fig.colorbar(img, ax=ax, format='%+2.0f dB')
         
         if title:
-            plt.title(title)
+            ax.set_title(title)
         else:
-            plt.title('Mel-Spectrogram')
+            ax.set_title('Mel-Spectrogram')
         
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=150, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(output_path, format='png', dpi=150, bbox_inches='tight')
     
-    def save_spectrogram_npy(self, mel_spec_db: np.ndarray, output_path: str):
+    def save_spectrogram_npy(self, mel_spec_db: np.ndarray, output_path):
         """
-        Salva espectrograma como arquivo NumPy (.npy)
+        Salva espectrograma como arquivo .npy no codec configurado
+        
+        float32/float16 sem compressão geram .npy padrão; os demais usam o
+        contêiner lido por load_spectrogram.
         
         Args:
             mel_spec_db: Mel-espectrograma em dB
-            output_path: Caminho para salvar
+            output_path: Caminho ou arquivo aberto para salvar
+        """
+        content = encode_spectrogram(mel_spec_db, self.codec, self.compression, self.compression_level)
+        if hasattr(output_path, 'write'):
+            output_path.write(content)
+        else:
+            with open(output_path, 'wb') as f:
+                f.write(content)
+    
+    def decode_stream(self, audio_files: list, prefetch: int = 2) -> Iterator[Tuple[Path, np.ndarray]]:
         """
-        np.save(output_path, mel_spec_db)
+        Estágio de decodificação: carrega os próximos arquivos em segundo plano
+        
+        Enquanto um arquivo é processado, até `prefetch` arquivos seguintes
+        já estão sendo decodificados (o decoder libera o GIL).
+        
+        Args:
+            audio_files: Arquivos de áudio na ordem de processamento
+            prefetch: Arquivos decodificados com antecedência
+            
+        Yields:
+            Tuplas (caminho, áudio) - áudio None se a leitura falhou
+        """
+        with ThreadPoolExecutor(max_workers=max(1, prefetch)) as executor:
+            pending = deque()
+            files = iter(audio_files)
+            
+            for audio_file in files:
+                pending.append((audio_file, executor.submit(self.load_audio, str(audio_file))))
+                if len(pending) >= prefetch:
+                    break
+            
+            while pending:
+                audio_file, future = pending.popleft()
+                next_file = next(files, None)
+                if next_file is not None:
+                    pending.append((next_file, executor.submit(self.load_audio, str(next_file))))
+                yield audio_file, future.result()[0]
     
     def process_audio_file(self, 
                            input_path: str, 
                            output_dir: str,
                            save_images: bool = False,
                            save_npy: bool = True,
-                           overlap: float = 0.0) -> int:
+                           overlap: float = 0.0,
+                           writer: Optional[AsyncSpectrogramWriter] = None,
+                           audio: Optional[np.ndarray] = None,
+                           debug_images: bool = False) -> int:
         """
         Processa um arquivo de áudio completo
         
@@ -222,14 +968,19 @@ class AudioPreprocessor:
             save_images: Se deve salvar imagens PNG
             save_npy: Se deve salvar arrays NumPy
             overlap: Sobreposição para segmentação
+            writer: Escritor assíncrono (None = escrita síncrona)
+            audio: Áudio já decodificado (None = carregar de input_path)
+            debug_images: PNGs com eixos e legendas (lento, via matplotlib)
             
         Returns:
             Número de espectrogramas gerados
         """
         # Carregar áudio
-        y, sr = self.load_audio(input_path)
-        if y is None:
+        if audio is None:
+            audio, _ = self.load_audio(input_path)
+        if audio is None:
             return 0
+        y = audio
         
         # Normalizar
         y = self.normalize_audio(y)
@@ -241,37 +992,50 @@ class AudioPreprocessor:
             print(f"⚠️  Nenhum segmento válido em {Path(input_path).name}")
             return 0
         
-        # Criar diretório de saída
+        # Criar diretórios de saída
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
+        for feature in self.extra_features:
+            feature_dir(output_path, feature).mkdir(parents=True, exist_ok=True)
         
-        # Processar cada segmento
+        # Processar os segmentos em lotes (uma STFT por lote)
         base_name = Path(input_path).stem
         count = 0
+        prune_state = self.pruner.start_recording() if self.pruner is not None else None
         
-        for i, segment in enumerate(segments):
+        for batch_start in range(0, len(segments), self.feature_batch_size):
             # Ajustar duração
-            segment = self.pad_or_truncate(segment)
-            
-            # Gerar espectrograma
-            mel_spec = self.compute_mel_spectrogram(segment)
+            batch = np.stack([self.pad_or_truncate(segment) for segment in
+                              segments[batch_start:batch_start + self.feature_batch_size]])
             
-            # Salvar
-            file_base = f"{base_name}_seg{i:03d}"
+            # Gerar espectrogramas
+            features = self.compute_features(batch)
+            keep = (self.pruner.select(features['mel'], prune_state) if self.pruner is not None
+                    else np.ones(len(batch), dtype=bool))
             
-            if save_npy:
-                npy_path = output_path / f"{file_base}.npy"
-                self.save_spectrogram_npy(mel_spec, str(npy_path))
-            
-            if save_images:
-                img_path = output_path / f"{file_base}.png"
-                self.save_spectrogram_image(
-                    mel_spec, 
-                    str(img_path),
-                    title=f"{base_name} - Segment {i}"
-                )
-            
-            count += 1
+            for j, mel_spec in enumerate(features['mel']):
+                if not keep[j]:
+                    continue  # Quase idêntico a um segmento já salvo
+                i = batch_start + j
+                file_base = f"{base_name}_seg{i:03d}"
+                
+                # Salvar
+                if save_npy:
+                    self._save_npy(mel_spec, output_path / f"{file_base}.npy", writer)
+                    for feature in self.extra_features:
+                        self._save_npy(features[feature][j],
+                                       feature_dir(output_path, feature) / f"{file_base}.npy", writer)
+                
+                if save_images:
+                    img_path = output_path / f"{file_base}.png"
+                    render = functools.partial(self.save_spectrogram_image, mel_spec,
+                                               title=f"{base_name} - Segment {i}", debug=debug_images)
+                    if writer is not None:
+                        writer.submit(img_path, render)
+                    else:
+                        render(str(img_path))
+                
+                count += 1
         
         return count
     
@@ -279,15 +1043,30 @@ class AudioPreprocessor:
                         input_dir: str, 
                         output_base_dir: str,
                         save_images: bool = False,
-                        overlap: float = 0.0) -> dict:
+                        overlap: float = 0.0,
+                        async_io: bool = True,
+                        prefetch: int = 2,
+                        write_batch_size: int = 32,
+                        debug_images: bool = False,
+                        exclude: Optional[set] = None) -> dict:
         """
         Processa dataset completo de múltiplas espécies
         
+        Com async_io, decodificação, cálculo e escrita rodam como estágios
+        sobrepostos: os próximos arquivos são decodificados em segundo plano
+        e as escritas vão para uma thread própria, que grava em lotes com
+        fsync de cada arquivo (e dos diretórios, uma vez por lote).
+        
         Args:
             input_dir: Diretório com pastas de espécies
             output_base_dir: Diretório base para saída
             save_images: Se deve salvar imagens PNG
             overlap: Sobreposição para segmentação
+            async_io: Se deve sobrepor decodificação/escrita ao cálculo
+            prefetch: Arquivos decodificados com antecedência
+            write_batch_size: Arquivos por lote de escrita
+            debug_images: PNGs com eixos e legendas (lento, via matplotlib)
+            exclude: Arquivos a ignorar, como 'Especie/XC123.mp3' (ex: duplicatas)
             
         Returns:
             Dicionário com estatísticas do processamento
@@ -296,6 +1075,7 @@ class AudioPreprocessor:
         output_path = Path(output_base_dir)
         
         stats = {
+            "config": self.describe(),
             "species": [],
             "audio_files": [],
             "spectrograms_generated": [],
@@ -307,45 +1087,86 @@ class AudioPreprocessor:
         
         print(f"\n🐸 Processando {len(species_dirs)} espécies...")
         
-        for species_dir in species_dirs:
-            species_name = species_dir.name
-            print(f"\n📁 Espécie: {species_name}")
-            
-            # Criar diretório de saída
-            output_species_dir = output_path / species_name
-            output_species_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Buscar arquivos de áudio
-            audio_files = list(species_dir.glob("*.mp3")) + \
-                         list(species_dir.glob("*.wav")) + \
-                         list(species_dir.glob("*.flac"))
-            
-            print(f"   Arquivos de áudio: {len(audio_files)}")
-            
-            # Processar cada arquivo
-            total_specs = 0
-            for audio_file in tqdm(audio_files, desc=f"   Processando"):
-                n_specs = self.process_audio_file(
-                    str(audio_file),
-                    str(output_species_dir),
-                    save_images=save_images,
-                    overlap=overlap
-                )
-                total_specs += n_specs
-            
-            print(f"   ✅ Gerados {total_specs} espectrogramas")
-            
-            # Salvar estatísticas
-            stats["species"].append(species_name)
-            stats["audio_files"].append(len(audio_files))
-            stats["spectrograms_generated"].append(total_specs)
-            stats["total_spectrograms"] += total_specs
+        writer_context = (AsyncSpectrogramWriter(batch_size=write_batch_size)
+                          if async_io else contextlib.nullcontext())
+        with writer_context as writer:
+            for species_dir in species_dirs:
+                species_name = species_dir.name
+                print(f"\n📁 Espécie: {species_name}")
+                
+                # Criar diretório de saída
+                output_species_dir = output_path / species_name
+                output_species_dir.mkdir(parents=True, exist_ok=True)
+                
+                # Buscar arquivos de áudio
+                audio_files = list(species_dir.glob("*.mp3")) + \
+                             list(species_dir.glob("*.wav")) + \
+                             list(species_dir.glob("*.flac"))
+                
+                if exclude:
+                    n_found = len(audio_files)
+                    audio_files = [f for f in audio_files if f"{species_name}/{f.name}" not in exclude]
+                    if len(audio_files) < n_found:
+                        print(f"   Ignorados (duplicatas): {n_found - len(audio_files)}")
+                
+                print(f"   Arquivos de áudio: {len(audio_files)}")
+                
+                # Processar cada arquivo (decodificação antecipada se async_io)
+                if async_io:
+                    decoded = self.decode_stream(audio_files, prefetch=prefetch)
+                else:
+                    decoded = ((audio_file, None) for audio_file in audio_files)
+                
+                total_specs = 0
+                for audio_file, audio in tqdm(decoded, total=len(audio_files), desc=f"   Processando"):
+                    if async_io and audio is None:
+                        continue  # Erro já reportado por load_audio
+                    n_specs = self.process_audio_file(
+                        str(audio_file),
+                        str(output_species_dir),
+                        save_images=save_images,
+                        overlap=overlap,
+                        writer=writer,
+                        audio=audio,
+                        debug_images=debug_images
+                    )
+                    total_specs += n_specs
+                
+                print(f"   ✅ Gerados {total_specs} espectrogramas")
+                
+                # Salvar estatísticas
+                stats["species"].append(species_name)
+                stats["audio_files"].append(len(audio_files))
+                stats["spectrograms_generated"].append(total_specs)
+                stats["total_spectrograms"] += total_specs
+        
+        if writer is not None:
+            print(f"\n💾 Escrita assíncrona: {writer.stats['files']} arquivos em "
+                  f"{writer.stats['batches']} lotes ({writer.stats['write_seconds']:.1f}s na thread de escrita, "
+                  f"{writer.stats['wait_seconds']:.1f}s de espera com a fila cheia)")
+        
+        if self.audio_cache is not None:
+            cache_stats = self.audio_cache.stats
+            print(f"🗄️  Cache de áudio: {cache_stats['hits']} acertos, {cache_stats['misses']} decodificações, "
+                  f"{cache_stats['evicted']} removidos")
+        
+        if self.pruner is not None:
+            stats["pruning"] = dict(self.pruner.stats)
+            removed = self.pruner.stats['pruned'] / max(1, self.pruner.stats['segments'])
+            print(f"✂️  Poda: {self.pruner.stats['pruned']} de {self.pruner.stats['segments']} segmentos "
+                  f"removidos ({removed:.1%} do dataset)")
         
-        # Salvar resumo
+        # Salvar resumo (também nos diretórios das features extras)
         summary_path = output_path / "preprocessing_summary.json"
         with open(summary_path, 'w', encoding='utf-8') as f:
             json.dump(stats, f, indent=2)
         
+        for feature in self.extra_features:
+            feature_path = output_path.with_name(f"{output_path.name}_{feature}")
+            feature_path.mkdir(parents=True, exist_ok=True)
+            with open(feature_path / "preprocessing_summary.json", 'w', encoding='utf-8') as f:
+                json.dump({**stats, "config": {**stats["config"], "feature": feature}}, f, indent=2)
+        
         print("\n" + "="*60)
         print("📊 RESUMO DO PRÉ-PROCESSAMENTO")
         print("="*60)
@@ -356,6 +1177,175 @@ class AudioPreprocessor:
         print(f"TOTAL: {stats['total_spectrograms']} espectrogramas")
         
         return stats
+    
+    def render_dataset_images(self,
+                              spectrogram_dir: str,
+                              n_workers: Optional[int] = None,
+                              scale: int = 2,
+                              batch_size: int = 64,
+                              overwrite: bool = False) -> int:
+        """
+        Gera PNGs (rápidos, via tabela de cores) para .npy já existentes
+        
+        Útil para a interface de revisão sem reprocessar o áudio: os
+        arquivos são divididos em lotes renderizados em paralelo por
+        processos.
+        
+        Args:
+            spectrogram_dir: Diretório com pastas de espécies
+            n_workers: Processos (None = todos os núcleos)
+            scale: Fator de ampliação das imagens
+            batch_size: Arquivos por tarefa enviada a cada processo
+            overwrite: Se deve refazer PNGs existentes
+            
+        Returns:
+            Número de imagens geradas
+        """
+        tasks = []
+        for npy_path in sorted(Path(spectrogram_dir).glob("*/*.npy")):
+            png_path = npy_path.with_suffix(".png")
+            if overwrite or not png_path.exists():
+                tasks.append((str(npy_path), str(png_path), scale))
+        
+        if not tasks:
+            print("✅ Nenhuma imagem pendente")
+            return 0
+        
+        batches = [tasks[i:i + batch_size] for i in range(0, len(tasks), batch_size)]
+        print(f"🖼️  Renderizando {len(tasks)} imagens em {len(batches)} lotes...")
+        
+        total = 0
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            for n_done in tqdm(executor.map(_render_png_batch, batches), total=len(batches), desc="   Lotes"):
+                total += n_done
+        
+        return total
+
+
+def benchmark_resampling(audio_files: list,
+                         profiles: list = None,
+                         reference: str = 'soxr_vhq',
+                         **preprocessor_kwargs) -> dict:
+    """
+    Compara os perfis de reamostragem em vazão e fidelidade
+    
+    Cada arquivo é decodificado uma vez na taxa original. A vazão é medida
+    em segundos de áudio reamostrados por segundo. A fidelidade é medida
+    contra o perfil de referência: SNR do sinal reamostrado e erro absoluto
+    médio do Mel-espectrograma (dB), que é o que o modelo vê.
+    
+    Args:
+        audio_files: Arquivos de áudio da amostra
+        profiles: Perfis a comparar (padrão: todos)
+        reference: Perfil de referência
+        **preprocessor_kwargs: Parâmetros do AudioPreprocessor
+        
+    Returns:
+        Dicionário perfil -> métricas
+    """
+    profiles = profiles or list(RESAMPLE_PROFILES)
+    preprocessors = {name: AudioPreprocessor(resample_profile=name, **preprocessor_kwargs)
+                     for name in set(profiles) | {reference}}
+    
+    results = {name: {'seconds': 0.0, 'audio_seconds': 0.0, 'snr_db': [], 'mel_mae_db': []}
+               for name in profiles}
+    
+    for audio_file in tqdm(audio_files, desc="Benchmark"):
+        y, sr = librosa.load(str(audio_file), sr=None)
+        ref = preprocessors[reference].resample(y, sr)
+        ref_mel = preprocessors[reference].compute_mel_spectrogram(ref)
+        
+        for name in profiles:
+            start = time.perf_counter()
+            out = preprocessors[name].resample(y, sr)
+            results[name]['seconds'] += time.perf_counter() - start
+            results[name]['audio_seconds'] += len(y) / sr
+            
+            n = min(len(out), len(ref))
+            noise = np.sum((out[:n] - ref[:n]) ** 2)
+            signal = np.sum(ref[:n] ** 2)
+            results[name]['snr_db'].append(10 * np.log10(signal / noise) if noise > 0 else np.inf)
+            
+            mel = preprocessors[name].compute_mel_spectrogram(out)
+            frames = min(mel.shape[1], ref_mel.shape[1])
+            results[name]['mel_mae_db'].append(float(np.mean(np.abs(mel[:, :frames] - ref_mel[:, :frames]))))
+    
+    print("\n" + "="*60)
+    print(f"📊 BENCHMARK DE REAMOSTRAGEM (referência: {reference})")
+    print("="*60)
+    summary = {}
+    for name in profiles:
+        r = results[name]
+        speed = r['audio_seconds'] / r['seconds'] if r['seconds'] > 0 else np.inf
+        summary[name] = {
+            'realtime_factor': float(speed),
+            'snr_db': float(np.median(r['snr_db'])),
+            'mel_mae_db': float(np.mean(r['mel_mae_db']))
+        }
+        print(f"{name:12s} | {speed:8.0f}x tempo real | SNR {summary[name]['snr_db']:6.1f} dB | "
+              f"erro Mel {summary[name]['mel_mae_db']:.3f} dB")
+    
+    return summary
+
+
+def benchmark_codecs(spectrogram_files: list,
+                     variants: list = None,
+                     level: int = 3) -> dict:
+    """
+    Compara codecs de armazenamento em tamanho, velocidade e erro
+    
+    O erro é medido contra o float32 original, em dB (máximo e médio). Para
+    o efeito na acurácia, reprocesse com o codec escolhido e compare o
+    relatório de 03_train_model.
+    
+    Args:
+        spectrogram_files: Amostra de espectrogramas .npy (float32)
+        variants: Lista de (codec, compressão) (padrão: todas disponíveis)
+        level: Nível de compressão
+        
+    Returns:
+        Dicionário 'codec+compressão' -> métricas
+    """
+    if variants is None:
+        variants = []
+        for compression in SPECTROGRAM_COMPRESSIONS:
+            try:
+                if compression is not None:
+                    _compressor(compression)
+            except ImportError:
+                continue
+            variants += [(codec, compression) for codec in SPECTROGRAM_CODECS]
+    
+    originals = [load_spectrogram(f) for f in spectrogram_files]
+    raw_bytes = sum(Path(f).stat().st_size for f in spectrogram_files)
+    
+    print("\n" + "="*60)
+    print(f"📊 BENCHMARK DE CODECS ({len(originals)} espectrogramas)")
+    print("="*60)
+    summary = {}
+    for codec, compression in variants:
+        start = time.perf_counter()
+        encoded = [encode_spectrogram(spec, codec, compression, level) for spec in originals]
+        encode_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        decoded = [decode_spectrogram(content) for content in encoded]
+        decode_seconds = time.perf_counter() - start
+        
+        errors = np.concatenate([np.abs(d - o).ravel() for d, o in zip(decoded, originals)])
+        name = codec + (f"+{compression}" if compression else "")
+        summary[name] = {
+            'ratio': raw_bytes / sum(len(content) for content in encoded),
+            'encode_per_second': len(originals) / encode_seconds,
+            'decode_per_second': len(originals) / decode_seconds,
+            'max_error_db': float(errors.max()),
+            'mean_error_db': float(errors.mean())
+        }
+        r = summary[name]
+        print(f"{name:16s} | {r['ratio']:4.1f}x menor | {r['decode_per_second']:7.0f} leituras/s | "
+              f"erro máx {r['max_error_db']:.3f} dB, médio {r['mean_error_db']:.4f} dB")
+    
+    return summary
 
 
 def main():
@@ -365,6 +1355,16 @@ def main():
     # Configurações
     INPUT_DIR = "./backend/data/raw"
     OUTPUT_DIR = "./backend/data/processed/spectrograms"
+    CACHE_DIR = "./backend/data/cache/audio"  # None para desativar o cache de decodificação
+    DUPLICATES_FILE = "./backend/data/raw/duplicates.json"  # Gerado por 08_deduplicate_audio.py
+    RESAMPLE_PROFILE = 'soxr_hq'  # 'soxr_vhq', 'soxr_hq', 'polyphase' ou 'fast'
+    EXTRA_FEATURES = ()  # Ex: ('stft', 'mfcc', 'pcen') -> spectrograms_<feature>/ para ablações
+    CODEC = 'float32'  # 'float16' ou 'uint8' reduzem 2-4x o dataset
+    COMPRESSION = None  # 'zstd' ou 'blosc' (requer a biblioteca)
+    PRUNE_THRESHOLD = None  # Ex: 0.97 descarta segmentos quase idênticos da mesma gravação
+    RUN_CODEC_BENCHMARK = False  # True para só comparar os codecs em espectrogramas existentes
+    RUN_RESAMPLING_BENCHMARK = False  # True para só comparar os perfis numa amostra
+    BENCHMARK_FILES = 20
     
     # Parâmetros do preprocessador
     preprocessor = AudioPreprocessor(
@@ -374,17 +1374,48 @@ def main():
         n_fft=2048,
         hop_length=512,
         fmin=50.0,
-        fmax=8000.0
+        fmax=8000.0,
+        cache_dir=CACHE_DIR,
+        cache_max_gb=20.0,
+        resample_profile=RESAMPLE_PROFILE,
+        extra_features=EXTRA_FEATURES,
+        codec=CODEC,
+        compression=COMPRESSION,
+        prune_threshold=PRUNE_THRESHOLD
     )
     
+    if RUN_RESAMPLING_BENCHMARK:
+        # Amostra espalhada pelas espécies
+        audio_files = sorted(Path(INPUT_DIR).glob("*/*.mp3"))
+        step = max(1, len(audio_files) // BENCHMARK_FILES)
+        benchmark_resampling(audio_files[::step][:BENCHMARK_FILES], **{
+            k: v for k, v in preprocessor.describe().items()
+            if k not in ('resample_profile', 'feature', 'extra_features')
+        })
+        return
+    
+    if RUN_CODEC_BENCHMARK:
+        spectrogram_files = sorted(Path(OUTPUT_DIR).glob("*/*.npy"))
+        step = max(1, len(spectrogram_files) // 500)
+        benchmark_codecs(spectrogram_files[::step])
+        return
+    
+    # Gravações duplicadas (se a deduplicação já foi executada)
+    exclude = None
+    if Path(DUPLICATES_FILE).exists():
+        with open(DUPLICATES_FILE, 'r', encoding='utf-8') as f:
+            exclude = set(json.load(f)['exclude'])
+        print(f"🧹 {len(exclude)} gravações duplicadas serão ignoradas ({DUPLICATES_FILE})")
+    
     # Processar dataset
     print("🎵 Iniciando pré-processamento de áudio...")
     
     stats = preprocessor.process_dataset(
         input_dir=INPUT_DIR,
         output_base_dir=OUTPUT_DIR,
-        save_images=False,  # True para salvar PNGs (útil para debug)
-        overlap=0.0  # 0.0 = sem overlap, 0.5 = 50% overlap
+        save_images=False,  # True para salvar PNGs (rápidos, via tabela de cores)
+        overlap=0.0,  # 0.0 = sem overlap, 0.5 = 50% overlap
+        exclude=exclude
     )
     
     print("\n✅ Pré-processamento completo!")
@@ -7,24 +7,49 @@ Data: Novembro 2025
 """
 
 import os
+import re
+import sys
+import shutil
+import socket
+import argparse
+import contextlib
+import subprocess
+import gzip
+import math
+import hashlib
+import time
+import tempfile
+import threading
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers, models
 from tensorflow.keras.applications import MobileNetV2, EfficientNetB0
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, ModelCheckpoint, TensorBoard
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
+from sklearn.model_selection import StratifiedGroupKFold, GroupShuffleSplit
+from sklearn.metrics import classification_report, roc_auc_score
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 import json
 from datetime import datetime
+from collections import deque
 from tqdm import tqdm
+from pipeline_utils import import_script
 import warnings
 warnings.filterwarnings('ignore')
 
 
+def load_spectrogram(path) -> np.ndarray:
+    """
+    Lê um espectrograma de 02_preprocess_audio em qualquer codec (float32)
+    
+    Args:
+        path: Caminho do arquivo .npy
+    """
+    return import_script('02_preprocess_audio').load_spectrogram(path)
+
+
 class AmphibianClassifier:
     """
     Classe para treinamento do modelo de classificação de anfíbios
@@ -51,89 +76,158 @@ class AmphibianClassifier:
         self.model = None
         self.history = None
         self.class_names = []
+        self.model_dir = None
+        self.soft_labels = False
+        self.normalization_stats = None
+        self.preprocessing = None  # Configuração de 02_preprocess_audio (sample rate, reamostragem...)
+        self.distributed = None  # DistributedContext (treino multi-worker)
         
         print("🧠 Inicializando Classificador de Anfíbios")
         print(f"   Arquitetura: {architecture}")
         print(f"   Input shape: {input_shape}")
         print(f"   Learning rate: {learning_rate}")
     
-    def load_dataset(self, data_dir: str, test_size=0.15, val_size=0.15):
+    def index_dataset(self, data_dir: str, test_size=0.15, val_size=0.15,
+                      manifest_path: str = None) -> dict:
         """
-        Carrega dataset de espectrogramas
+        Indexa os espectrogramas e obtém os splits por gravação (com cache)
         
         Args:
             data_dir: Diretório com pastas de espécies
             test_size: Proporção do conjunto de teste
             val_size: Proporção do conjunto de validação
+            manifest_path: CSV opcional (file, recording_id) com os IDs das gravações
             
         Returns:
-            Tupla (X_train, X_val, X_test, y_train, y_val, y_test)
+            Índice do dataset (ver RecordingSplitter.load_or_split)
         """
-        data_path = Path(data_dir)
+        splitter = RecordingSplitter(test_size=test_size, val_size=val_size,
+                                     manifest_path=manifest_path)
+        index = splitter.load_or_split(data_dir)
         
-        # Coletar todos os espectrogramas
-        X = []
-        y = []
-        
-        species_dirs = sorted([d for d in data_path.iterdir() if d.is_dir()])
-        self.class_names = [d.name for d in species_dirs]
+        self.class_names = index['class_names']
         self.num_classes = len(self.class_names)
         
-        print(f"\n📂 Carregando dataset de {data_dir}")
+        summary_path = Path(data_dir) / 'preprocessing_summary.json'
+        if summary_path.exists():
+            with open(summary_path, 'r', encoding='utf-8') as f:
+                self.preprocessing = json.load(f).get('config')
+        
+        print(f"\n📂 Dataset indexado de {data_dir}")
         print(f"🐸 Espécies encontradas: {self.num_classes}")
         print(f"   {', '.join(self.class_names)}")
         
+        return index
+    
+    def load_dataset(self, data_dir: str, test_size=0.15, val_size=0.15,
+                     manifest_path: str = None):
+        """
+        Carrega dataset de espectrogramas
+        
+        Os splits são feitos por gravação (nenhuma gravação aparece em mais de
+        um conjunto). Os espectrogramas são carregados uma única vez em um
+        array contínuo na ordem treino/validação/teste, e os conjuntos
+        retornados são views desse array (sem cópias).
+        
+        Args:
+            data_dir: Diretório com pastas de espécies
+            test_size: Proporção do conjunto de teste
+            val_size: Proporção do conjunto de validação
+            manifest_path: CSV opcional (file, recording_id) com os IDs das gravações
+            
+        Returns:
+            Tupla (X_train, X_val, X_test, y_train, y_val, y_test)
+        """
+        index = self.index_dataset(data_dir, test_size, val_size, manifest_path)
+        files = index['files']
+        splits = [index['train'], index['val'], index['test']]
+        order = np.concatenate(splits)
+        
+        X = np.empty((len(order), 128, 128, 3), dtype=np.float32)
+        valid = np.ones(len(order), dtype=bool)
+        
         # Carregar espectrogramas
-        for class_idx, species_dir in enumerate(tqdm(species_dirs, desc="Carregando espécies")):
-            species_name = species_dir.name
-            
-            # Buscar arquivos .npy
-            spec_files = list(species_dir.glob("*.npy"))
-            
-            for spec_file in spec_files:
-                try:
-                    # Carregar espectrograma
-                    mel_spec = np.load(spec_file)
-                    
-                    # Converter para formato de imagem (128, 128, 3)
-                    # Replicar canal único para 3 canais (RGB simulado)
-                    mel_spec_rgb = self._prepare_spectrogram(mel_spec)
-                    
-                    X.append(mel_spec_rgb)
-                    y.append(class_idx)
-                    
-                except Exception as e:
-                    print(f"⚠️  Erro ao carregar {spec_file}: {e}")
-        
-        # Converter para arrays NumPy
-        X = np.array(X, dtype=np.float32)
-        y = np.array(y)
+        for row, file_idx in enumerate(tqdm(order, desc="Carregando espectrogramas")):
+            try:
+                # Converter para formato de imagem (128, 128, 3)
+                # Replicar canal único para 3 canais (RGB simulado)
+                X[row] = self._prepare_spectrogram(load_spectrogram(files[file_idx]))
+            except Exception as e:
+                print(f"⚠️  Erro ao carregar {files[file_idx]}: {e}")
+                valid[row] = False
         
-        print(f"\n✅ Dataset carregado:")
-        print(f"   Total de amostras: {len(X)}")
-        print(f"   Shape: {X.shape}")
+        y = index['labels'][order]
+        bounds = np.cumsum([0] + [len(split) for split in splits])
         
-        # Normalizar para [0, 1]
-        X = (X - X.min()) / (X.max() - X.min())
+        loaded = X if valid.all() else X[valid]  # Cópia apenas se houve erro de leitura
         
-        # Split train/temp
-        X_train, X_temp, y_train, y_temp = train_test_split(
-            X, y, test_size=(test_size + val_size), random_state=42, stratify=y
-        )
+        print(f"\n✅ Dataset carregado:")
+        print(f"   Total de amostras: {len(loaded)}")
+        print(f"   Shape: {loaded.shape}")
         
-        # Split val/test
-        val_ratio = val_size / (test_size + val_size)
-        X_val, X_test, y_val, y_test = train_test_split(
-            X_temp, y_temp, test_size=(1 - val_ratio), random_state=42, stratify=y_temp
-        )
+        # Normalizar para [0, 1] (in-place); o loader preguiçoso reutiliza as estatísticas
+        stats = {'min': float(loaded.min()), 'max': float(loaded.max())}
+        RecordingSplitter.save_normalization_stats(index, stats)
+        self.normalization_stats = stats
+        X -= stats['min']
+        X /= (stats['max'] - stats['min'])
         
-        print(f"\n📊 Split de dados:")
-        print(f"   Treino:     {len(X_train):5d} amostras ({len(X_train)/len(X)*100:.1f}%)")
-        print(f"   Validação:  {len(X_val):5d} amostras ({len(X_val)/len(X)*100:.1f}%)")
-        print(f"   Teste:      {len(X_test):5d} amostras ({len(X_test)/len(X)*100:.1f}%)")
+        parts = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            keep = valid[start:stop]
+            if keep.all():
+                parts.append((X[start:stop], y[start:stop]))
+            else:
+                parts.append((X[start:stop][keep], y[start:stop][keep]))
+        (X_train, y_train), (X_val, y_val), (X_test, y_test) = parts
+        
+        n_total = max(len(X_train) + len(X_val) + len(X_test), 1)
+        print(f"\n📊 Split de dados (por gravação):")
+        print(f"   Treino:     {len(X_train):5d} amostras ({len(X_train)/n_total*100:.1f}%)")
+        print(f"   Validação:  {len(X_val):5d} amostras ({len(X_val)/n_total*100:.1f}%)")
+        print(f"   Teste:      {len(X_test):5d} amostras ({len(X_test)/n_total*100:.1f}%)")
         
         return X_train, X_val, X_test, y_train, y_val, y_test
     
+    def load_dataset_lazy(self, data_dir: str, batch_size=32, test_size=0.15,
+                          val_size=0.15, manifest_path: str = None, augmenter=None,
+                          sampler=None):
+        """
+        Cria loaders preguiçosos (um batch por vez do disco) para os splits
+        
+        Args:
+            data_dir: Diretório com pastas de espécies
+            batch_size: Tamanho do batch
+            test_size: Proporção do conjunto de teste
+            val_size: Proporção do conjunto de validação
+            manifest_path: CSV opcional (file, recording_id) com os IDs das gravações
+            augmenter: SpectrogramAugmenter opcional aplicado apenas no treino
+            sampler: ClassBalancedSampler opcional aplicado apenas no treino
+            
+        Returns:
+            Tupla (train_seq, val_seq, test_seq) de SpectrogramSequence
+        """
+        index = self.index_dataset(data_dir, test_size, val_size, manifest_path)
+        stats = RecordingSplitter.normalization_stats(index)
+        self.normalization_stats = stats
+        
+        # Mixup gera labels suaves: todos os splits usam one-hot
+        num_classes = self.num_classes if augmenter is not None and augmenter.mixup_alpha > 0 else None
+        
+        def make(split, shuffle, split_augmenter=None, split_sampler=None):
+            return SpectrogramSequence(
+                index['files'], index['labels'], index[split],
+                prepare_fn=self._prepare_spectrogram,
+                stats=stats,
+                batch_size=batch_size,
+                shuffle=shuffle,
+                augmenter=split_augmenter,
+                num_classes=num_classes,
+                sampler=split_sampler
+            )
+        
+        return make('train', True, augmenter, sampler), make('val', False), make('test', False)
+    
     def _prepare_spectrogram(self, mel_spec: np.ndarray) -> np.ndarray:
         """
         Prepara espectrograma para input da CNN
@@ -155,51 +249,73 @@ class AmphibianClassifier:
         
         return mel_spec_rgb
     
-    def build_model(self):
+    def _strategy_scope(self):
+        """
+        Escopo da estratégia de distribuição (nulo sem DistributedContext)
+        """
+        if self.distributed is None:
+            return contextlib.nullcontext()
+        return self.distributed.strategy.scope()
+    
+    def build_model(self, soft_labels=False):
         """
         Constrói modelo com Transfer Learning
+        
+        Args:
+            soft_labels: Se os labels de treino são vetores de probabilidade
+                (ex: mixup), usando categorical_crossentropy
         """
         print(f"\n🏗️  Construindo modelo ({self.architecture})...")
         
-        # Base model (pré-treinado)
-        if self.architecture == 'mobilenet':
-            base_model = MobileNetV2(
-                input_shape=self.input_shape,
-                include_top=False,
-                weights='imagenet'
-            )
-        elif self.architecture == 'efficientnet':
-            base_model = EfficientNetB0(
-                input_shape=self.input_shape,
-                include_top=False,
-                weights='imagenet'
+        # Variáveis criadas no escopo da estratégia (multi-worker, se ativa)
+        with self._strategy_scope():
+            # Base model (pré-treinado)
+            if self.architecture == 'mobilenet':
+                base_model = MobileNetV2(
+                    input_shape=self.input_shape,
+                    include_top=False,
+                    weights='imagenet'
+                )
+            elif self.architecture == 'efficientnet':
+                base_model = EfficientNetB0(
+                    input_shape=self.input_shape,
+                    include_top=False,
+                    weights='imagenet'
+                )
+            else:
+                raise ValueError(f"Arquitetura não suportada: {self.architecture}")
+            
+            # Congelar base model inicialmente
+            base_model.trainable = False
+            
+            # Construir modelo completo
+            model = models.Sequential([
+                base_model,
+                layers.GlobalAveragePooling2D(),
+                layers.BatchNormalization(),
+                layers.Dense(256, activation='relu'),
+                layers.Dropout(0.5),
+                layers.Dense(128, activation='relu'),
+                layers.Dropout(0.3),
+                layers.Dense(self.num_classes, activation='softmax')
+            ], name='AmphibianClassifier')
+            
+            # Compilar
+            if soft_labels:
+                loss = 'categorical_crossentropy'
+                top3 = keras.metrics.TopKCategoricalAccuracy(k=3, name='top_3_accuracy')
+            else:
+                loss = 'sparse_categorical_crossentropy'
+                top3 = keras.metrics.SparseTopKCategoricalAccuracy(k=3, name='top_3_accuracy')
+            
+            model.compile(
+                optimizer=keras.optimizers.Adam(learning_rate=self.learning_rate),
+                loss=loss,
+                metrics=['accuracy', top3]
             )
-        else:
-            raise ValueError(f"Arquitetura não suportada: {self.architecture}")
-        
-        # Congelar base model inicialmente
-        base_model.trainable = False
-        
-        # Construir modelo completo
-        model = models.Sequential([
-            base_model,
-            layers.GlobalAveragePooling2D(),
-            layers.BatchNormalization(),
-            layers.Dense(256, activation='relu'),
-            layers.Dropout(0.5),
-            layers.Dense(128, activation='relu'),
-            layers.Dropout(0.3),
-            layers.Dense(self.num_classes, activation='softmax')
-        ], name='AmphibianClassifier')
-        
-        # Compilar
-        model.compile(
-            optimizer=keras.optimizers.Adam(learning_rate=self.learning_rate),
-            loss='sparse_categorical_crossentropy',
-            metrics=['accuracy', keras.metrics.TopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
-        )
         
         self.model = model
+        self.soft_labels = soft_labels
         
         print("✅ Modelo construído")
         print(f"   Parâmetros treináveis: {model.count_params():,}")
@@ -208,30 +324,59 @@ class AmphibianClassifier:
     
     def train(self, X_train, y_train, X_val, y_val, 
               epochs=50, batch_size=32, 
-              output_dir='./backend/models'):
+              output_dir='./backend/models',
+              resume_dir=None, checkpoint_every=1, seed=42, run_name=None,
+              logging_profile='scalars', profile_batches=None):
         """
         Treina o modelo
         
         Args:
-            X_train: Dados de treino
-            y_train: Labels de treino
-            X_val: Dados de validação
-            y_val: Labels de validação
+            X_train: Dados de treino (array ou SpectrogramSequence)
+            y_train: Labels de treino (None se X_train for um loader)
+            X_val: Dados de validação (array ou SpectrogramSequence)
+            y_val: Labels de validação (None se X_val for um loader)
             epochs: Número de épocas
-            batch_size: Tamanho do batch
+            batch_size: Tamanho do batch (global, somando os workers; ignorado
+                para loaders em uma máquina)
             output_dir: Diretório para salvar modelo
+            resume_dir: Diretório de um treino interrompido para continuar
+                do último checkpoint (None = novo treino)
+            checkpoint_every: Intervalo (épocas) entre checkpoints completos
+            seed: Semente global (TensorFlow, NumPy e random)
+            run_name: Nome do diretório do modelo (obrigatório em multi-worker,
+                para que todos os workers usem o mesmo)
+            logging_profile: 'off', 'scalars' (métricas + throughput) ou
+                'full' (também histogramas de pesos a cada época)
+            profile_batches: Janela (início, fim) de batches para o profiler
+                do TensorBoard (None = desligado)
             
         Returns:
             History object
         """
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
+        distributed = self.distributed
+        multi_worker = distributed is not None and distributed.multi_worker
+        if multi_worker and resume_dir is None and run_name is None:
+            raise ValueError("Treino multi-worker requer run_name comum a todos os workers")
         
-        # Timestamp para versionamento
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        model_name = f"amphibian_classifier_{self.architecture}_{timestamp}"
-        model_dir = output_path / model_name
-        model_dir.mkdir(parents=True, exist_ok=True)
+        if resume_dir is not None:
+            model_dir = Path(resume_dir)
+            state = TrainingCheckpoint.load_state(model_dir)
+            timestamp = state['timestamp']
+            seed = state['seed']
+        else:
+            output_path = Path(output_dir)
+            output_path.mkdir(parents=True, exist_ok=True)
+            
+            # Timestamp para versionamento
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            model_name = run_name or f"amphibian_classifier_{self.architecture}_{timestamp}"
+            model_dir = output_path / model_name
+            model_dir.mkdir(parents=True, exist_ok=True)
+        self.model_dir = model_dir
+        
+        # Apenas o chief grava no diretório do modelo
+        write_dir = distributed.write_dir(model_dir) if distributed is not None else model_dir
+        write_dir.mkdir(parents=True, exist_ok=True)
         
         print(f"\n🎯 Iniciando treinamento...")
         print(f"   Épocas: {epochs}")
@@ -254,47 +399,113 @@ class AmphibianClassifier:
                 verbose=1
             ),
             ModelCheckpoint(
-                filepath=str(model_dir / 'best_model.h5'),
+                filepath=str(write_dir / 'best_model.h5'),
                 monitor='val_accuracy',
                 save_best_only=True,
                 verbose=1
-            ),
-            TensorBoard(
-                log_dir=str(model_dir / 'logs'),
-                histogram_freq=1
             )
         ]
+        # Arrays passam pelo mesmo pipeline tf.data dos loaders (fragmentado
+        # em multi-worker), onde a espera por dados é medida
+        if y_train is not None:
+            X_train = ArraySequence(X_train, y_train, batch_size, shuffle=True, seed=seed)
+            X_val = ArraySequence(X_val, y_val, batch_size)
+            y_train = y_val = None
+        
+        # Cada passo síncrono consome o batch global (todas as réplicas)
+        step_batch = batch_size if multi_worker else getattr(X_train, 'batch_size', batch_size)
+        callbacks += logging_callbacks(write_dir / 'logs', logging_profile, profile_batches, step_batch,
+                                       sequence=X_train if isinstance(X_train, SpectrogramSequence) else None)
+        throughput = next((c for c in callbacks if isinstance(c, ThroughputLogger)), None)
+        timed = throughput.timed if throughput is not None else None
+        
+        # Checkpoint completo por último: restaura o estado dos callbacks
+        # depois que o fit os reinicia em on_train_begin
+        checkpoint = TrainingCheckpoint(
+            model_dir,
+            callbacks=callbacks,
+            every_n_epochs=checkpoint_every,
+            seed=seed,
+            timestamp=timestamp,
+            sequence=X_train if isinstance(X_train, SpectrogramSequence) else None,
+            run_config={'architecture': self.architecture, 'batch_size': batch_size,
+                        'learning_rate': self.learning_rate},
+            write_dir=write_dir
+        )
+        
+        initial_epoch = 0
+        if resume_dir is not None:
+            initial_epoch = checkpoint.restore(self.model)
+            print(f"♻️  Retomando da época {initial_epoch} ({model_dir})")
+        
+        # Semente deslocada pela época: retomar não repete os sorteios já usados
+        keras.utils.set_random_seed(seed + initial_epoch)
+        
+        # Treinar (loaders, incluindo os arrays já convertidos acima)
+        augmenter = getattr(X_train, 'augmenter', None)
+        sampler = getattr(X_train, 'sampler', None)
+        if multi_worker:
+            train_ds, steps = distributed.distribute_sequence(X_train, batch_size, map_fn=timed)
+            val_ds, val_steps = distributed.distribute_sequence(X_val, batch_size)
+            fit_data = {'x': train_ds, 'validation_data': val_ds,
+                        'steps_per_epoch': steps, 'validation_steps': val_steps}
+            print(f"   Batch por réplica: {X_train.batch_size} | passos por época: {steps}")
+        else:
+            # Loaders viram tf.data: os batches são preparados em paralelo ao treino
+            fit_data = {}
+            if isinstance(X_train, SpectrogramSequence):
+                # Fluxo contínuo: a época de cada batch vem da sua posição
+                fit_data['steps_per_epoch'] = len(X_train)
+                X_train = X_train.as_dataset(repeat=True)
+            if isinstance(X_val, SpectrogramSequence):
+                X_val = X_val.as_dataset()
+            if timed is not None and isinstance(X_train, tf.data.Dataset):
+                X_train = timed(X_train)
+            fit_data.update({'x': X_train, 'validation_data': X_val})
         
-        # Treinar
         history = self.model.fit(
-            X_train, y_train,
-            validation_data=(X_val, y_val),
+            **fit_data,
             epochs=epochs,
-            batch_size=batch_size,
-            callbacks=callbacks,
+            initial_epoch=initial_epoch,
+            callbacks=callbacks + [checkpoint],
             verbose=1
         )
         
+        # Histórico completo, incluindo as épocas anteriores à retomada
+        history.history = checkpoint.history
         self.history = history
         
-        # Salvar modelo final
-        self.model.save(str(model_dir / 'final_model.h5'))
+        # Salvar modelo final (todos os workers salvam; só o do chief permanece)
+        self.model.save(str(write_dir / 'final_model.h5'))
         
-        # Salvar classe names
-        with open(model_dir / 'class_names.json', 'w') as f:
-            json.dump(self.class_names, f, indent=2)
+        if distributed is not None and not distributed.is_chief:
+            distributed.cleanup(model_dir)
+            print(f"\n✅ Worker {distributed.task_index} concluído")
+            return history
         
-        # Salvar configuração
+        # Salvar class names e configuração
         config = {
             'architecture': self.architecture,
             'input_shape': self.input_shape,
             'num_classes': self.num_classes,
             'learning_rate': self.learning_rate,
             'epochs_trained': len(history.history['loss']),
-            'timestamp': timestamp
+            'timestamp': timestamp,
+            'normalization': self.normalization_stats
         }
-        with open(model_dir / 'config.json', 'w') as f:
-            json.dump(config, f, indent=2)
+        if self.preprocessing:
+            config['preprocessing'] = self.preprocessing
+        if augmenter is not None:
+            config['augmentation'] = augmenter.describe()
+        if sampler is not None:
+            config['sampling'] = sampler.describe()
+        if multi_worker:
+            config['distributed'] = {
+                'strategy': 'MultiWorkerMirroredStrategy',
+                'num_workers': distributed.num_workers,
+                'global_batch_size': batch_size
+            }
+        save_model_contract(model_dir, self.class_names, config)
         
         print(f"\n✅ Treinamento concluído!")
         print(f"📁 Modelo salvo em: {model_dir}")
@@ -342,46 +553,75 @@ class AmphibianClassifier:
         
         plt.close()
     
-    def evaluate(self, X_test, y_test):
+    def evaluate(self, X_test, y_test, open_set=None, batch_size=256, n_bootstrap=1000):
         """
         Avalia modelo no conjunto de teste
         
         Args:
-            X_test: Dados de teste
-            y_test: Labels de teste
+            X_test: Dados de teste (array ou SpectrogramSequence)
+            y_test: Labels de teste (None se X_test for um loader)
+            open_set: OpenSetDetector calibrado (opcional), mede a rejeição
+                de espécies conhecidas na mesma passada
+            batch_size: Tamanho do batch de inferência (arrays)
+            n_bootstrap: Reamostragens para os intervalos de confiança
             
         Returns:
             Dicionário com métricas
         """
         print("\n📊 Avaliando modelo no conjunto de teste...")
         
-        # Predições
-        y_pred_probs = self.model.predict(X_test, verbose=0)
-        y_pred = np.argmax(y_pred_probs, axis=1)
+        # Uma única passada em batches: métricas (e rejeição open-set) acumuladas
+        # por StreamingEvaluator
+        evaluator = StreamingEvaluator(self.num_classes, class_names=self.class_names)
+        evaluator.run(self.model, X_test, y_test, batch_size=batch_size, open_set=open_set)
+        report = evaluator.report(n_bootstrap=n_bootstrap)
+        y_test, y_pred = evaluator.y_true, evaluator.y_pred
         
-        # Métricas
-        test_loss, test_acc, test_top3 = self.model.evaluate(X_test, y_test, verbose=0)
+        test_loss = report['loss']
+        test_acc = report['accuracy']['value']
+        test_top3 = report['top_3_accuracy']['value']
+        ci = report['accuracy']['ci']
         
-        print(f"\n✅ Resultados no Teste:")
+        print(f"\n✅ Resultados no Teste ({report['num_samples']} amostras):")
         print(f"   Loss: {test_loss:.4f}")
-        print(f"   Accuracy: {test_acc:.4f}")
+        print(f"   Accuracy: {test_acc:.4f} (IC 95%: {ci[0]:.4f}–{ci[1]:.4f})")
         print(f"   Top-3 Accuracy: {test_top3:.4f}")
+        print(f"   Macro F1: {report['macro_f1']['value']:.4f}")
+        print(f"   ECE: {report['ece']['value']:.4f}")
         
         # Classification Report
         print("\n📋 Classification Report:")
-        print(classification_report(y_test, y_pred, target_names=self.class_names))
+        print(classification_report(y_test, y_pred, labels=list(range(self.num_classes)),
+                                    target_names=self.class_names, zero_division=0))
         
         # Confusion Matrix
-        cm = confusion_matrix(y_test, y_pred)
+        cm = evaluator.confusion
         
-        return {
+        results = {
             'test_loss': test_loss,
             'test_accuracy': test_acc,
             'test_top3_accuracy': test_top3,
             'confusion_matrix': cm,
             'y_pred': y_pred,
-            'y_test': y_test
+            'y_test': y_test,
+            'report': report
         }
+        
+        if self.model_dir is not None:
+            evaluator.save_report(report, Path(self.model_dir) / 'evaluation_report.json')
+        
+        if open_set is not None:
+            unknown = evaluator.unknown
+            accepted = ~unknown
+            results['open_set'] = {
+                'rejected_known': float(unknown.mean()),
+                'accepted_accuracy': float((y_pred[accepted] == y_test[accepted]).mean()) if accepted.any() else 0.0
+            }
+            print(f"\n🚫 Open-set ({open_set.method}):")
+            print(f"   Conhecidas rejeitadas: {results['open_set']['rejected_known']:.2%}")
+            print(f"   Accuracy nas aceitas: {results['open_set']['accepted_accuracy']:.4f}")
+        
+        return results
     
     def plot_confusion_matrix(self, cm, save_path=None):
         """
@@ -416,63 +656,3048 @@ class AmphibianClassifier:
         plt.close()
 
 
-def main():
+# Segmentos gerados por 02_preprocess_audio: {base_name}_seg{i:03d}.npy
+RECORDING_ID_PATTERN = re.compile(r'^(?P<recording>.+)_seg\d{3,}$')
+
+
+def recording_id_from_path(path) -> str:
     """
-    Função principal de treinamento
+    Deriva o ID da gravação de origem a partir do nome do segmento
+    
+    Args:
+        path: Caminho do espectrograma (ex: .../XC123456_seg007.npy)
+        
+    Returns:
+        ID da gravação (ex: 'XC123456'); o próprio nome se não houver sufixo
     """
-    # Configurações
-    DATA_DIR = "./backend/data/processed/spectrograms"
-    MODEL_DIR = "./backend/models"
+    stem = Path(path).stem
+    match = RECORDING_ID_PATTERN.match(stem)
+    return match.group('recording') if match else stem
+
+
+class RecordingSplitter:
+    """
+    Splits treino/validação/teste estratificados por espécie e agrupados por
+    gravação, com cache em disco
     
-    # Hiperparâmetros
-    ARCHITECTURE = 'mobilenet'  # 'mobilenet' ou 'efficientnet'
-    LEARNING_RATE = 0.0001
-    EPOCHS = 50
-    BATCH_SIZE = 32
+    Segmentos de uma mesma gravação ficam sempre no mesmo conjunto. O split
+    é salvo em `<data_dir>/../splits/` com uma chave derivada da lista de
+    arquivos e dos parâmetros, então todas as execuções (e todos os trials
+    de um sweep) usam exatamente os mesmos índices.
+    """
     
-    print("🐸 Sistema de Classificação de Anfíbios - Treinamento")
-    print("="*60)
+    def __init__(self, test_size=0.15, val_size=0.15, seed=42,
+                 cache_dir: str = None, manifest_path: str = None):
+        """
+        Inicializa o splitter
+        
+        Args:
+            test_size: Proporção do conjunto de teste
+            val_size: Proporção do conjunto de validação
+            seed: Semente do embaralhamento dos grupos
+            cache_dir: Diretório do cache (padrão: <data_dir>/../splits)
+            manifest_path: CSV opcional (file, recording_id); arquivos fora do
+                manifesto usam o ID derivado do nome
+        """
+        self.test_size = test_size
+        self.val_size = val_size
+        self.seed = seed
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.manifest_path = manifest_path
     
-    # Inicializar classificador
-    classifier = AmphibianClassifier(
-        input_shape=(128, 128, 3),
-        architecture=ARCHITECTURE,
-        learning_rate=LEARNING_RATE
-    )
+    def index_files(self, data_dir: str, class_names=None):
+        """
+        Lista os espectrogramas, seus labels e gravações de origem
+        
+        Args:
+            data_dir: Diretório com pastas de espécies
+            class_names: Ordem das classes (padrão: pastas em ordem alfabética)
+            
+        Returns:
+            Tupla (files, labels, groups, class_names)
+        """
+        data_path = Path(data_dir)
+        if class_names is None:
+            class_names = sorted(d.name for d in data_path.iterdir() if d.is_dir())
+        
+        manifest = {}
+        if self.manifest_path:
+            import pandas as pd
+            df = pd.read_csv(self.manifest_path)
+            manifest = {Path(f).name: str(r) for f, r in zip(df['file'], df['recording_id'])}
+        
+        files, labels, groups = [], [], []
+        for class_idx, species in enumerate(class_names):
+            for spec_file in sorted((data_path / species).glob("*.npy")):
+                files.append(str(spec_file))
+                labels.append(class_idx)
+                recording = manifest.get(spec_file.name, recording_id_from_path(spec_file))
+                groups.append(f"{species}/{recording}")
+        
+        return (np.array(files), np.array(labels, dtype=np.int64),
+                np.array(groups), list(class_names))
     
-    # Carregar dataset
-    X_train, X_val, X_test, y_train, y_val, y_test = classifier.load_dataset(
-        data_dir=DATA_DIR,
-        test_size=0.15,
-        val_size=0.15
-    )
+    def _hold_out(self, labels, groups, fraction):
+        """
+        Separa ~fraction das gravações, estratificando pelas espécies
+        
+        Returns:
+            Tupla (índices restantes, índices separados)
+        """
+        n_splits = max(2, int(round(1 / fraction)))
+        dummy = np.zeros(len(labels))
+        
+        if len(np.unique(groups)) >= n_splits:
+            splitter = StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=self.seed)
+            return next(splitter.split(dummy, labels, groups))
+        
+        # Poucas gravações: split por grupos sem estratificação
+        splitter = GroupShuffleSplit(n_splits=1, test_size=fraction, random_state=self.seed)
+        return next(splitter.split(dummy, labels, groups))
     
-    # Construir modelo
-    model = classifier.build_model()
-    model.summary()
-    
-    # Treinar
-    history = classifier.train(
-        X_train, y_train,
-        X_val, y_val,
-        epochs=EPOCHS,
-        batch_size=BATCH_SIZE,
-        output_dir=MODEL_DIR
-    )
+    def split(self, labels, groups) -> dict:
+        """
+        Calcula os índices de cada conjunto
+        
+        Args:
+            labels: Label de cada segmento
+            groups: Gravação de cada segmento
+            
+        Returns:
+            Dicionário {'train', 'val', 'test'} com arrays de índices ordenados
+        """
+        rest, test = self._hold_out(labels, groups, self.test_size)
+        val_fraction = self.val_size / (1 - self.test_size)
+        train, val = self._hold_out(labels[rest], groups[rest], val_fraction)
+        
+        return {
+            'train': np.sort(rest[train]),
+            'val': np.sort(rest[val]),
+            'test': np.sort(test)
+        }
     
-    # Plotar histórico
-    classifier.plot_training_history(
-        save_path=f"{MODEL_DIR}/training_history.png"
-    )
+    def _cache_path(self, data_dir: str, files, labels, groups) -> Path:
+        """
+        Caminho do cache para esta lista de arquivos e parâmetros
+        """
+        digest = hashlib.sha1()
+        for item in (files, labels.astype(str), groups):
+            digest.update('\n'.join(item).encode('utf-8'))
+        digest.update(f"{self.test_size}|{self.val_size}|{self.seed}".encode('utf-8'))
+        
+        data_path = Path(data_dir)
+        cache_dir = self.cache_dir or data_path.parent / 'splits'
+        return cache_dir / f"{data_path.name}_{digest.hexdigest()[:16]}.npz"
+    
+    def load_or_split(self, data_dir: str, class_names=None) -> dict:
+        """
+        Carrega o split do cache ou o calcula e salva
+        
+        Args:
+            data_dir: Diretório com pastas de espécies
+            class_names: Ordem das classes (padrão: ordem alfabética)
+            
+        Returns:
+            Dicionário com files, labels, groups, class_names, train, val,
+            test e cache_path
+        """
+        files, labels, groups, class_names = self.index_files(data_dir, class_names)
+        cache_path = self._cache_path(data_dir, files, labels, groups)
+        
+        if cache_path.exists():
+            with np.load(cache_path) as cached:
+                splits = {k: cached[k] for k in ('train', 'val', 'test')}
+            print(f"♻️  Split carregado do cache: {cache_path.name}")
+        else:
+            splits = self.split(labels, groups)
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # Escrita atômica: vários workers podem gerar o mesmo cache ao mesmo tempo
+            tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp.npz")
+            np.savez(tmp_path, files=files, labels=labels, groups=groups,
+                     class_names=np.array(class_names), **splits)
+            os.replace(tmp_path, cache_path)
+            print(f"💾 Split salvo em cache: {cache_path}")
+        
+        n_recordings = {k: len(np.unique(groups[idx])) for k, idx in splits.items()}
+        print(f"   Gravações: treino {n_recordings['train']} | "
+              f"validação {n_recordings['val']} | teste {n_recordings['test']}")
+        
+        return {
+            'files': files,
+            'labels': labels,
+            'groups': groups,
+            'class_names': class_names,
+            'cache_path': cache_path,
+            **splits
+        }
     
-    # Avaliar
-    results = classifier.evaluate(X_test, y_test)
+    @staticmethod
+    def normalization_stats(index: dict) -> dict:
+        """
+        Mínimo e máximo globais dos espectrogramas (normalização para [0, 1])
+        
+        Calculados uma vez em streaming e guardados ao lado do split em cache.
+        
+        Args:
+            index: Índice retornado por load_or_split
+            
+        Returns:
+            Dicionário {'min', 'max'}
+        """
+        stats_path = RecordingSplitter._stats_path(index)
+        if stats_path.exists():
+            with open(stats_path, 'r') as f:
+                return json.load(f)
+        
+        x_min, x_max = np.inf, -np.inf
+        for spec_file in tqdm(index['files'], desc="Estatísticas de normalização"):
+            mel_spec = load_spectrogram(spec_file)
+            x_min = min(x_min, float(mel_spec.min()))
+            x_max = max(x_max, float(mel_spec.max()))
+        
+        stats = {'min': x_min, 'max': x_max}
+        RecordingSplitter.save_normalization_stats(index, stats)
+        
+        return stats
     
-    # Plotar matriz de confusão
-    classifier.plot_confusion_matrix(
-        results['confusion_matrix'],
-        save_path=f"{MODEL_DIR}/confusion_matrix.png"
-    )
+    @staticmethod
+    def save_normalization_stats(index: dict, stats: dict):
+        """
+        Guarda as estatísticas de normalização ao lado do split em cache
+        
+        Args:
+            index: Índice retornado por load_or_split
+            stats: Dicionário {'min', 'max'}
+        """
+        stats_path = RecordingSplitter._stats_path(index)
+        tmp_path = stats_path.with_name(f"{stats_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(stats, f, indent=2)
+        os.replace(tmp_path, stats_path)
+    
+    @staticmethod
+    def _stats_path(index: dict) -> Path:
+        cache_path = Path(index['cache_path'])
+        return cache_path.with_name(cache_path.stem + '_stats.json')
+
+
+class SpectrogramAugmenter:
+    """
+    Aumento de dados on-the-fly em batches de espectrogramas normalizados
+    
+    Todas as operações são vetorizadas sobre o batch (B, altura, largura,
+    canais) e usam apenas CPU/NumPy; nada é gravado em disco. O gerador
+    aleatório é fornecido por batch, então o resultado é reprodutível.
+    """
+    
+    def __init__(self,
+                 time_masks=2,
+                 time_mask_width=12,
+                 freq_masks=2,
+                 freq_mask_width=10,
+                 max_shift=16,
+                 gain_db=6.0,
+                 mixup_alpha=0.0,
+                 noise_bank=None,
+                 noise_prob=0.5,
+                 snr_db=(5.0, 20.0),
+                 stats=None):
+        """
+        Inicializa o augmenter
+        
+        Args:
+            time_masks: Número de máscaras de tempo (SpecAugment)
+            time_mask_width: Largura máxima de cada máscara de tempo (frames)
+            freq_masks: Número de máscaras de frequência (SpecAugment)
+            freq_mask_width: Largura máxima de cada máscara de frequência (bandas)
+            max_shift: Deslocamento circular máximo no tempo (frames)
+            gain_db: Ganho aleatório máximo (± dB)
+            mixup_alpha: Parâmetro da Beta do mixup (0 = desativado)
+            noise_bank: Array (N, altura, largura, canais) de ruídos de fundo
+                normalizados (ver load_noise_bank)
+            noise_prob: Probabilidade de misturar ruído em cada amostra
+            snr_db: Intervalo de SNR (dB) da mistura de ruído
+            stats: {'min', 'max'} em dB usados na normalização do dataset
+        """
+        self.time_masks = time_masks
+        self.time_mask_width = time_mask_width
+        self.freq_masks = freq_masks
+        self.freq_mask_width = freq_mask_width
+        self.max_shift = max_shift
+        self.gain_db = gain_db
+        self.mixup_alpha = mixup_alpha
+        self.noise_bank = noise_bank
+        self.noise_prob = noise_prob
+        self.snr_db = snr_db
+        self.stats = stats or {'min': -80.0, 'max': 0.0}  # Faixa padrão de power_to_db
+    
+    def describe(self) -> dict:
+        """
+        Parâmetros do aumento (registrados no config.json do modelo)
+        """
+        return {
+            'time_masks': self.time_masks,
+            'time_mask_width': self.time_mask_width,
+            'freq_masks': self.freq_masks,
+            'freq_mask_width': self.freq_mask_width,
+            'max_shift': self.max_shift,
+            'gain_db': self.gain_db,
+            'mixup_alpha': self.mixup_alpha,
+            'noise_bank_size': 0 if self.noise_bank is None else len(self.noise_bank),
+            'noise_prob': self.noise_prob,
+            'snr_db': list(self.snr_db)
+        }
+    
+    @staticmethod
+    def load_noise_bank(noise_dir: str, prepare_fn, stats: dict) -> np.ndarray:
+        """
+        Carrega um banco de ruídos de fundo (.npy gerados por 02_preprocess_audio)
+        
+        Args:
+            noise_dir: Diretório com mel-espectrogramas de ruído em dB
+            prepare_fn: Função 2D → (128, 128, 3) (AmphibianClassifier._prepare_spectrogram)
+            stats: {'min', 'max'} do dataset
+            
+        Returns:
+            Array normalizado (N, 128, 128, 3)
+        """
+        files = sorted(Path(noise_dir).rglob("*.npy"))
+        bank = np.stack([prepare_fn(load_spectrogram(f)) for f in files]).astype(np.float32)
+        bank = (bank - stats['min']) / (stats['max'] - stats['min'])
+        print(f"🌧️  Banco de ruídos: {len(files)} espectrogramas de {noise_dir}")
+        return np.clip(bank, 0.0, 1.0)
+    
+    @staticmethod
+    def _band_mask(rng, batch, size, n_masks, max_width) -> np.ndarray:
+        """
+        Máscaras (batch, size) com n_masks faixas de até max_width posições
+        """
+        positions = np.arange(size)
+        starts = rng.integers(0, size, (batch, n_masks, 1))
+        widths = rng.integers(0, max_width + 1, (batch, n_masks, 1))
+        return ((positions >= starts) & (positions < starts + widths)).any(axis=1)
+    
+    def _mix_noise(self, X, rng):
+        """
+        Mistura ruído do banco no domínio de potência com SNR aleatória
+        
+        Somar as potências dos mel-espectrogramas equivale, em média, a somar
+        as formas de onda de sinal e ruído independentes.
+        """
+        chosen = np.flatnonzero(rng.random(len(X)) < self.noise_prob)
+        if len(chosen) == 0:
+            return X
+        
+        db_range = self.stats['max'] - self.stats['min']
+        noise = self.noise_bank[rng.integers(0, len(self.noise_bank), len(chosen))]
+        signal_power = 10.0 ** ((X[chosen] * db_range + self.stats['min']) / 10.0)
+        noise_power = 10.0 ** ((noise * db_range + self.stats['min']) / 10.0)
+        
+        snr = rng.uniform(self.snr_db[0], self.snr_db[1], len(chosen))
+        axes = tuple(range(1, X.ndim))
+        gain = signal_power.mean(axis=axes) / (noise_power.mean(axis=axes) * 10.0 ** (snr / 10.0))
+        mixed = signal_power + noise_power * gain.reshape(-1, *([1] * (X.ndim - 1)))
+        
+        X[chosen] = (10.0 * np.log10(mixed) - self.stats['min']) / db_range
+        return X
+    
+    def __call__(self, X: np.ndarray, y: np.ndarray, rng):
+        """
+        Aplica o aumento em um batch
+        
+        Args:
+            X: Batch normalizado (B, altura, largura, canais)
+            y: Labels (B,) ou one-hot (B, classes) — obrigatório para mixup
+            rng: np.random.Generator do batch
+            
+        Returns:
+            Tupla (X aumentado, y possivelmente misturado)
+        """
+        X = np.array(X, dtype=np.float32)
+        batch, height, width = X.shape[:3]
+        db_range = self.stats['max'] - self.stats['min']
+        
+        # Deslocamento circular no tempo
+        if self.max_shift:
+            shifts = rng.integers(-self.max_shift, self.max_shift + 1, batch)
+            cols = (np.arange(width)[None, :] - shifts[:, None]) % width
+            X = np.take_along_axis(X, cols[:, None, :, None], axis=2)
+        
+        # Ganho aleatório (offset em dB)
+        if self.gain_db:
+            gain = rng.uniform(-self.gain_db, self.gain_db, batch) / db_range
+            X += gain.astype(np.float32)[:, None, None, None]
+        
+        if self.noise_bank is not None and self.noise_prob > 0:
+            X = self._mix_noise(X, rng)
+        
+        # SpecAugment: máscaras de tempo e frequência preenchidas com silêncio
+        if self.time_masks:
+            mask = self._band_mask(rng, batch, width, self.time_masks, self.time_mask_width)
+            X[np.broadcast_to(mask[:, None, :, None], X.shape)] = 0.0
+        if self.freq_masks:
+            mask = self._band_mask(rng, batch, height, self.freq_masks, self.freq_mask_width)
+            X[np.broadcast_to(mask[:, :, None, None], X.shape)] = 0.0
+        
+        np.clip(X, 0.0, 1.0, out=X)
+        
+        # Mixup entre segmentos do mesmo batch
+        if self.mixup_alpha > 0:
+            if y.ndim != 2:
+                raise ValueError("Mixup requer labels one-hot (num_classes no loader)")
+            lam = rng.beta(self.mixup_alpha, self.mixup_alpha, batch).astype(np.float32)
+            lam = np.maximum(lam, 1.0 - lam)
+            perm = rng.permutation(batch)
+            X = lam[:, None, None, None] * X + (1.0 - lam[:, None, None, None]) * X[perm]
+            y = lam[:, None] * y + (1.0 - lam[:, None]) * y[perm]
+        
+        return X, y
+
+
+class ClassBalancedSampler:
+    """
+    Define a ordem de cada época a partir de pools de índices por espécie
+    
+    Trabalha apenas com índices: espécies raras são repetidas (oversampling)
+    e espécies comuns são subamostradas (cap) sem copiar espectrogramas.
+    As classes são intercaladas ao longo da época, de modo que cada batch
+    tenha aproximadamente a mesma proporção de espécies.
+    """
+    
+    def __init__(self, samples_per_class=None, max_per_class=None, oversample=True):
+        """
+        Inicializa o sampler
+        
+        Args:
+            samples_per_class: Amostras de cada espécie por época
+                (None = tamanho da maior espécie, limitado por max_per_class)
+            max_per_class: Limite de amostras de cada espécie por época
+            oversample: Se espécies com menos amostras são repetidas até
+                samples_per_class (False = usa apenas as disponíveis)
+        """
+        self.samples_per_class = samples_per_class
+        self.max_per_class = max_per_class
+        self.oversample = oversample
+    
+    def class_quota(self, counts: np.ndarray) -> int:
+        """
+        Número alvo de amostras por espécie em uma época
+        """
+        quota = self.samples_per_class or int(counts.max())
+        if self.max_per_class:
+            quota = min(quota, self.max_per_class)
+        return quota
+    
+    def epoch_order(self, indices: np.ndarray, labels: np.ndarray, rng) -> np.ndarray:
+        """
+        Gera a ordem (índices do dataset) de uma época
+        
+        Args:
+            indices: Índices do split
+            labels: Labels correspondentes a indices
+            rng: np.random.Generator da época
+            
+        Returns:
+            Array de índices, possivelmente com repetições
+        """
+        classes, counts = np.unique(labels, return_counts=True)
+        quota = self.class_quota(counts)
+        
+        chosen, keys = [], []
+        for cls, count in zip(classes, counts):
+            pool = indices[labels == cls]
+            n = quota if self.oversample else min(quota, count)
+            
+            # Ciclos embaralhados: cada amostra aparece antes de qualquer repetição
+            draws = np.concatenate([rng.permutation(pool) for _ in range(math.ceil(n / count))])[:n]
+            chosen.append(draws)
+            # Posições espalhadas uniformemente pela época
+            keys.append((np.arange(n) + rng.random(n)) / n)
+        
+        order = np.concatenate(chosen)[np.argsort(np.concatenate(keys), kind='stable')]
+        return order
+    
+    def describe(self) -> dict:
+        """
+        Parâmetros do sampler (registrados no config.json do modelo)
+        """
+        return {
+            'strategy': 'class_balanced',
+            'samples_per_class': self.samples_per_class,
+            'max_per_class': self.max_per_class,
+            'oversample': self.oversample
+        }
+    
+    def summary(self, labels: np.ndarray, class_names=None):
+        """
+        Imprime a distribuição por espécie antes e depois do balanceamento
+        """
+        classes, counts = np.unique(labels, return_counts=True)
+        quota = self.class_quota(counts)
+        
+        print(f"\n⚖️  Amostragem balanceada ({quota} amostras/espécie por época):")
+        for cls, count in zip(classes, counts):
+            name = class_names[cls] if class_names else str(cls)
+            n = quota if self.oversample else min(quota, count)
+            print(f"   {name:40s} {count:5d} → {n:5d}")
+
+
+class SpectrogramSequence(keras.utils.Sequence):
+    """
+    Loader preguiçoso: lê do disco apenas os espectrogramas de cada batch
+    """
+    
+    def __init__(self, files, labels, indices, prepare_fn, stats,
+                 batch_size=32, shuffle=False, seed=42,
+                 augmenter=None, num_classes=None, sampler=None):
+        """
+        Inicializa o loader
+        
+        Args:
+            files: Caminhos de todos os espectrogramas do índice
+            labels: Labels de todos os espectrogramas
+            indices: Índices (do split) consumidos por este loader
+            prepare_fn: Função 2D → (128, 128, 3) (AmphibianClassifier._prepare_spectrogram)
+            stats: {'min', 'max'} para normalização em [0, 1]
+            batch_size: Tamanho do batch
+            shuffle: Se deve embaralhar a ordem a cada época
+            seed: Semente do embaralhamento e do aumento de dados
+            augmenter: SpectrogramAugmenter opcional
+            num_classes: Se definido, os labels são entregues em one-hot
+            sampler: ClassBalancedSampler opcional que define a ordem da época
+        """
+        super().__init__()
+        self.files = files
+        self.labels = labels
+        self.indices = np.array(indices)
+        self.prepare_fn = prepare_fn
+        self.offset = stats['min']
+        self.scale = 1.0 / (stats['max'] - stats['min'])
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.augmenter = augmenter
+        self.num_classes = num_classes
+        self.sampler = sampler
+        self.epoch = 0
+        # Ordens já sorteadas, por (época, batch_size)
+        self._orders = {}
+        self._order_lock = threading.Lock()
+        # Tempo gasto preparando batches (lido por ThroughputLogger)
+        self.fetch_time = 0.0
+        self.fetch_count = 0
+        self._fetch_lock = threading.Lock()
+        # Amostras por época (fixo entre épocas, mesmo com sampler)
+        self.epoch_size = len(self.epoch_order(0))
+    
+    def __len__(self):
+        return math.ceil(self.epoch_size / self.batch_size)
+    
+    @property
+    def order(self) -> np.ndarray:
+        """
+        Ordem da época atual
+        """
+        return self.epoch_order(self.epoch)
+    
+    def epoch_order(self, epoch: int) -> np.ndarray:
+        """
+        Ordem dos índices em uma época: função pura de (semente, época)
+        
+        Batches de épocas diferentes podem ser preparados ao mesmo tempo
+        (prefetch do tf.data na virada da época) sem ler uma ordem alterada.
+        
+        Args:
+            epoch: Época de treino
+        
+        Returns:
+            Índices (no índice do dataset) da época, somente leitura
+        """
+        key = (epoch, self.batch_size)
+        with self._order_lock:
+            order = self._orders.get(key)
+            if order is None:
+                order = self._draw_order(epoch)
+                order.flags.writeable = False
+                self._orders[key] = order
+                # Só a época atual e a seguinte são lidas ao mesmo tempo
+                for old in [k for k in self._orders if k[0] < epoch - 1]:
+                    del self._orders[old]
+            return order
+    
+    def _draw_order(self, epoch: int) -> np.ndarray:
+        rng = np.random.default_rng([self.seed, epoch])
+        if self.sampler is not None:
+            # Tamanho fixo entre épocas (quota × espécies), compatível com tf.data
+            order = self.sampler.epoch_order(self.indices, self.labels[self.indices], rng)
+            if self.shuffle:
+                # Embaralha dentro de cada batch, preservando a composição balanceada
+                for start in range(0, len(order), self.batch_size):
+                    rng.shuffle(order[start:start + self.batch_size])
+            return order
+        
+        order = self.indices.copy()
+        if self.shuffle:
+            rng.shuffle(order)
+        return order
+    
+    def batch_indices(self, i: int, epoch: int = None) -> np.ndarray:
+        """
+        Índices (no índice do dataset) do batch i
+        
+        Args:
+            i: Batch dentro da época
+            epoch: Época (None = época atual do loader)
+        """
+        if epoch is None:
+            epoch = self.epoch
+        return self.epoch_order(epoch)[i * self.batch_size:(i + 1) * self.batch_size]
+    
+    def _load(self, idx) -> np.ndarray:
+        """
+        Lê e normaliza os espectrogramas dos índices
+        """
+        X = np.stack([self.prepare_fn(load_spectrogram(self.files[k])) for k in idx]).astype(np.float32)
+        X -= self.offset
+        X *= self.scale
+        return X
+    
+    def __getitem__(self, i):
+        return self.get_batch(i, self.epoch)
+    
+    def get_batch(self, i: int, epoch: int):
+        """
+        Prepara o batch i de uma época
+        
+        Args:
+            i: Batch dentro da época
+            epoch: Época (define a ordem e o sorteio do aumento de dados)
+        
+        Returns:
+            Tupla (X, y)
+        """
+        start = time.perf_counter()
+        idx = self.batch_indices(i, epoch)
+        X = self._load(idx)
+        y = self.labels[idx]
+        
+        if self.num_classes is not None:
+            y = np.eye(self.num_classes, dtype=np.float32)[y]
+        
+        if self.augmenter is not None:
+            # Gerador derivado de (semente, época, batch): independe da ordem dos workers
+            rng = np.random.default_rng([self.seed, epoch, i])
+            X, y = self.augmenter(X, y, rng)
+        
+        # Chamado em paralelo pelas threads do tf.data
+        with self._fetch_lock:
+            self.fetch_time += time.perf_counter() - start
+            self.fetch_count += 1
+        
+        return X, y
+    
+    def on_epoch_end(self):
+        # Protocolo keras.utils.Sequence (fit direto no loader); as_dataset
+        # deriva a época da posição no fluxo e não depende deste contador
+        self.epoch += 1
+    
+    def as_dataset(self, num_parallel_calls=tf.data.AUTOTUNE, num_shards=1, shard_index=0,
+                   drop_remainder=False, repeat=False) -> tf.data.Dataset:
+        """
+        Expõe o loader como tf.data, preparando batches em paralelo ao treino
+        
+        Args:
+            num_parallel_calls: Batches preparados simultaneamente
+            num_shards: Número de pipelines (workers) que dividem os batches;
+                cada um recebe n_batches // num_shards batches por época
+            shard_index: Pipeline deste processo
+            drop_remainder: Descarta o último batch incompleto
+            repeat: Fluxo contínuo de épocas a partir de self.epoch (usar com
+                steps_per_epoch); sem repeat, apenas a época atual
+        
+        Returns:
+            tf.data.Dataset de (X, y)
+        """
+        x_spec, y_spec = self[0][0], self[0][1]
+        y_dtype = tf.float32 if y_spec.dtype == np.float32 else tf.int64
+        
+        base_epoch = self.epoch
+        n_batches = self.epoch_size // self.batch_size if drop_remainder else len(self)
+        # Todos os fragmentos com o mesmo número de batches: com repeat, a
+        # época de cada worker termina exatamente na fronteira da época
+        per_shard = n_batches // num_shards
+        
+        def load(g):
+            # Posição no fluxo → (época, batch): a época vem do próprio índice,
+            # então o prefetch da época seguinte não depende de estado mutável
+            epoch, k = divmod(int(g), per_shard)
+            X, y = self.get_batch(k * num_shards + shard_index, base_epoch + epoch)
+            return X.astype(np.float32), y.astype(y_dtype.as_numpy_dtype)
+        
+        def set_shapes(X, y):
+            X.set_shape((None, *x_spec.shape[1:]))
+            y.set_shape((None, *y_spec.shape[1:]))
+            return X, y
+        
+        ds = tf.data.Dataset.range(np.iinfo(np.int64).max if repeat else per_shard)
+        ds = ds.map(lambda i: tf.numpy_function(load, [i], [tf.float32, y_dtype]),
+                    num_parallel_calls=num_parallel_calls, deterministic=True)
+        return ds.map(set_shapes).prefetch(tf.data.AUTOTUNE)
+
+
+class ArraySequence(SpectrogramSequence):
+    """
+    Mesmo pipeline (embaralhamento, aumento, one-hot) sobre arrays em memória
+    """
+    
+    def __init__(self, X, y, batch_size=32, shuffle=False, seed=42,
+                 augmenter=None, num_classes=None, sampler=None):
+        """
+        Inicializa o loader
+        
+        Args:
+            X: Array normalizado (N, altura, largura, canais), ex: de load_dataset
+            y: Labels (N,)
+            batch_size: Tamanho do batch
+            shuffle: Se deve embaralhar a ordem a cada época
+            seed: Semente do embaralhamento e do aumento de dados
+            augmenter: SpectrogramAugmenter opcional
+            num_classes: Se definido, os labels são entregues em one-hot
+            sampler: ClassBalancedSampler opcional que define a ordem da época
+        """
+        super().__init__(None, np.asarray(y), np.arange(len(y)), prepare_fn=None,
+                         stats={'min': 0.0, 'max': 1.0}, batch_size=batch_size,
+                         shuffle=shuffle, seed=seed, augmenter=augmenter,
+                         num_classes=num_classes, sampler=sampler)
+        self.X = X
+    
+    def _load(self, idx) -> np.ndarray:
+        return np.asarray(self.X[idx], dtype=np.float32)
+
+
+LOGGING_PROFILES = ('off', 'scalars', 'full')
+
+
+class ThroughputLogger(keras.callbacks.Callback):
+    """
+    Métricas de throughput por passo: amostras/s, espera por dados e cálculo
+    
+    O tempo de passo (on_train_batch_begin → on_train_batch_end) inclui a
+    espera pelo próximo batch, pois o Keras consome o iterador dentro da
+    train_function. timed() marca o instante em que cada batch sai do
+    pipeline: data_wait_ms vai do início do passo até a marca e compute_ms
+    da marca até o fim do passo. O custo de leitura do loader
+    (SpectrogramSequence.__getitem__, em threads do tf.data) é registrado à
+    parte como fetch_ms_per_batch.
+    """
+    
+    def __init__(self, log_dir, batch_size=None, log_every=20, sequence=None):
+        """
+        Inicializa o logger
+        
+        Args:
+            log_dir: Diretório de logs do TensorBoard
+            batch_size: Batch global por passo, somado de todos os workers
+                (None = desconhecido, sem amostras/s)
+            log_every: Intervalo (passos) entre registros no TensorBoard
+            sequence: SpectrogramSequence de treino, para o tempo de leitura (opcional)
+        """
+        super().__init__()
+        self.log_dir = Path(log_dir)
+        self.batch_size = batch_size
+        self.log_every = max(1, log_every)
+        self.sequence = sequence
+        self.writer = None
+        self.step = 0
+        self._batch_start = None
+        # Instantes em que os batches saíram do pipeline (FIFO, um por passo)
+        self._ready = deque()
+        self._reset()
+    
+    def _reset(self):
+        self.step_time = 0.0
+        self.steps = 0
+        self.wait_time = 0.0
+        self.compute_time = 0.0
+        self.timed_steps = 0
+        self._fetch_start = self._fetch_snapshot()
+    
+    def timed(self, dataset: tf.data.Dataset) -> tf.data.Dataset:
+        """
+        Marca o instante em que cada batch é entregue ao passo de treino
+        
+        Deve ser o último estágio do pipeline: a marca roda quando o passo
+        pede o batch, então o tempo até ela é espera por dados.
+        
+        Args:
+            dataset: tf.data.Dataset de (X, y)
+        
+        Returns:
+            Dataset com os mesmos elementos
+        """
+        def mark():
+            now = time.perf_counter()
+            self._ready.append(now)
+            return np.float64(now)
+        
+        def stamp(X, y):
+            marker = tf.numpy_function(mark, [], tf.float64, stateful=True)
+            with tf.control_dependencies([marker]):
+                return tf.identity(X), tf.identity(y)
+        
+        # Sem prefetch automático depois da marca
+        options = tf.data.Options()
+        options.experimental_optimization.inject_prefetch = False
+        return dataset.map(stamp).with_options(options)
+    
+    def _fetch_snapshot(self):
+        if self.sequence is None:
+            return (0.0, 0)
+        return (self.sequence.fetch_time, self.sequence.fetch_count)
+    
+    def _fetch_ms(self):
+        """
+        Tempo médio (ms) de preparação de um batch desde o início da época
+        """
+        fetch_time, fetch_count = self._fetch_snapshot()
+        count = fetch_count - self._fetch_start[1]
+        if count <= 0:
+            return None
+        return 1000 * (fetch_time - self._fetch_start[0]) / count
+    
+    def on_train_begin(self, logs=None):
+        self.writer = tf.summary.create_file_writer(str(self.log_dir / 'throughput'))
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self._reset()
+    
+    def on_train_batch_begin(self, batch, logs=None):
+        self._batch_start = time.perf_counter()
+    
+    def on_train_batch_end(self, batch, logs=None):
+        end = time.perf_counter()
+        self.step_time += end - self._batch_start
+        if self._ready:
+            # Batch já pronto antes do passo (prefetch do dispositivo): espera zero
+            ready = min(max(self._ready.popleft(), self._batch_start), end)
+            self.wait_time += ready - self._batch_start
+            self.compute_time += end - ready
+            self.timed_steps += 1
+        self.steps += 1
+        self.step += 1
+        
+        if self.step % self.log_every == 0:
+            self._write(self.step, prefix='step')
+    
+    def _write(self, step, prefix):
+        if self.steps == 0 or self.step_time <= 0:
+            return
+        
+        fetch_ms = self._fetch_ms()
+        with self.writer.as_default(step=step):
+            tf.summary.scalar(f'{prefix}/steps_per_second', self.steps / self.step_time)
+            tf.summary.scalar(f'{prefix}/step_ms', 1000 * self.step_time / self.steps)
+            if self.timed_steps:
+                tf.summary.scalar(f'{prefix}/data_wait_ms', 1000 * self.wait_time / self.timed_steps)
+                tf.summary.scalar(f'{prefix}/compute_ms', 1000 * self.compute_time / self.timed_steps)
+            if fetch_ms is not None:
+                tf.summary.scalar(f'{prefix}/fetch_ms_per_batch', fetch_ms)
+            if self.batch_size:
+                tf.summary.scalar(f'{prefix}/global_samples_per_second',
+                                  self.steps * self.batch_size / self.step_time)
+    
+    def on_epoch_end(self, epoch, logs=None):
+        self._write(epoch, prefix='epoch')
+        self.writer.flush()
+        
+        if self.steps and self.step_time > 0:
+            rate = (f" | {self.steps * self.batch_size / self.step_time:.0f} amostras/s (global)"
+                    if self.batch_size else "")
+            fetch_ms = self._fetch_ms()
+            fetch = f" | leitura {fetch_ms:.0f} ms/batch" if fetch_ms is not None else ""
+            split = (f" (espera {1000 * self.wait_time / self.timed_steps:.0f} ms"
+                     f" + cálculo {1000 * self.compute_time / self.timed_steps:.0f} ms)"
+                     if self.timed_steps else "")
+            print(f"   ⏱️  {1000 * self.step_time / self.steps:.0f} ms/passo{split}{fetch}{rate}")
+    
+    def on_train_end(self, logs=None):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def logging_callbacks(log_dir, profile='scalars', profile_batches=None, batch_size=None,
+                      sequence=None) -> list:
+    """
+    Callbacks de log conforme o perfil
+    
+    Args:
+        log_dir: Diretório de logs do TensorBoard
+        profile: 'off', 'scalars' ou 'full'
+        profile_batches: Janela (início, fim) de batches do profiler (None = desligado)
+        batch_size: Batch global por passo, para amostras/s
+        sequence: SpectrogramSequence de treino, para o tempo de leitura
+        
+    Returns:
+        Lista de callbacks (vazia com 'off')
+    """
+    if profile not in LOGGING_PROFILES:
+        raise ValueError(f"Perfil de log desconhecido: {profile} (use {LOGGING_PROFILES})")
+    if profile == 'off':
+        return []
+    
+    callbacks = [
+        TensorBoard(
+            log_dir=str(log_dir),
+            histogram_freq=1 if profile == 'full' else 0,
+            write_graph=profile == 'full',
+            profile_batch=tuple(profile_batches) if profile_batches else 0
+        ),
+        ThroughputLogger(log_dir, batch_size=batch_size, sequence=sequence)
+    ]
+    return callbacks
+
+
+class DistributedContext:
+    """
+    Estratégia de distribuição e papel deste processo no cluster
+    
+    Lê o TF_CONFIG padrão do TensorFlow. Com multi_worker=True usa
+    MultiWorkerMirroredStrategy (all-reduce síncrono entre processos, CPU);
+    sem ele, a estratégia padrão de uma máquina.
+    """
+    
+    def __init__(self, multi_worker=False, threads=None):
+        """
+        Inicializa o contexto (antes de qualquer outra operação do TensorFlow)
+        
+        Args:
+            multi_worker: Se deve criar MultiWorkerMirroredStrategy
+            threads: Threads intra-op deste processo (útil com vários workers por máquina)
+        """
+        if threads:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(2)
+        
+        self.tf_config = json.loads(os.environ.get('TF_CONFIG', '{}'))
+        cluster = self.tf_config.get('cluster', {})
+        task = self.tf_config.get('task', {})
+        
+        self.multi_worker = multi_worker
+        self.task_type = task.get('type', 'worker')
+        self.task_index = int(task.get('index', 0))
+        self.num_workers = max(1, len(cluster.get('chief', [])) + len(cluster.get('worker', [])))
+        # Sem 'chief' no cluster, o worker 0 faz o papel de chief
+        self.is_chief = (self.task_type == 'chief' or
+                         (self.task_type == 'worker' and self.task_index == 0 and 'chief' not in cluster))
+        
+        if multi_worker:
+            options = tf.distribute.experimental.CommunicationOptions(
+                implementation=tf.distribute.experimental.CommunicationImplementation.RING
+            )
+            self.strategy = tf.distribute.MultiWorkerMirroredStrategy(communication_options=options)
+            print(f"🌐 Multi-worker: {self.task_type} {self.task_index} de {self.num_workers} "
+                  f"({'chief' if self.is_chief else 'worker'}, "
+                  f"{self.strategy.num_replicas_in_sync} réplicas)")
+        else:
+            self.strategy = tf.distribute.get_strategy()
+    
+    def write_dir(self, model_dir) -> Path:
+        """
+        Onde este processo grava arquivos
+        
+        Todos os workers precisam executar os saves (há operações coletivas),
+        mas só o chief grava no diretório do modelo; os demais usam um
+        diretório temporário descartado ao final.
+        """
+        model_dir = Path(model_dir)
+        if self.is_chief:
+            return model_dir
+        return model_dir / '.workers' / f"{self.task_type}_{self.task_index}"
+    
+    def cleanup(self, model_dir):
+        """
+        Remove o diretório temporário de um worker não-chief
+        """
+        if not self.is_chief:
+            shutil.rmtree(self.write_dir(model_dir), ignore_errors=True)
+    
+    def per_replica_batch_size(self, global_batch_size: int) -> int:
+        """
+        Batch de cada réplica a partir do batch global
+        """
+        replicas = self.strategy.num_replicas_in_sync
+        if global_batch_size % replicas:
+            print(f"⚠️  Batch global {global_batch_size} não é múltiplo de {replicas} réplicas")
+        return max(1, global_batch_size // replicas)
+    
+    def distribute_sequence(self, sequence, global_batch_size: int, map_fn=None):
+        """
+        Pipeline de entrada fragmentado: cada worker lê apenas os seus batches
+        
+        Todos os workers usam a mesma semente, então a ordem da época é
+        idêntica e os fragmentos são disjuntos.
+        
+        Args:
+            sequence: SpectrogramSequence (ou ArraySequence)
+            global_batch_size: Batch somado de todas as réplicas
+            map_fn: Último estágio do pipeline de cada worker (ex: ThroughputLogger.timed)
+        
+        Returns:
+            Tupla (dataset distribuído, passos por época)
+        """
+        sequence.batch_size = self.per_replica_batch_size(global_batch_size)
+        steps = (sequence.epoch_size // sequence.batch_size) // self.num_workers
+        if steps == 0:
+            raise ValueError(f"Dados insuficientes para {self.num_workers} workers com batch {global_batch_size}")
+        
+        def dataset_fn(input_context):
+            ds = sequence.as_dataset(
+                num_shards=input_context.num_input_pipelines,
+                shard_index=input_context.input_pipeline_id,
+                drop_remainder=True,
+                repeat=True
+            )
+            # Fragmentação já feita por batch: desativar a automática
+            options = tf.data.Options()
+            options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+            ds = ds.with_options(options)
+            return map_fn(ds) if map_fn is not None else ds
+        
+        return self.strategy.distribute_datasets_from_function(dataset_fn), steps
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def launch_local_workers(n_workers: int, run_name: str, extra_args=(), log_dir=None) -> int:
+    """
+    Executa o treino multi-worker com n processos locais (teste em uma máquina)
+    
+    Cada processo recebe um TF_CONFIG com o cluster localhost e roda este
+    script com --multi-worker. A saída do chief vai para o terminal; a dos
+    demais, para arquivos de log.
+    
+    Args:
+        n_workers: Número de processos
+        run_name: Nome comum do diretório do modelo
+        extra_args: Argumentos repassados aos workers (ex: --resume)
+        log_dir: Diretório dos logs dos workers (padrão: temporário)
+        
+    Returns:
+        Código de saída (0 se todos terminaram bem)
+    """
+    cluster = {'worker': [f"localhost:{_free_port()}" for _ in range(n_workers)]}
+    threads = max(1, (os.cpu_count() or 1) // n_workers)
+    log_dir = Path(log_dir or tempfile.mkdtemp(prefix=f"{run_name}_"))
+    log_dir.mkdir(parents=True, exist_ok=True)
+    
+    print(f"🚀 Iniciando {n_workers} workers locais ({threads} threads cada)")
+    print(f"   Cluster: {', '.join(cluster['worker'])}")
+    print(f"   Logs dos workers: {log_dir}")
+    
+    processes, logs = [], []
+    for index in range(n_workers):
+        env = dict(os.environ)
+        env['TF_CONFIG'] = json.dumps({'cluster': cluster, 'task': {'type': 'worker', 'index': index}})
+        command = [sys.executable, str(Path(__file__).resolve()), '--multi-worker',
+                   '--run-name', run_name, '--threads', str(threads), *extra_args]
+        
+        if index == 0:
+            processes.append(subprocess.Popen(command, env=env))
+        else:
+            log = open(log_dir / f"worker_{index}.log", 'w')
+            logs.append(log)
+            processes.append(subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT))
+    
+    try:
+        codes = [process.wait() for process in processes]
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for log in logs:
+            log.close()
+    
+    failed = [i for i, code in enumerate(codes) if code != 0]
+    if failed:
+        print(f"❌ Workers com erro: {failed} (ver {log_dir})")
+        return 1
+    return 0
+
+
+class TrainingCheckpoint(keras.callbacks.Callback):
+    """
+    Checkpoints completos para retomar treinos interrompidos
+    
+    A cada N épocas grava pesos e estado do otimizador (tf.train.Checkpoint)
+    em <model_dir>/checkpoints e, em training_state.json, a época, o estado
+    interno de EarlyStopping/ReduceLROnPlateau/ModelCheckpoint, a semente,
+    a época do loader (ordem e aumento dos batches) e o histórico.
+    """
+    
+    STATE_FILE = 'training_state.json'
+    
+    def __init__(self, model_dir, callbacks=(), every_n_epochs=1, max_to_keep=2, seed=42,
+                 timestamp=None, sequence=None, run_config=None, write_dir=None):
+        """
+        Inicializa o callback
+        
+        Args:
+            model_dir: Diretório do modelo
+            callbacks: Callbacks do fit cujo estado é salvo e restaurado
+            every_n_epochs: Intervalo (épocas) entre checkpoints
+            max_to_keep: Checkpoints mantidos em disco
+            seed: Semente global do treino
+            timestamp: Timestamp do diretório do modelo
+            sequence: SpectrogramSequence de treino (opcional)
+            run_config: Hiperparâmetros registrados para conferência
+            write_dir: Onde gravar (padrão: model_dir; workers não-chief
+                usam um diretório temporário e leem do model_dir)
+        """
+        super().__init__()
+        self.model_dir = Path(model_dir)
+        self.write_dir = Path(write_dir or model_dir)
+        self.checkpoint_dir = self.model_dir / 'checkpoints'
+        self.every_n_epochs = max(1, every_n_epochs)
+        self.max_to_keep = max_to_keep
+        self.seed = seed
+        self.timestamp = timestamp
+        self.sequence = sequence
+        self.run_config = run_config or {}
+        self.tracked = self._stateful_callbacks(callbacks)
+        self.history = {}
+        self._manager = None
+        self._pending = None
+    
+    @classmethod
+    def load_state(cls, model_dir) -> dict:
+        """
+        Lê training_state.json de um diretório de modelo
+        """
+        state_path = Path(model_dir) / cls.STATE_FILE
+        if not state_path.exists():
+            raise FileNotFoundError(f"Nenhum checkpoint para retomar em {model_dir}")
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    
+    def _checkpoint_manager(self, model):
+        if self._manager is None:
+            checkpoint = tf.train.Checkpoint(model=model, optimizer=model.optimizer)
+            self._manager = tf.train.CheckpointManager(
+                checkpoint, str(self.write_dir / 'checkpoints'), max_to_keep=self.max_to_keep
+            )
+        return self._manager
+    
+    @staticmethod
+    def _stateful_callbacks(callbacks) -> dict:
+        """
+        Callbacks cujo estado interno precisa sobreviver à retomada
+        """
+        tracked = {}
+        for callback in callbacks:
+            if isinstance(callback, EarlyStopping):
+                tracked['early_stopping'] = (callback, ('wait', 'best', 'best_epoch'))
+            elif isinstance(callback, ReduceLROnPlateau):
+                tracked['reduce_lr'] = (callback, ('wait', 'best', 'cooldown_counter'))
+            elif isinstance(callback, ModelCheckpoint):
+                tracked['model_checkpoint'] = (callback, ('best',))
+        return tracked
+    
+    def restore(self, model) -> int:
+        """
+        Restaura pesos, otimizador e loader; o estado dos callbacks (e os
+        melhores pesos do EarlyStopping) é aplicado em on_train_begin
+        
+        Args:
+            model: Modelo já construído com a mesma arquitetura
+            
+        Returns:
+            Época inicial (initial_epoch do fit)
+        """
+        state = self.load_state(self.model_dir)
+        manager = self._checkpoint_manager(model)
+        checkpoint_path = str(self.checkpoint_dir / state['checkpoint'])
+        
+        # Slots do otimizador são restaurados quando criados no primeiro passo
+        manager.checkpoint.restore(checkpoint_path).expect_partial()
+        
+        self.history = state.get('history', {})
+        if self.sequence is not None and 'data_epoch' in state:
+            # as_dataset parte desta época
+            self.sequence.epoch = state['data_epoch']
+        
+        self._pending = state.get('callbacks', {})
+        return int(state['epoch'])
+    
+    def _restore_best_weights(self):
+        """
+        Recarrega os melhores pesos no EarlyStopping (restore_best_weights)
+        
+        Precisa rodar depois do on_train_begin do EarlyStopping, que zera
+        best_weights no início de todo fit.
+        """
+        early_stopping = self.tracked.get('early_stopping', (None,))[0]
+        if early_stopping is None or not early_stopping.restore_best_weights:
+            return
+        
+        best_path = self.model_dir / 'best_model.h5'
+        if best_path.exists():
+            early_stopping.best_weights = keras.models.load_model(str(best_path), compile=False).get_weights()
+        
+        if early_stopping.best_weights is None:
+            print(f"⚠️  {best_path.name} não encontrado: EarlyStopping não poderá restaurar "
+                  f"os melhores pesos anteriores à retomada")
+    
+    def on_train_begin(self, logs=None):
+        if self._pending is None:
+            return
+        
+        for name, (callback, attributes) in self.tracked.items():
+            for attribute, value in self._pending.get(name, {}).items():
+                if attribute in attributes:
+                    setattr(callback, attribute, value)
+        self._restore_best_weights()
+        self._pending = None
+    
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(float(value))
+        
+        if (epoch + 1) % self.every_n_epochs != 0:
+            return
+        
+        path = self._checkpoint_manager(self.model).save(checkpoint_number=epoch + 1)
+        
+        callback_state = {}
+        for name, (callback, attributes) in self.tracked.items():
+            callback_state[name] = {a: float(getattr(callback, a)) if a == 'best' else int(getattr(callback, a))
+                                    for a in attributes if hasattr(callback, a)}
+        
+        state = {
+            'epoch': epoch + 1,
+            'checkpoint': Path(path).name,
+            'timestamp': self.timestamp,
+            'seed': self.seed,
+            'learning_rate': float(keras.backend.get_value(self.model.optimizer.learning_rate)),
+            # Época do loader = época do fit (as_dataset segue a posição no fluxo)
+            'data_epoch': epoch + 1,
+            'callbacks': callback_state,
+            'run_config': self.run_config,
+            'history': self.history,
+            'saved_at': datetime.now().isoformat()
+        }
+        
+        # Escrita atômica: uma interrupção aqui mantém o estado anterior válido
+        state_path = self.write_dir / self.STATE_FILE
+        tmp_path = state_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
+
+
+class StreamingEvaluator:
+    """
+    Avaliação em uma única passada, batch a batch
+    
+    Acumula matriz de confusão, top-k, log-loss e os bins de calibração
+    (ECE) sem manter as probabilidades de todo o conjunto; por amostra
+    guarda apenas label, predição, confiança e acertos top-k, suficientes
+    para os intervalos de confiança por bootstrap.
+    """
+    
+    def __init__(self, num_classes: int, class_names=None, top_k=(3, 5), n_bins=15):
+        """
+        Inicializa o avaliador
+        
+        Args:
+            num_classes: Número de classes
+            class_names: Nomes das classes (relatório por espécie)
+            top_k: Valores de k para top-k accuracy
+            n_bins: Bins de confiança do ECE
+        """
+        self.num_classes = num_classes
+        self.class_names = list(class_names) if class_names is not None else [str(i) for i in range(num_classes)]
+        self.top_k = tuple(top_k)
+        self.n_bins = n_bins
+        
+        self.confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self.loss_sum = 0.0
+        self.bin_count = np.zeros(n_bins, dtype=np.int64)
+        self.bin_confidence = np.zeros(n_bins)
+        self.bin_correct = np.zeros(n_bins)
+        self._y_true, self._y_pred, self._confidence = [], [], []
+        self._top_hits = {k: [] for k in self.top_k}
+        self._unknown = []
+    
+    def update(self, y_true, probs, unknown=None):
+        """
+        Acumula um batch
+        
+        Args:
+            y_true: Labels (B,) ou one-hot (B, classes)
+            probs: Probabilidades (B, classes)
+            unknown: Máscara (B,) de rejeição open-set (opcional)
+        """
+        probs = np.asarray(probs, dtype=np.float32)
+        y_true = np.asarray(y_true)
+        if y_true.ndim == 2:
+            y_true = y_true.argmax(axis=1)
+        y_true = y_true.astype(np.int64)
+        
+        y_pred = probs.argmax(axis=1)
+        confidence = probs[np.arange(len(probs)), y_pred]
+        correct = y_pred == y_true
+        
+        self.confusion += np.bincount(y_true * self.num_classes + y_pred,
+                                      minlength=self.num_classes ** 2).reshape(self.num_classes, -1)
+        self.loss_sum += float(-np.log(np.clip(probs[np.arange(len(probs)), y_true], 1e-7, 1.0)).sum())
+        
+        bins = np.minimum((confidence * self.n_bins).astype(np.int64), self.n_bins - 1)
+        self.bin_count += np.bincount(bins, minlength=self.n_bins)
+        self.bin_confidence += np.bincount(bins, weights=confidence, minlength=self.n_bins)
+        self.bin_correct += np.bincount(bins, weights=correct, minlength=self.n_bins)
+        
+        # Posição do label verdadeiro no ranking (0 = top-1)
+        true_prob = probs[np.arange(len(probs)), y_true]
+        rank = (probs > true_prob[:, None]).sum(axis=1)
+        for k in self.top_k:
+            self._top_hits[k].append(rank < k)
+        
+        self._y_true.append(y_true.astype(np.int32))
+        self._y_pred.append(y_pred.astype(np.int32))
+        self._confidence.append(confidence.astype(np.float16))
+        if unknown is not None:
+            self._unknown.append(np.asarray(unknown, dtype=bool))
+    
+    def run(self, model, X, y=None, batch_size=256, open_set=None):
+        """
+        Inferência em batches alimentando o avaliador
+        
+        Args:
+            model: Modelo Keras
+            X: Array, SpectrogramSequence ou tf.data.Dataset de (X, y)
+            y: Labels (apenas para arrays)
+            batch_size: Tamanho do batch (apenas para arrays)
+            open_set: OpenSetDetector calibrado (opcional); as probabilidades
+                e a rejeição saem da mesma inferência por batch
+        """
+        if y is not None:
+            batches = ((X[i:i + batch_size], y[i:i + batch_size]) for i in range(0, len(X), batch_size))
+            total = math.ceil(len(X) / batch_size)
+        elif isinstance(X, SpectrogramSequence):
+            batches, total = X.as_dataset().as_numpy_iterator(), len(X)
+        else:
+            batches, total = X.as_numpy_iterator(), None
+        
+        for X_batch, y_batch in tqdm(batches, total=total, desc="Avaliando", leave=False):
+            if open_set is not None:
+                unknown, probs = open_set.score_batch(X_batch)
+                self.update(y_batch, probs, unknown=unknown)
+            else:
+                self.update(y_batch, model(X_batch, training=False))
+    
+    @property
+    def y_true(self) -> np.ndarray:
+        return np.concatenate(self._y_true) if self._y_true else np.array([], dtype=np.int32)
+    
+    @property
+    def y_pred(self) -> np.ndarray:
+        return np.concatenate(self._y_pred) if self._y_pred else np.array([], dtype=np.int32)
+    
+    @property
+    def unknown(self) -> np.ndarray:
+        return np.concatenate(self._unknown) if self._unknown else np.array([], dtype=bool)
+    
+    @staticmethod
+    def _macro_f1(confusion) -> float:
+        tp = np.diag(confusion).astype(np.float64)
+        predicted = confusion.sum(axis=0)
+        actual = confusion.sum(axis=1)
+        f1 = np.divide(2 * tp, predicted + actual, out=np.zeros_like(tp), where=(predicted + actual) > 0)
+        return float(f1[actual > 0].mean()) if (actual > 0).any() else 0.0
+    
+    def _ece(self, count, confidence, correct) -> float:
+        n = count.sum()
+        if n == 0:
+            return 0.0
+        gap = np.abs(correct - confidence)
+        return float(gap.sum() / n)
+    
+    def bootstrap(self, n_bootstrap=1000, alpha=0.05, seed=42) -> dict:
+        """
+        Intervalos de confiança por bootstrap das amostras armazenadas
+        
+        Returns:
+            Dicionário {métrica: [limite inferior, limite superior]}
+        """
+        y_true, y_pred = self.y_true.astype(np.int64), self.y_pred.astype(np.int64)
+        confidence = np.concatenate(self._confidence).astype(np.float64)
+        correct = (y_true == y_pred).astype(np.float64)
+        top_hits = {k: np.concatenate(v) for k, v in self._top_hits.items()}
+        bins = np.minimum((confidence * self.n_bins).astype(np.int64), self.n_bins - 1)
+        cells = y_true * self.num_classes + y_pred
+        n = len(y_true)
+        
+        rng = np.random.default_rng(seed)
+        samples = {name: np.empty(n_bootstrap) for name in ['accuracy', 'macro_f1', 'ece'] +
+                   [f'top_{k}_accuracy' for k in self.top_k]}
+        
+        for b in range(n_bootstrap):
+            # Pesos de reamostragem: quantas vezes cada amostra foi sorteada
+            weights = np.bincount(rng.integers(0, n, n), minlength=n).astype(np.float64)
+            samples['accuracy'][b] = (weights * correct).sum() / n
+            for k, hits in top_hits.items():
+                samples[f'top_{k}_accuracy'][b] = (weights * hits).sum() / n
+            
+            confusion = np.bincount(cells, weights=weights, minlength=self.num_classes ** 2)
+            samples['macro_f1'][b] = self._macro_f1(confusion.reshape(self.num_classes, -1))
+            
+            samples['ece'][b] = self._ece(
+                np.bincount(bins, weights=weights, minlength=self.n_bins),
+                np.bincount(bins, weights=weights * confidence, minlength=self.n_bins),
+                np.bincount(bins, weights=weights * correct, minlength=self.n_bins)
+            )
+        
+        bounds = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+        return {name: [float(v) for v in np.percentile(values, bounds)] for name, values in samples.items()}
+    
+    def report(self, n_bootstrap=1000, alpha=0.05, seed=42) -> dict:
+        """
+        Métricas finais com intervalos de confiança
+        
+        Args:
+            n_bootstrap: Reamostragens (0 = sem intervalos)
+            alpha: Nível de significância (0.05 = IC 95%)
+            seed: Semente do bootstrap
+            
+        Returns:
+            Dicionário serializável em JSON
+        """
+        n = int(self.confusion.sum())
+        if n == 0:
+            raise ValueError("Nenhuma amostra avaliada")
+        
+        tp = np.diag(self.confusion).astype(np.float64)
+        predicted = self.confusion.sum(axis=0)
+        actual = self.confusion.sum(axis=1)
+        precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+        recall = np.divide(tp, actual, out=np.zeros_like(tp), where=actual > 0)
+        f1 = np.divide(2 * precision * recall, precision + recall,
+                       out=np.zeros_like(tp), where=(precision + recall) > 0)
+        
+        point = {
+            'accuracy': float(tp.sum() / n),
+            'macro_f1': self._macro_f1(self.confusion),
+            'ece': self._ece(self.bin_count, self.bin_confidence, self.bin_correct)
+        }
+        for k, hits in self._top_hits.items():
+            point[f'top_{k}_accuracy'] = float(np.concatenate(hits).mean())
+        
+        intervals = self.bootstrap(n_bootstrap, alpha, seed) if n_bootstrap else {}
+        
+        report = {
+            'num_samples': n,
+            'loss': self.loss_sum / n,
+            'confidence_level': 1 - alpha,
+            'n_bootstrap': n_bootstrap
+        }
+        for name, value in point.items():
+            report[name] = {'value': value, 'ci': intervals.get(name, [value, value])}
+        
+        report['per_class'] = {
+            name: {
+                'precision': float(precision[i]),
+                'recall': float(recall[i]),
+                'f1': float(f1[i]),
+                'support': int(actual[i])
+            }
+            for i, name in enumerate(self.class_names)
+        }
+        report['calibration'] = {
+            'bin_edges': np.linspace(0, 1, self.n_bins + 1).round(4).tolist(),
+            'count': self.bin_count.tolist(),
+            'mean_confidence': np.divide(self.bin_confidence, self.bin_count, out=np.zeros(self.n_bins),
+                                         where=self.bin_count > 0).round(4).tolist(),
+            'accuracy': np.divide(self.bin_correct, self.bin_count, out=np.zeros(self.n_bins),
+                                  where=self.bin_count > 0).round(4).tolist()
+        }
+        report['confusion_matrix'] = self.confusion.tolist()
+        
+        return report
+    
+    @staticmethod
+    def save_report(report: dict, path):
+        """
+        Salva o relatório em JSON
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Relatório de avaliação salvo em {path}")
+
+
+def load_model_dir(model_dir: str, model_file: str = 'best_model.h5'):
+    """
+    Carrega um modelo treinado e os metadados do seu diretório
+    
+    Args:
+        model_dir: Diretório gerado por `train` (amphibian_classifier_*)
+        model_file: Arquivo do modelo dentro do diretório
+        
+    Returns:
+        Tupla (modelo, class_names, config)
+    """
+    model_path = Path(model_dir)
+    model = keras.models.load_model(str(model_path / model_file), compile=False)
+    
+    with open(model_path / 'class_names.json', 'r') as f:
+        class_names = json.load(f)
+    
+    config = {}
+    if (model_path / 'config.json').exists():
+        with open(model_path / 'config.json', 'r') as f:
+            config = json.load(f)
+    
+    return model, class_names, config
+
+
+def save_model_contract(model_dir, class_names, config):
+    """
+    Salva class_names.json e config.json (contrato lido por 04_convert_to_tfjs)
+    
+    Args:
+        model_dir: Diretório do modelo
+        class_names: Lista de espécies na ordem das saídas do modelo
+        config: Dicionário de configuração
+    """
+    model_dir = Path(model_dir)
+    
+    with open(model_dir / 'class_names.json', 'w') as f:
+        json.dump(class_names, f, indent=2)
+    
+    with open(model_dir / 'config.json', 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+def measure_model_footprint(model, n_runs: int = 30) -> dict:
+    """
+    Mede parâmetros, tamanho em disco (.h5) e latência de inferência (batch 1)
+    
+    Args:
+        model: Modelo Keras
+        n_runs: Número de inferências cronometradas
+        
+    Returns:
+        Dicionário com 'params', 'size_mb', 'gzip_mb' (tamanho comprimido,
+        sensível à esparsidade) e 'latency_ms' (mediana)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'model.h5'
+        model.save(str(path))
+        size_mb = path.stat().st_size / (1024 * 1024)
+        gzip_mb = len(gzip.compress(path.read_bytes())) / (1024 * 1024)
+    
+    x = tf.zeros((1, *model.input_shape[1:]), dtype=tf.float32)
+    model(x, training=False)  # Warmup
+    
+    timings = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        model(x, training=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    
+    return {
+        'params': int(model.count_params()),
+        'size_mb': round(size_mb, 3),
+        'gzip_mb': round(gzip_mb, 3),
+        'latency_ms': round(float(np.median(timings)), 3)
+    }
+
+
+def _layers_by_name(model) -> dict:
+    """
+    Mapeia nome → camada, incluindo camadas de modelos aninhados (backbone)
+    """
+    found = {}
+    for layer in model.layers:
+        found[layer.name] = layer
+        if hasattr(layer, 'layers'):
+            found.update(_layers_by_name(layer))
+    return found
+
+
+def _walk_layer_configs(config):
+    """
+    Percorre recursivamente as configs serializadas de camadas
+    """
+    if isinstance(config, dict):
+        if 'class_name' in config and isinstance(config.get('config'), dict):
+            yield config
+        for value in list(config.values()):
+            yield from _walk_layer_configs(value)
+    elif isinstance(config, list):
+        for item in config:
+            yield from _walk_layer_configs(item)
+
+
+def weight_sparsity(model) -> float:
+    """
+    Fração de pesos exatamente iguais a zero (kernels e biases)
+    """
+    total = 0
+    zeros = 0
+    for weight in model.get_weights():
+        total += weight.size
+        zeros += int(np.count_nonzero(weight == 0))
+    return zeros / max(total, 1)
+
+
+class ModelPruner:
+    """
+    Poda estruturada por magnitude com fine-tuning entre as etapas
+    
+    Remove neurônios inteiros das camadas Dense ocultas da cabeça e canais
+    inteiros da última convolução do backbone (1280 canais no MobileNetV2 e
+    no EfficientNetB0), reconstruindo camadas menores. Opcionalmente aplica
+    poda não estruturada (tensorflow-model-optimization) na cabeça densa.
+    """
+    
+    def __init__(self,
+                 model,
+                 sparsity_schedule=(0.25, 0.5),
+                 fine_tune_epochs=3,
+                 learning_rate=0.0001,
+                 prune_backbone=True,
+                 unstructured_sparsity=0.0):
+        """
+        Inicializa o podador
+        
+        Args:
+            model: Classificador treinado (Sequential: backbone + cabeça densa)
+            sparsity_schedule: Frações de canais removidos em cada etapa
+                (cumulativas em relação ao modelo original)
+            fine_tune_epochs: Épocas de fine-tuning após cada etapa
+            learning_rate: Taxa de aprendizado do fine-tuning
+            prune_backbone: Se deve podar a última convolução do backbone
+            unstructured_sparsity: Esparsidade final da poda não estruturada
+                dos kernels densos (0 = desativada)
+        """
+        self.model = model
+        self.sparsity_schedule = list(sparsity_schedule)
+        self.fine_tune_epochs = fine_tune_epochs
+        self.learning_rate = learning_rate
+        self.prune_backbone = prune_backbone
+        self.unstructured_sparsity = unstructured_sparsity
+        self.report = None
+        
+        print("✂️  Inicializando Poda Estruturada")
+        print(f"   Schedule de esparsidade: {self.sparsity_schedule}")
+        print(f"   Fine-tuning por etapa: {fine_tune_epochs} épocas")
+    
+    def _compile(self, model):
+        model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=self.learning_rate),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        return model
+    
+    def _prunable_groups(self, model) -> list:
+        """
+        Identifica grupos de canais podáveis no modelo
+        
+        Returns:
+            Lista de dicts com 'producer' (camada cujas saídas são removidas),
+            'scale' (BN que escala essas saídas, ou None), 'followers'
+            (camadas cujas entradas/parâmetros por canal são fatiados) e
+            'consumer' (Dense seguinte, cujas linhas são removidas)
+        """
+        top = model.layers
+        dense_idx = [i for i, layer in enumerate(top) if isinstance(layer, layers.Dense)]
+        groups = []
+        
+        # Neurônios ocultos da cabeça (a última Dense é a saída)
+        for a, b in zip(dense_idx[:-1], dense_idx[1:]):
+            between = top[a + 1:b]
+            if all(isinstance(l, (layers.Dropout, layers.Activation, layers.ReLU)) for l in between):
+                groups.append({'producer': top[a], 'scale': None,
+                               'followers': [], 'consumer': top[b]})
+        
+        # Canais da última convolução do backbone
+        base = top[0] if top and hasattr(top[0], 'layers') else None
+        if self.prune_backbone and base is not None and dense_idx:
+            convs = [i for i, l in enumerate(base.layers)
+                     if isinstance(l, layers.Conv2D)
+                     and not isinstance(l, (layers.DepthwiseConv2D, layers.SeparableConv2D))]
+            tail = base.layers[convs[-1] + 1:] if convs else []
+            head = top[1:dense_idx[0]]
+            tail_ok = all(isinstance(l, (layers.BatchNormalization, layers.Activation, layers.ReLU))
+                          for l in tail)
+            head_ok = all(isinstance(l, (layers.GlobalAveragePooling2D, layers.BatchNormalization,
+                                         layers.Dropout)) for l in head)
+            
+            if convs and tail_ok and head_ok:
+                norms = [l for l in tail + list(head) if isinstance(l, layers.BatchNormalization)]
+                groups.append({'producer': base.layers[convs[-1]],
+                               'scale': norms[0] if norms and norms[0] in tail else None,
+                               'followers': norms,
+                               'consumer': top[dense_idx[0]]})
+            else:
+                print("⚠️  Backbone com topologia inesperada, podando apenas a cabeça")
+        
+        return groups
+    
+    @staticmethod
+    def _channel_scores(group) -> np.ndarray:
+        """
+        Importância de cada canal: norma L2 dos pesos de entrada × norma L2
+        dos pesos de saída (× |gamma| do BatchNorm, quando houver)
+        """
+        kernel = group['producer'].get_weights()[0]
+        incoming = np.sqrt(np.sum(kernel.reshape(-1, kernel.shape[-1]) ** 2, axis=0))
+        outgoing = np.sqrt(np.sum(group['consumer'].get_weights()[0] ** 2, axis=1))
+        scores = incoming * outgoing
+        
+        if group['scale'] is not None and group['scale'].scale:
+            scores = scores * np.abs(group['scale'].get_weights()[0])
+        
+        return scores
+    
+    def _prune_step(self, model, keep_counts: dict):
+        """
+        Remove os canais menos importantes e reconstrói o modelo
+        
+        Args:
+            model: Modelo atual
+            keep_counts: {nome da camada produtora: canais mantidos}
+            
+        Returns:
+            Novo modelo com camadas menores e pesos transferidos
+        """
+        old_layers = _layers_by_name(model)
+        new_weights = {name: layer.get_weights() for name, layer in old_layers.items()
+                       if not hasattr(layer, 'layers')}
+        config = model.get_config()
+        layer_configs = {c['config'].get('name'): c for c in _walk_layer_configs(config)}
+        
+        for group in self._prunable_groups(model):
+            producer = group['producer']
+            n_keep = keep_counts.get(producer.name)
+            n_channels = producer.get_weights()[0].shape[-1]
+            if n_keep is None or n_keep >= n_channels:
+                continue
+            
+            keep = np.sort(np.argsort(self._channel_scores(group))[::-1][:n_keep])
+            
+            weights = new_weights[producer.name]
+            new_weights[producer.name] = [weights[0][..., keep]] + [w[keep] for w in weights[1:]]
+            for follower in group['followers']:
+                new_weights[follower.name] = [w[keep] for w in new_weights[follower.name]]
+            consumer = new_weights[group['consumer'].name]
+            new_weights[group['consumer'].name] = [consumer[0][keep, :]] + consumer[1:]
+            
+            key = 'units' if isinstance(producer, layers.Dense) else 'filters'
+            layer_configs[producer.name]['config'][key] = int(n_keep)
+            print(f"   {producer.name}: {n_channels} → {n_keep} canais")
+        
+        # Shapes de build antigos (Keras 3) não valem mais para as camadas podadas
+        for layer_config in _walk_layer_configs(config):
+            layer_config.pop('build_config', None)
+        
+        pruned = model.__class__.from_config(config)
+        if not pruned.built:
+            pruned.build((None, *model.input_shape[1:]))
+        
+        for name, layer in _layers_by_name(pruned).items():
+            if name in new_weights and not hasattr(layer, 'layers'):
+                layer.set_weights(new_weights[name])
+            if hasattr(layer, 'layers') and name in old_layers:
+                layer.trainable = old_layers[name].trainable
+        
+        return pruned
+    
+    def _apply_unstructured(self, model, X_train, y_train, X_val, y_val, batch_size):
+        """
+        Poda não estruturada por magnitude (PolynomialDecay) nas camadas Dense
+        
+        Os wrappers de poda são removidos (strip_pruning) antes de retornar.
+        """
+        try:
+            import tensorflow_model_optimization as tfmot
+        except ImportError as e:
+            raise ImportError("Poda não estruturada requer tensorflow-model-optimization: "
+                              "pip install tensorflow-model-optimization") from e
+        
+        end_step = math.ceil(len(X_train) / batch_size) * self.fine_tune_epochs
+        schedule = tfmot.sparsity.keras.PolynomialDecay(
+            initial_sparsity=0.0,
+            final_sparsity=self.unstructured_sparsity,
+            begin_step=0,
+            end_step=end_step
+        )
+        
+        def wrap_dense(layer):
+            if isinstance(layer, layers.Dense):
+                return tfmot.sparsity.keras.prune_low_magnitude(layer, pruning_schedule=schedule)
+            return layer
+        
+        wrapped = self._compile(keras.models.clone_model(model, clone_function=wrap_dense))
+        wrapped.fit(
+            X_train, y_train,
+            validation_data=(X_val, y_val),
+            epochs=self.fine_tune_epochs,
+            batch_size=batch_size,
+            callbacks=[tfmot.sparsity.keras.UpdatePruningStep()],
+            verbose=1
+        )
+        
+        return self._compile(tfmot.sparsity.keras.strip_pruning(wrapped))
+    
+    def prune(self, X_train, y_train, X_val, y_val, batch_size=32, model_dir=None):
+        """
+        Executa o schedule de poda com fine-tuning e mede o ganho
+        
+        Args:
+            X_train: Dados de treino
+            y_train: Labels de treino
+            X_val: Dados de validação
+            y_val: Labels de validação
+            batch_size: Tamanho do batch do fine-tuning
+            model_dir: Se definido, salva pruned_model.h5 e o relatório em
+                config.json desse diretório
+            
+        Returns:
+            Modelo podado (sem wrappers de poda)
+        """
+        print("\n✂️  Iniciando poda...")
+        
+        model = self._compile(self.model)
+        before = measure_model_footprint(model)
+        before['val_accuracy'] = round(float(model.evaluate(X_val, y_val, verbose=0)[1]), 4)
+        before['sparsity'] = round(weight_sparsity(model), 4)
+        
+        original = {g['producer'].name: g['producer'].get_weights()[0].shape[-1]
+                    for g in self._prunable_groups(model)}
+        
+        for step, sparsity in enumerate(self.sparsity_schedule, start=1):
+            print(f"\n🔪 Etapa {step}/{len(self.sparsity_schedule)}: "
+                  f"removendo {sparsity * 100:.0f}% dos canais")
+            keep_counts = {name: max(1, int(round(n * (1 - sparsity))))
+                           for name, n in original.items()}
+            model = self._compile(self._prune_step(model, keep_counts))
+            
+            if self.fine_tune_epochs > 0:
+                model.fit(
+                    X_train, y_train,
+                    validation_data=(X_val, y_val),
+                    epochs=self.fine_tune_epochs,
+                    batch_size=batch_size,
+                    verbose=1
+                )
+        
+        if self.unstructured_sparsity > 0:
+            print(f"\n🕸️  Poda não estruturada até {self.unstructured_sparsity * 100:.0f}% de esparsidade")
+            model = self._apply_unstructured(model, X_train, y_train, X_val, y_val, batch_size)
+        
+        after = measure_model_footprint(model)
+        after['val_accuracy'] = round(float(model.evaluate(X_val, y_val, verbose=0)[1]), 4)
+        after['sparsity'] = round(weight_sparsity(model), 4)
+        
+        pruned_layers = _layers_by_name(model)
+        self.report = {
+            'sparsity_schedule': self.sparsity_schedule,
+            'unstructured_sparsity': self.unstructured_sparsity,
+            'channels': {name: {'before': int(n),
+                                'after': int(pruned_layers[name].get_weights()[0].shape[-1])}
+                         for name, n in original.items()},
+            'before': before,
+            'after': after
+        }
+        
+        print("\n📊 RESUMO DA PODA")
+        print("="*60)
+        print(f"{'':18s} {'Antes':>12s} {'Depois':>12s}")
+        print(f"{'Parâmetros':18s} {before['params']:12,d} {after['params']:12,d}")
+        print(f"{'Tamanho (MB)':18s} {before['size_mb']:12.2f} {after['size_mb']:12.2f}")
+        print(f"{'Gzip (MB)':18s} {before['gzip_mb']:12.2f} {after['gzip_mb']:12.2f}")
+        print(f"{'Latência (ms)':18s} {before['latency_ms']:12.2f} {after['latency_ms']:12.2f}")
+        print(f"{'Esparsidade':18s} {before['sparsity']:12.2%} {after['sparsity']:12.2%}")
+        print(f"{'Val accuracy':18s} {before['val_accuracy']:12.4f} {after['val_accuracy']:12.4f}")
+        print("="*60)
+        
+        if model_dir is not None:
+            model_dir = Path(model_dir)
+            model.save(str(model_dir / 'pruned_model.h5'))
+            
+            config_path = model_dir / 'config.json'
+            config = {}
+            if config_path.exists():
+                with open(config_path, 'r') as f:
+                    config = json.load(f)
+            config['pruning'] = self.report
+            with open(config_path, 'w') as f:
+                json.dump(config, f, indent=2)
+            
+            print(f"📁 Modelo podado salvo em: {model_dir / 'pruned_model.h5'}")
+        
+        return model
+
+
+class _DistillationModel(keras.Model):
+    """
+    Envolve o student para treinar com a perda de destilação
+    
+    loss = alpha * CE(rótulo, student) + (1 - alpha) * T² * KL(teacher_T || student_T)
+    """
+    
+    def __init__(self, student, temperature: float, alpha: float):
+        super().__init__()
+        self.student = student
+        self.temperature = temperature
+        self.alpha = alpha
+        self.loss_tracker = keras.metrics.Mean(name='loss')
+        self.distillation_tracker = keras.metrics.Mean(name='distillation_loss')
+        self.accuracy_tracker = keras.metrics.SparseCategoricalAccuracy(name='accuracy')
+    
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.distillation_tracker, self.accuracy_tracker]
+    
+    def call(self, x, training=False):
+        return self.student(x, training=training)
+    
+    def _compute_losses(self, x, y, teacher_probs, training):
+        student_probs = self.student(x, training=training)
+        
+        # As saídas são softmax: log(p) recupera os logits a menos de uma constante
+        t = self.temperature
+        teacher_logits = tf.math.log(tf.clip_by_value(teacher_probs, 1e-7, 1.0)) / t
+        student_logits = tf.math.log(tf.clip_by_value(student_probs, 1e-7, 1.0)) / t
+        soft_targets = tf.nn.softmax(teacher_logits, axis=-1)
+        distillation = tf.reduce_mean(tf.reduce_sum(
+            soft_targets * (tf.nn.log_softmax(teacher_logits, axis=-1) -
+                            tf.nn.log_softmax(student_logits, axis=-1)),
+            axis=-1
+        )) * (t ** 2)
+        
+        hard = tf.reduce_mean(keras.losses.sparse_categorical_crossentropy(y, student_probs))
+        loss = self.alpha * hard + (1.0 - self.alpha) * distillation
+        
+        return loss, distillation, student_probs
+    
+    def _update_metrics(self, loss, distillation, y, student_probs):
+        self.loss_tracker.update_state(loss)
+        self.distillation_tracker.update_state(distillation)
+        self.accuracy_tracker.update_state(y, student_probs)
+        return {m.name: m.result() for m in self.metrics}
+    
+    def train_step(self, data):
+        x, (y, teacher_probs) = data
+        
+        with tf.GradientTape() as tape:
+            loss, distillation, student_probs = self._compute_losses(x, y, teacher_probs, True)
+        
+        variables = self.student.trainable_variables
+        gradients = tape.gradient(loss, variables)
+        self.optimizer.apply_gradients(zip(gradients, variables))
+        
+        return self._update_metrics(loss, distillation, y, student_probs)
+    
+    def test_step(self, data):
+        x, (y, teacher_probs) = data
+        loss, distillation, student_probs = self._compute_losses(x, y, teacher_probs, False)
+        return self._update_metrics(loss, distillation, y, student_probs)
+
+
+class StudentDistiller:
+    """
+    Destilação de conhecimento para um modelo compacto de inferência web
+    
+    O classificador treinado (MobileNetV2/EfficientNetB0) atua como teacher e
+    uma CNN pequena de canal único (student) aprende com as suas
+    probabilidades suavizadas pela temperatura.
+    """
+    
+    def __init__(self,
+                 teacher,
+                 class_names,
+                 temperature=4.0,
+                 alpha=0.1,
+                 learning_rate=0.001,
+                 width=16,
+                 input_shape=(128, 128, 1),
+                 normalization_stats=None,
+                 preprocessing=None):
+        """
+        Inicializa o destilador
+        
+        Args:
+            teacher: Modelo Keras treinado (entrada 128x128x3)
+            class_names: Espécies na ordem das saídas do teacher
+            temperature: Temperatura da softmax dos soft labels
+            alpha: Peso da perda com rótulos reais (1 - alpha na destilação)
+            learning_rate: Taxa de aprendizado do student
+            width: Número de filtros do primeiro bloco (dobra a cada bloco)
+            input_shape: Shape do input do student
+            normalization_stats: {'min', 'max'} usados nos dados do teacher
+            preprocessing: Configuração de 02_preprocess_audio dos dados
+        """
+        self.teacher = teacher
+        self.class_names = list(class_names)
+        self.num_classes = len(self.class_names)
+        self.temperature = temperature
+        self.alpha = alpha
+        self.learning_rate = learning_rate
+        self.width = width
+        self.input_shape = tuple(input_shape)
+        self.normalization_stats = normalization_stats
+        self.preprocessing = preprocessing
+        self.student = None
+        self.history = None
+        self.model_dir = None
+        
+        print("🎓 Inicializando Destilação de Conhecimento")
+        print(f"   Temperatura: {temperature}")
+        print(f"   Alpha (rótulos reais): {alpha}")
+        print(f"   Student input shape: {self.input_shape}")
+    
+    def build_student(self):
+        """
+        Constrói a CNN compacta (convoluções separáveis em profundidade)
+        """
+        w = self.width
+        
+        student = models.Sequential([
+            layers.Input(shape=self.input_shape),
+            layers.Conv2D(w, 3, padding='same', use_bias=False),
+            layers.BatchNormalization(),
+            layers.ReLU(),
+            layers.MaxPooling2D(2),
+            layers.SeparableConv2D(w * 2, 3, padding='same', use_bias=False),
+            layers.BatchNormalization(),
+            layers.ReLU(),
+            layers.MaxPooling2D(2),
+            layers.SeparableConv2D(w * 4, 3, padding='same', use_bias=False),
+            layers.BatchNormalization(),
+            layers.ReLU(),
+            layers.MaxPooling2D(2),
+            layers.SeparableConv2D(w * 8, 3, padding='same', use_bias=False),
+            layers.BatchNormalization(),
+            layers.ReLU(),
+            layers.GlobalAveragePooling2D(),
+            layers.Dropout(0.3),
+            layers.Dense(self.num_classes, activation='softmax')
+        ], name='AmphibianStudent')
+        
+        self.student = student
+        
+        print("✅ Student construído")
+        print(f"   Parâmetros: {student.count_params():,} "
+              f"(teacher: {self.teacher.count_params():,})")
+        
+        return student
+    
+    def _dataset(self, X, y, teacher_probs, batch_size, shuffle):
+        """
+        Cria tf.data com (canal único, (rótulo, soft labels do teacher))
+        """
+        channels = self.input_shape[-1]
+        ds = tf.data.Dataset.from_tensor_slices((X, y, teacher_probs))
+        if shuffle:
+            ds = ds.shuffle(min(len(y), 10000), seed=42, reshuffle_each_iteration=True)
+        ds = ds.map(lambda x, label, probs: (x[..., :channels], (label, probs)),
+                    num_parallel_calls=tf.data.AUTOTUNE)
+        return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+    
+    def train(self, X_train, y_train, X_val, y_val,
+              epochs=60, batch_size=64,
+              output_dir='./backend/models'):
+        """
+        Treina o student com os soft labels do teacher
+        
+        As predições do teacher são calculadas uma única vez antes do
+        treinamento, então o custo por época é apenas o do student.
+        
+        Args:
+            X_train: Dados de treino (formato do teacher, 3 canais)
+            y_train: Labels de treino
+            X_val: Dados de validação
+            y_val: Labels de validação
+            epochs: Número de épocas
+            batch_size: Tamanho do batch
+            output_dir: Diretório para salvar o student
+            
+        Returns:
+            History object
+        """
+        if self.student is None:
+            self.build_student()
+        
+        print("\n🧑‍🏫 Calculando soft labels do teacher...")
+        teacher_train = self.teacher.predict(X_train, batch_size=batch_size, verbose=0)
+        teacher_val = self.teacher.predict(X_val, batch_size=batch_size, verbose=0)
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        model_dir = Path(output_dir) / f"amphibian_student_{timestamp}"
+        model_dir.mkdir(parents=True, exist_ok=True)
+        self.model_dir = model_dir
+        
+        print(f"\n🎯 Treinando student...")
+        print(f"   Épocas: {epochs}")
+        print(f"   Batch size: {batch_size}")
+        print(f"   Modelo será salvo em: {model_dir}")
+        
+        distiller = _DistillationModel(self.student, self.temperature, self.alpha)
+        distiller.compile(optimizer=keras.optimizers.Adam(learning_rate=self.learning_rate))
+        
+        early_stopping = EarlyStopping(
+            monitor='val_loss',
+            patience=10,
+            restore_best_weights=True,
+            verbose=1
+        )
+        callbacks = [
+            early_stopping,
+            ReduceLROnPlateau(
+                monitor='val_loss',
+                factor=0.5,
+                patience=5,
+                min_lr=1e-6,
+                verbose=1
+            )
+        ]
+        
+        history = distiller.fit(
+            self._dataset(X_train, y_train, teacher_train, batch_size, shuffle=True),
+            validation_data=self._dataset(X_val, y_val, teacher_val, batch_size, shuffle=False),
+            epochs=epochs,
+            callbacks=callbacks,
+            verbose=1
+        )
+        self.history = history
+        
+        # Versões antigas do Keras só restauram os melhores pesos quando a
+        # parada antecipada dispara; o student compartilha as camadas do destilador
+        if early_stopping.best_weights is not None:
+            distiller.set_weights(early_stopping.best_weights)
+        
+        # Mesmo contrato do classificador: pesos + class_names.json + config.json.
+        # Com os melhores pesos restaurados, basta um único arquivo
+        self.student.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=self.learning_rate),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        self.student.save(str(model_dir / 'best_model.h5'))
+        
+        config = {
+            'architecture': 'student_cnn',
+            'input_shape': list(self.input_shape),
+            'num_classes': self.num_classes,
+            'learning_rate': self.learning_rate,
+            'epochs_trained': len(history.history['loss']),
+            'timestamp': timestamp,
+            'normalization': self.normalization_stats,
+            'distillation': {
+                'temperature': self.temperature,
+                'alpha': self.alpha,
+                'width': self.width
+            }
+        }
+        if self.preprocessing:
+            config['preprocessing'] = self.preprocessing
+        save_model_contract(model_dir, self.class_names, config)
+        
+        print(f"\n✅ Destilação concluída!")
+        print(f"📁 Student salvo em: {model_dir}")
+        
+        return history
+    
+    def compare_with_teacher(self, X_test, y_test, batch_size=64) -> dict:
+        """
+        Mede a perda de acurácia e o ganho de tamanho/latência do student
+        
+        O relatório também é gravado em config.json do student.
+        
+        Args:
+            X_test: Dados de teste (formato do teacher, 3 canais)
+            y_test: Labels de teste
+            batch_size: Tamanho do batch de inferência
+            
+        Returns:
+            Dicionário com acurácias, footprints e razões
+        """
+        print("\n📊 Comparando student com teacher no conjunto de teste...")
+        
+        channels = self.input_shape[-1]
+        teacher_pred = np.argmax(self.teacher.predict(X_test, batch_size=batch_size, verbose=0), axis=1)
+        student_pred = np.argmax(self.student.predict(X_test[..., :channels], batch_size=batch_size, verbose=0), axis=1)
+        
+        teacher_acc = float(np.mean(teacher_pred == y_test))
+        student_acc = float(np.mean(student_pred == y_test))
+        agreement = float(np.mean(teacher_pred == student_pred))
+        
+        teacher_fp = measure_model_footprint(self.teacher)
+        student_fp = measure_model_footprint(self.student)
+        
+        report = {
+            'teacher_accuracy': round(teacher_acc, 4),
+            'student_accuracy': round(student_acc, 4),
+            'accuracy_drop': round(teacher_acc - student_acc, 4),
+            'teacher_student_agreement': round(agreement, 4),
+            'teacher': teacher_fp,
+            'student': student_fp,
+            'size_ratio': round(teacher_fp['size_mb'] / max(student_fp['size_mb'], 1e-9), 2),
+            'speedup': round(teacher_fp['latency_ms'] / max(student_fp['latency_ms'], 1e-9), 2)
+        }
+        
+        print(f"   Acurácia teacher: {teacher_acc:.4f}")
+        print(f"   Acurácia student: {student_acc:.4f} (Δ {report['accuracy_drop']:+.4f})")
+        print(f"   Concordância:     {agreement * 100:.1f}%")
+        print(f"   Tamanho: {teacher_fp['size_mb']:.2f} MB → {student_fp['size_mb']:.2f} MB "
+              f"({report['size_ratio']}x menor)")
+        print(f"   Latência: {teacher_fp['latency_ms']:.2f} ms → {student_fp['latency_ms']:.2f} ms "
+              f"({report['speedup']}x mais rápido)")
+        
+        if self.model_dir is not None:
+            config_path = self.model_dir / 'config.json'
+            with open(config_path, 'r') as f:
+                config = json.load(f)
+            config['distillation']['report'] = report
+            with open(config_path, 'w') as f:
+                json.dump(config, f, indent=2)
+        
+        return report
+
+
+class OpenSetDetector:
+    """
+    Detecção de espécies desconhecidas (open-set) sobre as saídas do classificador
+    
+    Cada segmento recebe um escore de "familiaridade" (maior = mais parecido
+    com as espécies treinadas) e é marcado como desconhecido abaixo de um
+    limiar calibrado na validação:
+    
+    - max_softmax: maior probabilidade do softmax
+    - energy: T·logsumexp(logits/T), com logits recalculados a partir da
+      penúltima camada e dos pesos da camada de saída
+    - centroid: maior similaridade de cosseno entre o embedding
+      (GlobalAveragePooling2D) e os centróides de cada espécie
+    """
+    
+    METHODS = ('max_softmax', 'energy', 'centroid')
+    CENTROIDS_FILE = 'open_set_centroids.npy'
+    
+    def __init__(self, model, method='energy', target_tpr=0.95, temperature=1.0):
+        """
+        Inicializa o detector
+        
+        Args:
+            model: Classificador Keras (última camada Dense com softmax)
+            method: 'max_softmax', 'energy' ou 'centroid'
+            target_tpr: Fração das espécies conhecidas (validação) que deve ser aceita
+            temperature: Temperatura do escore de energia
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Método desconhecido: {method} (use {self.METHODS})")
+        
+        self.model = model
+        self.method = method
+        self.target_tpr = target_tpr
+        self.temperature = temperature
+        self.thresholds = {}
+        self.centroids = None
+        
+        output = model.layers[-1]
+        if not isinstance(output, layers.Dense):
+            raise ValueError("A última camada do modelo deve ser Dense")
+        self.kernel, self.bias = output.get_weights()
+        
+        embedding = next((l for l in model.layers if isinstance(l, layers.GlobalAveragePooling2D)), None)
+        if embedding is None:
+            raise ValueError(f"Modelo {model.name} não tem camada GlobalAveragePooling2D")
+        
+        # Uma passada devolve embedding e entrada da camada de saída
+        self.feature_model = keras.Model(model.inputs, [embedding.output, output.input])
+    
+    def _features(self, X, batch_size=256):
+        """
+        Embeddings normalizados e logits de um conjunto
+        """
+        if isinstance(X, keras.utils.Sequence):
+            batch_size = None  # o loader já define o batch
+        return self._project(*self.feature_model.predict(X, batch_size=batch_size, verbose=0))
+    
+    def _project(self, embeddings, penultimate):
+        """
+        Normaliza embeddings e recalcula os logits da camada de saída
+        """
+        embeddings = np.asarray(embeddings)
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        logits = np.asarray(penultimate) @ self.kernel + self.bias
+        return embeddings, logits
+    
+    def score_batch(self, X_batch):
+        """
+        Rejeição e probabilidades de um batch (uma única inferência)
+        
+        Args:
+            X_batch: Batch de espectrogramas normalizados
+            
+        Returns:
+            Tupla (máscara de desconhecidas, probabilidades)
+        """
+        if self.method not in self.thresholds:
+            raise RuntimeError("Detector não calibrado: chame calibrate() ou from_model_dir()")
+        
+        scores, probs = self._scores(*self._project(*self.feature_model(X_batch, training=False)))
+        return scores[self.method] < self.thresholds[self.method], probs
+    
+    def _scores(self, embeddings, logits) -> dict:
+        """
+        Escores de familiaridade de todos os métodos disponíveis
+        """
+        shifted = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(shifted)
+        probs /= probs.sum(axis=1, keepdims=True)
+        
+        scaled = logits / self.temperature
+        peak = scaled.max(axis=1)
+        energy = self.temperature * (peak + np.log(np.exp(scaled - peak[:, None]).sum(axis=1)))
+        
+        scores = {'max_softmax': probs.max(axis=1), 'energy': energy}
+        if self.centroids is not None:
+            scores['centroid'] = (embeddings @ self.centroids.T).max(axis=1)
+        return scores, probs
+    
+    def calibrate(self, X_val, y_val, X_train=None, y_train=None, batch_size=256) -> dict:
+        """
+        Calcula centróides e limiares de todos os métodos
+        
+        Args:
+            X_val: Validação (apenas espécies conhecidas)
+            y_val: Labels de validação
+            X_train: Dados para os centróides (padrão: validação)
+            y_train: Labels correspondentes
+            batch_size: Tamanho do batch de inferência
+            
+        Returns:
+            Dicionário {método: limiar}
+        """
+        print(f"\n🚫 Calibrando open-set (aceitar {self.target_tpr:.0%} das conhecidas)...")
+        
+        if X_train is None:
+            X_train, y_train = X_val, y_val
+        
+        train_embeddings, _ = self._features(X_train, batch_size)
+        num_classes = self.kernel.shape[1]
+        centroids = np.zeros((num_classes, train_embeddings.shape[1]), dtype=np.float32)
+        np.add.at(centroids, y_train, train_embeddings)
+        self.centroids = centroids / np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        
+        scores, _ = self._scores(*self._features(X_val, batch_size))
+        self.thresholds = {
+            method: float(np.quantile(values, 1.0 - self.target_tpr))
+            for method, values in scores.items()
+        }
+        
+        for method, threshold in self.thresholds.items():
+            print(f"   {method:12s} limiar = {threshold:.4f}")
+        
+        return self.thresholds
+    
+    def predict(self, X, batch_size=256) -> dict:
+        """
+        Inferência em batch com rejeição de desconhecidos
+        
+        Args:
+            X: Espectrogramas normalizados
+            batch_size: Tamanho do batch
+            
+        Returns:
+            Dicionário com 'predictions' (-1 = desconhecida), 'probabilities',
+            'scores' (do método ativo) e 'unknown'
+        """
+        if self.method not in self.thresholds:
+            raise RuntimeError("Detector não calibrado: chame calibrate() ou from_model_dir()")
+        
+        scores, probs = self._scores(*self._features(X, batch_size))
+        unknown = scores[self.method] < self.thresholds[self.method]
+        predictions = np.where(unknown, -1, probs.argmax(axis=1))
+        
+        return {
+            'predictions': predictions,
+            'probabilities': probs,
+            'scores': scores[self.method],
+            'unknown': unknown
+        }
+    
+    def evaluate_unknown(self, X_known, X_unknown, batch_size=256) -> dict:
+        """
+        Mede a separação entre espécies conhecidas e desconhecidas
+        
+        Args:
+            X_known: Segmentos de espécies treinadas (ex: teste; array ou loader)
+            X_unknown: Segmentos de espécies fora de class_names
+            
+        Returns:
+            Dicionário {método: {'auroc', 'unknown_detected', 'known_rejected'}}
+        """
+        known, _ = self._scores(*self._features(X_known, batch_size))
+        unknown, _ = self._scores(*self._features(X_unknown, batch_size))
+        
+        report = {}
+        print(f"\n🔍 Conhecidas ({len(known['max_softmax'])}) vs desconhecidas ({len(unknown['max_softmax'])}):")
+        for method, threshold in self.thresholds.items():
+            y_true = np.r_[np.ones(len(known[method])), np.zeros(len(unknown[method]))]
+            report[method] = {
+                'auroc': float(roc_auc_score(y_true, np.r_[known[method], unknown[method]])),
+                'unknown_detected': float((unknown[method] < threshold).mean()),
+                'known_rejected': float((known[method] < threshold).mean())
+            }
+            print(f"   {method:12s} AUROC {report[method]['auroc']:.3f} | "
+                  f"desconhecidas detectadas {report[method]['unknown_detected']:.2%}")
+        
+        return report
+    
+    def save(self, model_dir, report: dict = None):
+        """
+        Grava limiares no config.json e centróides ao lado do modelo
+        
+        Args:
+            model_dir: Diretório do modelo
+            report: Métricas opcionais de evaluate_unknown
+        """
+        model_path = Path(model_dir)
+        np.save(model_path / self.CENTROIDS_FILE, self.centroids.astype(np.float32))
+        
+        with open(model_path / 'class_names.json', 'r') as f:
+            class_names = json.load(f)
+        config = {}
+        if (model_path / 'config.json').exists():
+            with open(model_path / 'config.json', 'r') as f:
+                config = json.load(f)
+        
+        config['open_set'] = {
+            'method': self.method,
+            'target_tpr': self.target_tpr,
+            'temperature': self.temperature,
+            'thresholds': self.thresholds,
+            'centroids_file': self.CENTROIDS_FILE
+        }
+        if report:
+            config['open_set']['evaluation'] = report
+        save_model_contract(model_path, class_names, config)
+        
+        print(f"💾 Limiares open-set salvos em {model_path / 'config.json'}")
+    
+    @classmethod
+    def from_model_dir(cls, model_dir: str, model_file: str = 'best_model.h5', method: str = None):
+        """
+        Carrega modelo e detector calibrado (config.json['open_set'])
+        
+        Args:
+            model_dir: Diretório do modelo
+            model_file: Arquivo do modelo
+            method: Sobrescreve o método salvo
+            
+        Returns:
+            OpenSetDetector pronto para predict()
+        """
+        model, _, config = load_model_dir(model_dir, model_file)
+        if 'open_set' not in config:
+            raise ValueError(f"{model_dir} não tem calibração open-set no config.json")
+        
+        settings = config['open_set']
+        detector = cls(model, method=method or settings['method'],
+                       target_tpr=settings['target_tpr'], temperature=settings['temperature'])
+        detector.thresholds = settings['thresholds']
+        
+        centroids_path = Path(model_dir) / settings.get('centroids_file', cls.CENTROIDS_FILE)
+        if centroids_path.exists():
+            detector.centroids = np.load(centroids_path)
+        
+        return detector
+
+
+class IncrementalTrainer:
+    """
+    Adiciona espécies a um modelo treinado sem retreinar do zero
+    
+    A camada de saída é expandida (pesos das classes antigas preservados,
+    índices estáveis) e o modelo é ajustado com os dados das novas espécies
+    mais um pequeno buffer de rehearsal das antigas, para não esquecê-las.
+    Apenas esses arquivos são lidos do disco: o custo acompanha os dados
+    novos, não o corpus inteiro.
+    """
+    
+    REHEARSAL_FILE = 'rehearsal.json'
+    
+    def __init__(self,
+                 model_dir: str,
+                 rehearsal_per_class=50,
+                 learning_rate=1e-4,
+                 freeze_backbone=True,
+                 test_size=0.15,
+                 val_size=0.15,
+                 seed=42):
+        """
+        Inicializa o treinador incremental
+        
+        Args:
+            model_dir: Diretório do modelo base (amphibian_classifier_*)
+            rehearsal_per_class: Segmentos de treino guardados por espécie antiga
+            learning_rate: Taxa de aprendizado do ajuste
+            freeze_backbone: Se o backbone convolucional fica congelado
+            test_size: Proporção de teste (deve ser a mesma do treino original)
+            val_size: Proporção de validação (deve ser a mesma do treino original)
+            seed: Semente do split e da amostragem do buffer
+        """
+        self.base_dir = Path(model_dir)
+        self.model, self.old_classes, self.config = load_model_dir(model_dir)
+        self.rehearsal_per_class = rehearsal_per_class
+        self.learning_rate = learning_rate
+        self.freeze_backbone = freeze_backbone
+        self.splitter = RecordingSplitter(test_size=test_size, val_size=val_size, seed=seed)
+        self.rng = np.random.default_rng(seed)
+        
+        self.classifier = AmphibianClassifier(
+            input_shape=tuple(self.config.get('input_shape', (128, 128, 3))),
+            architecture=self.config.get('architecture', 'mobilenet'),
+            learning_rate=learning_rate
+        )
+        self.new_classes = []
+        self.history = None
+        
+        print(f"📦 Modelo base: {self.base_dir.name} ({len(self.old_classes)} espécies)")
+    
+    def discover_new_classes(self, data_dir: str) -> list:
+        """
+        Pastas de espécies em data_dir que o modelo ainda não conhece
+        """
+        folders = sorted(d.name for d in Path(data_dir).iterdir() if d.is_dir())
+        return [f for f in folders if f not in self.old_classes]
+    
+    def expand_head(self, n_new: int):
+        """
+        Cria o modelo com a camada de saída expandida
+        
+        Os pesos das classes antigas são copiados; as colunas novas começam
+        pequenas, com o bias médio das antigas.
+        
+        Args:
+            n_new: Número de espécies adicionadas
+            
+        Returns:
+            Modelo Keras com len(old_classes) + n_new saídas
+        """
+        output = self.model.layers[-1]
+        if not isinstance(output, layers.Dense):
+            raise ValueError("A última camada do modelo deve ser Dense")
+        
+        kernel, bias = output.get_weights()
+        n_old = kernel.shape[1]
+        
+        new_kernel = self.rng.normal(0.0, 0.01, (kernel.shape[0], n_new)).astype(kernel.dtype)
+        new_bias = np.full(n_new, bias.mean(), dtype=bias.dtype)
+        
+        head = layers.Dense(n_old + n_new, activation='softmax', name='predictions')
+        outputs = head(output.input)
+        model = keras.Model(self.model.inputs, outputs, name=self.model.name)
+        head.set_weights([np.concatenate([kernel, new_kernel], axis=1),
+                          np.concatenate([bias, new_bias])])
+        
+        if self.freeze_backbone:
+            for layer in model.layers:
+                if isinstance(layer, keras.Model):
+                    layer.trainable = False
+        
+        model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=self.learning_rate),
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy', keras.metrics.SparseTopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
+        )
+        
+        print(f"🔧 Saída expandida: {n_old} → {n_old + n_new} classes")
+        return model
+    
+    def _rehearsal_indices(self, labels, groups, train_idx) -> np.ndarray:
+        """
+        Amostra o buffer de rehearsal do split de treino das espécies antigas
+        
+        Alterna entre gravações de cada espécie para cobrir a maior
+        variedade possível com poucos segmentos.
+        """
+        chosen = []
+        for cls in range(len(self.old_classes)):
+            pool = train_idx[labels[train_idx] == cls]
+            if len(pool) == 0:
+                continue
+            
+            pool = self.rng.permutation(pool)
+            # Ordem round-robin por gravação: posição do segmento dentro da sua gravação
+            rank = np.zeros(len(pool), dtype=np.int64)
+            seen = {}
+            for i, group in enumerate(groups[pool]):
+                rank[i] = seen.get(group, 0)
+                seen[group] = rank[i] + 1
+            chosen.append(pool[np.argsort(rank, kind='stable')][:self.rehearsal_per_class])
+        
+        return np.sort(np.concatenate(chosen)) if chosen else np.array([], dtype=np.int64)
+    
+    def _load_rehearsal(self, data_dir: str, old_index: dict) -> np.ndarray:
+        """
+        Reutiliza o buffer de um incremento anterior ou sorteia um novo
+        """
+        labels = old_index['labels']
+        fresh = self._rehearsal_indices(labels, old_index['groups'], old_index['train'])
+        
+        previous = self.base_dir / self.REHEARSAL_FILE
+        if not previous.exists():
+            return fresh
+        
+        with open(previous, 'r') as f:
+            stored = json.load(f)['files']
+        names = np.array([str(Path(p).relative_to(data_dir)) for p in old_index['files']])
+        selected = np.flatnonzero(np.isin(names, stored))
+        print(f"♻️  Buffer de rehearsal reutilizado: {len(selected)} segmentos")
+        
+        # Espécies adicionadas no incremento anterior ainda não têm buffer
+        missing = ~np.isin(labels[fresh], labels[selected])
+        return np.sort(np.concatenate([selected, fresh[missing]]))
+    
+    def _load_arrays(self, files, stats: dict) -> np.ndarray:
+        """
+        Lê e normaliza espectrogramas com a escala do modelo base
+        """
+        X = np.empty((len(files), *self.classifier.input_shape), dtype=np.float32)
+        for row, spec_file in enumerate(tqdm(files, desc="Carregando")):
+            X[row] = self.classifier._prepare_spectrogram(load_spectrogram(spec_file))[..., :X.shape[-1]]
+        X -= stats['min']
+        X /= (stats['max'] - stats['min'])
+        return X
+    
+    def prepare_data(self, data_dir: str, new_classes: list = None) -> dict:
+        """
+        Monta treino/validação/teste com as novas espécies + rehearsal
+        
+        O split das espécies antigas é o mesmo do treino original (cache do
+        RecordingSplitter), então o buffer nunca inclui segmentos de teste.
+        
+        Args:
+            data_dir: Diretório com pastas de espécies
+            new_classes: Espécies a adicionar (padrão: pastas novas em data_dir)
+            
+        Returns:
+            Dicionário com X/y de train, val e test
+        """
+        self.new_classes = list(new_classes or self.discover_new_classes(data_dir))
+        if not self.new_classes:
+            raise ValueError(f"Nenhuma espécie nova em {data_dir}")
+        print(f"🆕 Espécies novas: {', '.join(self.new_classes)}")
+        
+        n_old = len(self.old_classes)
+        old_index = self.splitter.load_or_split(data_dir, class_names=self.old_classes)
+        new_files, new_labels, new_groups, _ = self.splitter.index_files(data_dir, self.new_classes)
+        new_labels = new_labels + n_old
+        new_split = self.splitter.split(new_labels, new_groups)
+        
+        rehearsal = self._load_rehearsal(data_dir, old_index)
+        self.rehearsal_files = [str(Path(p).relative_to(data_dir)) for p in old_index['files'][rehearsal]]
+        
+        # Validação das antigas: amostra pequena do split de validação original
+        old_val = old_index['val']
+        old_val = np.sort(self.rng.permutation(old_val)[:self.rehearsal_per_class * n_old])
+        
+        stats = self.config.get('normalization') or RecordingSplitter.normalization_stats(old_index)
+        self.classifier.normalization_stats = stats
+        
+        data = {}
+        for split, old_idx in (('train', rehearsal), ('val', old_val), ('test', None)):
+            idx = new_split[split]
+            files = list(new_files[idx])
+            labels = list(new_labels[idx])
+            if old_idx is not None:
+                files = list(old_index['files'][old_idx]) + files
+                labels = list(old_index['labels'][old_idx]) + labels
+            data[f'X_{split}'] = self._load_arrays(files, stats)
+            data[f'y_{split}'] = np.array(labels, dtype=np.int64)
+        
+        print(f"\n📊 Dados do incremento:")
+        print(f"   Treino:    {len(data['y_train']):5d} ({len(rehearsal)} de rehearsal)")
+        print(f"   Validação: {len(data['y_val']):5d}")
+        print(f"   Teste:     {len(data['y_test']):5d} (apenas espécies novas)")
+        
+        return data
+    
+    def train(self, data: dict, epochs=10, batch_size=32, output_dir='./backend/models'):
+        """
+        Expande a saída, ajusta e salva um novo diretório de modelo
+        
+        Args:
+            data: Retorno de prepare_data
+            epochs: Épocas de ajuste
+            batch_size: Tamanho do batch
+            output_dir: Diretório onde o novo modelo é criado
+            
+        Returns:
+            Path do novo diretório de modelo
+        """
+        class_names = list(self.old_classes) + self.new_classes
+        model = self.expand_head(len(self.new_classes))
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        architecture = self.config.get('architecture', 'mobilenet')
+        model_dir = Path(output_dir) / f"amphibian_classifier_{architecture}_{timestamp}"
+        model_dir.mkdir(parents=True, exist_ok=True)
+        
+        print(f"\n🎯 Ajuste incremental ({epochs} épocas)...")
+        start = time.perf_counter()
+        self.history = model.fit(
+            data['X_train'], data['y_train'],
+            validation_data=(data['X_val'], data['y_val']),
+            epochs=epochs,
+            batch_size=batch_size,
+            callbacks=[
+                EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True, verbose=1),
+                ModelCheckpoint(filepath=str(model_dir / 'best_model.h5'), monitor='val_accuracy',
+                                save_best_only=True, verbose=1)
+            ],
+            verbose=1
+        )
+        elapsed = time.perf_counter() - start
+        model.save(str(model_dir / 'final_model.h5'))
+        
+        # Acurácia separada: antigas (esquecimento) e novas
+        y_val = data['y_val']
+        y_pred = model.predict(data['X_val'], verbose=0).argmax(axis=1)
+        old_mask = y_val < len(self.old_classes)
+        old_acc = float((y_pred[old_mask] == y_val[old_mask]).mean()) if old_mask.any() else None
+        new_acc = float((y_pred[~old_mask] == y_val[~old_mask]).mean()) if (~old_mask).any() else None
+        
+        # Limiares open-set e poda do modelo base não valem para a nova saída
+        config = {k: v for k, v in self.config.items() if k not in ('open_set', 'pruning')}
+        config.update({
+            'num_classes': len(class_names),
+            'learning_rate': self.learning_rate,
+            'epochs_trained': len(self.history.history['loss']),
+            'timestamp': timestamp,
+            'normalization': self.classifier.normalization_stats,
+            'incremental': {
+                'base_model': str(self.base_dir),
+                'previous_classes': len(self.old_classes),
+                'new_classes': self.new_classes,
+                'rehearsal_per_class': self.rehearsal_per_class,
+                'rehearsal_size': len(self.rehearsal_files),
+                'freeze_backbone': self.freeze_backbone,
+                'train_seconds': round(elapsed, 1),
+                'val_accuracy_old': old_acc,
+                'val_accuracy_new': new_acc
+            }
+        })
+        save_model_contract(model_dir, class_names, config)
+        
+        with open(model_dir / self.REHEARSAL_FILE, 'w') as f:
+            json.dump({'files': self.rehearsal_files}, f, indent=2)
+        
+        self.model = model
+        
+        print(f"\n✅ Incremento concluído em {elapsed:.0f}s")
+        if old_acc is not None:
+            print(f"   Val accuracy (antigas): {old_acc:.4f}")
+        if new_acc is not None:
+            print(f"   Val accuracy (novas):   {new_acc:.4f}")
+        print(f"📁 Modelo salvo em: {model_dir}")
+        
+        return model_dir
+
+
+def main():
+    """
+    Função principal de treinamento
+    """
+    parser = argparse.ArgumentParser(description="Treinamento do classificador de anfíbios")
+    parser.add_argument('--resume', metavar='MODEL_DIR', default=None,
+                        help="Continuar do último checkpoint de um diretório de modelo")
+    parser.add_argument('--checkpoint-every', type=int, default=1,
+                        help="Intervalo (épocas) entre checkpoints completos")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Iniciar N workers locais (MultiWorkerMirroredStrategy) e aguardar")
+    parser.add_argument('--multi-worker', action='store_true',
+                        help="Este processo é um worker (cluster definido em TF_CONFIG)")
+    parser.add_argument('--run-name', default=None,
+                        help="Nome do diretório do modelo, comum a todos os workers")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Threads intra-op deste processo")
+    args = parser.parse_args()
+    
+    # Configurações
+    DATA_DIR = "./backend/data/processed/spectrograms"
+    MODEL_DIR = "./backend/models"
+    
+    # Hiperparâmetros
+    ARCHITECTURE = 'mobilenet'  # 'mobilenet' ou 'efficientnet'
+    LEARNING_RATE = 0.0001
+    EPOCHS = 50
+    BATCH_SIZE = 32
+    
+    # Carregamento: 'eager' (arrays em memória), 'lazy' (SpectrogramSequence,
+    # um batch por vez do disco) ou 'auto' (lazy acima de LAZY_THRESHOLD_GB)
+    LOADING = 'auto'
+    LAZY_THRESHOLD_GB = 4.0
+    
+    # Modo: 'train' (classificador), 'distill' (classificador → student compacto)
+    # ou 'incremental' (adicionar espécies a um modelo existente)
+    MODE = 'train'
+    TEACHER_MODEL_DIR = None  # Diretório de um teacher já treinado (None = treinar agora)
+    DISTILL_TEMPERATURE = 4.0
+    DISTILL_ALPHA = 0.1
+    
+    # Modo incremental
+    BASE_MODEL_DIR = None  # Ex: "./backend/models/amphibian_classifier_mobilenet_YYYYMMDD_HHMMSS"
+    NEW_CLASSES = None  # None = todas as pastas de espécies que o modelo não conhece
+    REHEARSAL_PER_CLASS = 50
+    INCREMENTAL_EPOCHS = 10
+    
+    # Poda estruturada após o treinamento
+    PRUNE = False
+    PRUNING_SCHEDULE = (0.25, 0.5)  # Fração de canais removidos em cada etapa
+    PRUNING_FINE_TUNE_EPOCHS = 3
+    
+    # Aumento de dados on-the-fly (SpecAugment, deslocamento, ganho, ruído, mixup)
+    AUGMENT = False
+    MIXUP_ALPHA = 0.2  # 0 = sem mixup
+    NOISE_BANK_DIR = None  # Ex: "./backend/data/processed/noise" (mel-espectrogramas .npy)
+    
+    # Batches balanceados por espécie (oversampling das raras, cap das comuns)
+    BALANCE_CLASSES = False
+    SAMPLES_PER_CLASS = None  # None = tamanho da maior espécie
+    MAX_PER_CLASS = 500
+    
+    # Logs do TensorBoard: 'off', 'scalars' (métricas + throughput) ou 'full' (+ histogramas)
+    LOGGING_PROFILE = 'scalars'
+    PROFILE_BATCHES = None  # Ex: (10, 15) grava um trace do profiler desses batches
+    
+    # Open-set: marcar vocalizações de espécies fora de class_names
+    OPEN_SET = False
+    OPEN_SET_METHOD = 'energy'  # 'max_softmax', 'energy' ou 'centroid'
+    OPEN_SET_TARGET_TPR = 0.95  # Fração das espécies conhecidas aceitas
+    UNKNOWN_DATA_DIR = None  # Espectrogramas de espécies fora do treino (opcional, para AUROC)
+    
+    # Lançador local: repassa os argumentos de retomada aos workers
+    if args.workers > 1:
+        run_name = args.run_name or f"amphibian_classifier_{ARCHITECTURE}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        extra_args = ['--checkpoint-every', str(args.checkpoint_every)]
+        if args.resume:
+            extra_args += ['--resume', args.resume]
+        sys.exit(launch_local_workers(args.workers, run_name, extra_args))
+    
+    # Estratégia criada antes de qualquer outra operação do TensorFlow
+    distributed = None
+    if args.multi_worker or args.threads:
+        distributed = DistributedContext(multi_worker=args.multi_worker, threads=args.threads)
+    
+    print("🐸 Sistema de Classificação de Anfíbios - Treinamento")
+    print("="*60)
+    
+    if MODE == 'incremental':
+        trainer = IncrementalTrainer(
+            BASE_MODEL_DIR,
+            rehearsal_per_class=REHEARSAL_PER_CLASS,
+            learning_rate=LEARNING_RATE
+        )
+        data = trainer.prepare_data(DATA_DIR, NEW_CLASSES)
+        trainer.train(data, epochs=INCREMENTAL_EPOCHS, batch_size=BATCH_SIZE, output_dir=MODEL_DIR)
+        print("\n✅ Pipeline de treinamento completo!")
+        return
+    
+    # Retomada: mesmos hiperparâmetros do treino interrompido
+    if args.resume:
+        run_config = TrainingCheckpoint.load_state(args.resume)['run_config']
+        ARCHITECTURE = run_config['architecture']
+        LEARNING_RATE = run_config['learning_rate']
+        BATCH_SIZE = run_config['batch_size']
+    
+    # Inicializar classificador
+    classifier = AmphibianClassifier(
+        input_shape=(128, 128, 3),
+        architecture=ARCHITECTURE,
+        learning_rate=LEARNING_RATE
+    )
+    classifier.distributed = distributed
+    
+    # Índice do split (em cache): decide o carregamento antes de ler os espectrogramas
+    index = classifier.index_dataset(DATA_DIR, test_size=0.15, val_size=0.15)
+    dataset_gb = len(index['files']) * np.prod(classifier.input_shape) * 4 / 1024**3
+    lazy = LOADING == 'lazy' or (LOADING == 'auto' and dataset_gb > LAZY_THRESHOLD_GB)
+    if lazy and (MODE == 'distill' or PRUNE):
+        # Destilação e poda treinam sobre os arrays em memória
+        if LOADING == 'lazy':
+            raise ValueError("MODE='distill' e PRUNE exigem LOADING='eager'")
+        lazy = False
+    print(f"\n💾 Carregamento {'lazy' if lazy else 'eager'} (~{dataset_gb:.1f} GB em float32)")
+    
+    # Carregar dataset
+    if lazy:
+        stats = RecordingSplitter.normalization_stats(index)
+    else:
+        X_train, X_val, X_test, y_train, y_val, y_test = classifier.load_dataset(
+            data_dir=DATA_DIR,
+            test_size=0.15,
+            val_size=0.15
+        )
+        stats = classifier.normalization_stats
+    
+    augmenter = sampler = None
+    training = not (MODE == 'distill' and TEACHER_MODEL_DIR)
+    if AUGMENT and training:
+        noise_bank = None
+        if NOISE_BANK_DIR:
+            noise_bank = SpectrogramAugmenter.load_noise_bank(
+                NOISE_BANK_DIR, classifier._prepare_spectrogram, stats
+            )
+        augmenter = SpectrogramAugmenter(
+            mixup_alpha=MIXUP_ALPHA,
+            noise_bank=noise_bank,
+            stats=stats
+        )
+    
+    if BALANCE_CLASSES and training:
+        sampler = ClassBalancedSampler(
+            samples_per_class=SAMPLES_PER_CLASS,
+            max_per_class=MAX_PER_CLASS
+        )
+        sampler.summary(index['labels'][index['train']], classifier.class_names)
+    
+    if lazy:
+        train_seq, val_seq, test_seq = classifier.load_dataset_lazy(
+            data_dir=DATA_DIR,
+            batch_size=BATCH_SIZE,
+            test_size=0.15,
+            val_size=0.15,
+            augmenter=augmenter,
+            sampler=sampler
+        )
+    
+    if MODE == 'distill' and TEACHER_MODEL_DIR:
+        teacher, teacher_classes, _ = load_model_dir(TEACHER_MODEL_DIR)
+        if teacher_classes != classifier.class_names:
+            raise ValueError("class_names do teacher não correspondem ao dataset: "
+                             f"{teacher_classes} != {classifier.class_names}")
+    else:
+        # Construir modelo
+        mixup = AUGMENT and MIXUP_ALPHA > 0
+        model = classifier.build_model(soft_labels=mixup)
+        model.summary()
+        
+        if lazy:
+            fit_args = (train_seq, None, val_seq, None)
+        elif AUGMENT or BALANCE_CLASSES:
+            num_classes = classifier.num_classes if mixup else None
+            fit_args = (
+                ArraySequence(X_train, y_train, BATCH_SIZE, shuffle=True,
+                              augmenter=augmenter, num_classes=num_classes,
+                              sampler=sampler),
+                None,
+                ArraySequence(X_val, y_val, BATCH_SIZE, num_classes=num_classes),
+                None
+            )
+        else:
+            fit_args = (X_train, y_train, X_val, y_val)
+        
+        # Treinar
+        history = classifier.train(
+            *fit_args,
+            epochs=EPOCHS,
+            batch_size=BATCH_SIZE,
+            output_dir=MODEL_DIR,
+            resume_dir=args.resume,
+            checkpoint_every=args.checkpoint_every,
+            run_name=args.run_name,
+            logging_profile=LOGGING_PROFILE,
+            profile_batches=PROFILE_BATCHES
+        )
+        
+        # Multi-worker: avaliação e etapas seguintes apenas no chief, fora da estratégia
+        if distributed is not None and distributed.multi_worker:
+            if not distributed.is_chief:
+                return
+            classifier.distributed = None
+            classifier.model = keras.models.load_model(str(classifier.model_dir / 'final_model.h5'))
+        
+        # Plotar histórico
+        classifier.plot_training_history(
+            save_path=f"{MODEL_DIR}/training_history.png"
+        )
+        
+        # Open-set: limiares calibrados na validação
+        open_set = None
+        if OPEN_SET:
+            open_set = OpenSetDetector(
+                classifier.model,
+                method=OPEN_SET_METHOD,
+                target_tpr=OPEN_SET_TARGET_TPR
+            )
+            if lazy:
+                # Centróides da validação: o loader de treino é aumentado e embaralhado
+                open_set.calibrate(val_seq, val_seq.labels[val_seq.indices])
+            else:
+                open_set.calibrate(X_val, y_val, X_train, y_train)
+            
+            report = None
+            if UNKNOWN_DATA_DIR:
+                unknown_files = sorted(Path(UNKNOWN_DATA_DIR).rglob("*.npy"))
+                X_unknown = np.stack([classifier._prepare_spectrogram(load_spectrogram(f)) for f in unknown_files])
+                X_unknown = (X_unknown.astype(np.float32) - stats['min']) / (stats['max'] - stats['min'])
+                report = open_set.evaluate_unknown(test_seq if lazy else X_test, X_unknown)
+            open_set.save(classifier.model_dir, report)
+        
+        # Avaliar
+        if lazy:
+            results = classifier.evaluate(test_seq, None, open_set=open_set)
+        else:
+            results = classifier.evaluate(X_test, y_test, open_set=open_set)
+        
+        # Plotar matriz de confusão
+        classifier.plot_confusion_matrix(
+            results['confusion_matrix'],
+            save_path=f"{MODEL_DIR}/confusion_matrix.png"
+        )
+        teacher = classifier.model
+        
+        # Poda estruturada opcional (salva pruned_model.h5 no diretório do modelo)
+        if PRUNE:
+            pruner = ModelPruner(
+                classifier.model,
+                sparsity_schedule=PRUNING_SCHEDULE,
+                fine_tune_epochs=PRUNING_FINE_TUNE_EPOCHS
+            )
+            pruner.prune(
+                X_train, y_train,
+                X_val, y_val,
+                batch_size=BATCH_SIZE,
+                model_dir=classifier.model_dir
+            )
+    
+    if MODE == 'distill':
+        distiller = StudentDistiller(
+            teacher,
+            classifier.class_names,
+            temperature=DISTILL_TEMPERATURE,
+            alpha=DISTILL_ALPHA,
+            normalization_stats=classifier.normalization_stats,
+            preprocessing=classifier.preprocessing
+        )
+        distiller.train(
+            X_train, y_train,
+            X_val, y_val,
+            epochs=EPOCHS,
+            output_dir=MODEL_DIR
+        )
+        distiller.compare_with_teacher(X_test, y_test)
     
     print("\n✅ Pipeline de treinamento completo!")
 
@@ -7,16 +7,385 @@ Data: Novembro 2025
 """
 
 import os
+import re
+import math
+import hashlib
 import subprocess
 import json
+import tempfile
+from collections import Counter
+from datetime import datetime
 from pathlib import Path
 import shutil
 
 
+# Operações que não deveriam sobreviver à otimização do grafo de inferência
+UNFOLDED_OPS = ('FusedBatchNorm', 'FusedBatchNormV3', 'BatchNormWithGlobalNormalization')
+TRAINING_ONLY_OPS = ('RandomUniform', 'RandomStandardNormal')
+
+# Bytes por elemento dos pesos no formato binário do TF.js
+WEIGHT_DTYPE_BYTES = {'float32': 4, 'int32': 4, 'float16': 2, 'uint16': 2, 'uint8': 1, 'bool': 1}
+
+# Shards gerados pelo conversor ou por pack_weight_shards
+SHARD_FILE_PATTERN = re.compile(r'^group\d+-shard\d+of\d+(\.[0-9a-f]+)?\.bin$')
+
+MANIFEST_NAME = 'model-manifest.json'
+
+
+def export_inference_saved_model(keras_model_path: str, saved_model_dir: str):
+    """
+    Congela o classificador Keras em um SavedModel de inferência
+    
+    A assinatura `serving_default` chama o modelo com training=False, de modo
+    que Dropout vira identidade e BatchNormalization usa as estatísticas
+    móveis (constantes que o conversor consegue dobrar nas convoluções).
+    
+    Args:
+        keras_model_path: Caminho do modelo .h5
+        saved_model_dir: Diretório de saída do SavedModel
+    """
+    import tensorflow as tf
+    
+    model = tf.keras.models.load_model(str(keras_model_path), compile=False)
+    input_spec = tf.TensorSpec([None, *model.input_shape[1:]], tf.float32, name='input')
+    
+    @tf.function(input_signature=[input_spec])
+    def serve(x):
+        return {'probabilities': model(x, training=False)}
+    
+    tf.saved_model.save(model, str(saved_model_dir), signatures={'serving_default': serve})
+    print(f"🧊 SavedModel de inferência exportado: {saved_model_dir}")
+
+
+def _load_converted_model(output_dir: str, output_format: str):
+    """
+    Carrega em Python o modelo TF.js convertido (pesos já desquantizados)
+    
+    Args:
+        output_dir: Diretório com model.json e shards
+        output_format: 'layers' ou 'graph'
+    
+    Returns:
+        Função x -> probabilidades
+    """
+    import tensorflow as tf
+    
+    if output_format == 'layers':
+        from tensorflowjs.converters import load_keras_model
+        model = load_keras_model(str(Path(output_dir) / 'model.json'))
+        return lambda x: model.predict(x, verbose=0)
+    
+    try:
+        from tfjs_graph_converter import api as graph_api
+    except ImportError as e:
+        raise ImportError("Verificar um tfjs_graph_model requer tfjs-graph-converter: "
+                          "pip install tfjs-graph-converter") from e
+    
+    graph_fn = graph_api.graph_to_function_v2(graph_api.load_graph_model(str(output_dir)))
+    
+    def predict(x):
+        outputs = graph_fn(tf.constant(x))
+        if isinstance(outputs, dict):
+            outputs = list(outputs.values())
+        if isinstance(outputs, (list, tuple)):
+            outputs = outputs[0]
+        return outputs.numpy()
+    
+    return predict
+
+
+def verify_converted_parity(keras_model_path: str,
+                            output_dir: str,
+                            output_format: str = 'layers',
+                            quantized: bool = True,
+                            n_samples: int = 8,
+                            atol: float = None,
+                            seed: int = 42):
+    """
+    Compara as predições do modelo Keras com as do modelo TF.js convertido
+    
+    O artefato verificado é o model.json + shards que vão para o navegador
+    (com a quantização uint8 e o reempacotamento dos shards aplicados). Com
+    quantização a tolerância padrão é maior, pois os pesos mudam de fato.
+    
+    Args:
+        keras_model_path: Caminho do modelo .h5 de referência
+        output_dir: Diretório do modelo TF.js convertido
+        output_format: 'layers' ou 'graph'
+        quantized: Se a conversão usou quantização uint8
+        n_samples: Número de entradas sintéticas no range [0, 1]
+        atol: Tolerância absoluta nas probabilidades (padrão: 5e-2 quantizado, 1e-4 sem)
+        seed: Semente das entradas sintéticas
+    
+    Returns:
+        True/False conforme a paridade, ou None se o modelo convertido não
+        pôde ser carregado em Python (saída não verificada)
+    """
+    import numpy as np
+    import tensorflow as tf
+    
+    if atol is None:
+        atol = 5e-2 if quantized else 1e-4
+    
+    try:
+        converted = _load_converted_model(output_dir, output_format)
+    except ImportError as e:
+        print(f"\n⚠️  Paridade não verificada: {e}")
+        return None
+    
+    model = tf.keras.models.load_model(str(keras_model_path), compile=False)
+    x = np.random.default_rng(seed).random([n_samples, *model.input_shape[1:]], dtype=np.float32)
+    expected = model.predict(x, verbose=0)
+    actual = np.asarray(converted(x))
+    
+    max_diff = float(np.abs(expected - actual).max())
+    same_argmax = float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1)))
+    
+    print("\n🔬 Verificação de paridade (Keras vs modelo TF.js convertido):")
+    print(f"   Diferença máxima: {max_diff:.2e} (tolerância {atol:.0e}"
+          f"{', quantizado uint8' if quantized else ''})")
+    print(f"   Concordância de argmax: {same_argmax * 100:.1f}%")
+    
+    ok = max_diff <= atol
+    print("   ✅ Paridade confirmada" if ok else "   ❌ Predições divergem")
+    
+    return ok
+
+
+def summarize_graph_model_ops(model_json_path: str) -> dict:
+    """
+    Resume as operações do grafo convertido (model.json de um tfjs_graph_model)
+    
+    Args:
+        model_json_path: Caminho do model.json
+    
+    Returns:
+        Dicionário {operação: contagem}
+    """
+    with open(model_json_path, 'r') as f:
+        topology = json.load(f).get('modelTopology', {})
+    
+    ops = Counter(node.get('op') for node in topology.get('node', []))
+    fused = {op: n for op, n in ops.items() if op.startswith('_Fused') or op.startswith('Fused')}
+    unfolded = {op: n for op, n in ops.items() if op in UNFOLDED_OPS}
+    leftover = {op: n for op, n in ops.items() if op in TRAINING_ONLY_OPS}
+    
+    print(f"\n🧮 Grafo TF.js: {sum(ops.values())} nós, {len(ops)} tipos de operação")
+    if fused:
+        print(f"   Operações fundidas: {fused}")
+    if unfolded:
+        print(f"   ⚠️  BatchNorm não dobrado: {unfolded}")
+    else:
+        print("   ✅ BatchNorm dobrado nas convoluções")
+    if leftover:
+        print(f"   ⚠️  Operações de treino no grafo: {leftover}")
+    
+    return dict(ops)
+
+
+def _sha256_file(path: Path) -> str:
+    """
+    Calcula o SHA-256 de um arquivo em blocos
+    
+    Args:
+        path: Caminho do arquivo
+    
+    Returns:
+        Digest hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _weight_nbytes(spec: dict) -> int:
+    """
+    Tamanho em bytes de um peso descrito no weightsManifest do TF.js
+    
+    Args:
+        spec: Entrada de `weights` (name, shape, dtype, quantization opcional)
+    
+    Returns:
+        Número de bytes ocupados no buffer binário, ou None se o dtype não
+        for conhecido (ex.: pesos string com comprimento variável)
+    """
+    dtype = spec.get('quantization', {}).get('dtype', spec.get('dtype', 'float32'))
+    if dtype not in WEIGHT_DTYPE_BYTES:
+        return None
+    return math.prod(spec.get('shape', [])) * WEIGHT_DTYPE_BYTES[dtype]
+
+
+def plan_shard_boundaries(weight_sizes: list, target_bytes: int) -> list:
+    """
+    Define os cortes dos shards alinhados às fronteiras dos pesos
+    
+    Pesos são agrupados de forma gulosa até o tamanho alvo; pesos maiores
+    que o alvo são divididos em pedaços iguais. Como os cortes dependem só
+    da arquitetura, uma atualização que altera poucas camadas muda apenas
+    os shards que contêm essas camadas.
+    
+    Args:
+        weight_sizes: Tamanho em bytes de cada peso, na ordem do buffer
+        target_bytes: Tamanho alvo de cada shard
+    
+    Returns:
+        Lista de tamanhos (bytes) de cada shard
+    """
+    shards = []
+    current = 0
+    
+    for size in weight_sizes:
+        if size > target_bytes:
+            if current:
+                shards.append(current)
+                current = 0
+            n_pieces = math.ceil(size / target_bytes)
+            piece = math.ceil(size / n_pieces)
+            shards.extend([piece] * (n_pieces - 1))
+            shards.append(size - piece * (n_pieces - 1))
+        elif current + size > target_bytes:
+            shards.append(current)
+            current = size
+        else:
+            current += size
+    
+    if current or not shards:
+        shards.append(current)
+    
+    return shards
+
+
+def pack_weight_shards(output_dir: str, target_chunk_mb: float = 1.0, hash_length: int = 16) -> list:
+    """
+    Reempacota os pesos do modelo TF.js em shards com nomes por conteúdo
+    
+    O TF.js concatena os shards de cada grupo antes de fatiar os pesos, então
+    os cortes podem ser escolhidos livremente. Os novos nomes seguem o padrão
+    `group{g}-shard{i}of{n}.{sha256[:hash_length]}.bin`, permitindo cache
+    imutável no CDN/service worker: shards inalterados mantêm o mesmo nome
+    entre versões do modelo.
+    
+    Args:
+        output_dir: Diretório com model.json e shards gerados pelo conversor
+        target_chunk_mb: Tamanho alvo de cada shard em MB
+        hash_length: Número de caracteres do hash no nome do arquivo
+    
+    Returns:
+        Lista com os nomes dos shards gerados
+    """
+    output_path = Path(output_dir)
+    model_json_path = output_path / 'model.json'
+    target_bytes = max(1, int(target_chunk_mb * 1024 * 1024))
+    
+    with open(model_json_path, 'r') as f:
+        model_json = json.load(f)
+    
+    old_files = set()
+    new_files = []
+    
+    for group_idx, group in enumerate(model_json['weightsManifest'], start=1):
+        old_paths = group['paths']
+        old_files.update(old_paths)
+        buffer = b''.join((output_path / p).read_bytes() for p in old_paths)
+        
+        weight_sizes = [_weight_nbytes(spec) for spec in group['weights']]
+        if None in weight_sizes or sum(weight_sizes) != len(buffer):
+            # Formato desconhecido: dividir o buffer em partes iguais
+            n_shards = max(1, math.ceil(len(buffer) / target_bytes))
+            shard_size = math.ceil(len(buffer) / n_shards)
+            shard_sizes = [shard_size] * (n_shards - 1) + [len(buffer) - shard_size * (n_shards - 1)]
+        else:
+            shard_sizes = plan_shard_boundaries(weight_sizes, target_bytes)
+        
+        paths = []
+        offset = 0
+        for shard_idx, size in enumerate(shard_sizes, start=1):
+            chunk = buffer[offset:offset + size]
+            offset += size
+            digest = hashlib.sha256(chunk).hexdigest()[:hash_length]
+            name = f"group{group_idx}-shard{shard_idx}of{len(shard_sizes)}.{digest}.bin"
+            (output_path / name).write_bytes(chunk)
+            paths.append(name)
+        
+        group['paths'] = paths
+        new_files.extend(paths)
+    
+    with open(model_json_path, 'w') as f:
+        json.dump(model_json, f)
+    
+    # Remover shards antigos (do conversor ou de versões anteriores)
+    for file in output_path.iterdir():
+        if SHARD_FILE_PATTERN.match(file.name) and file.name not in new_files:
+            file.unlink()
+    
+    print(f"\n📦 Pesos reempacotados em {len(new_files)} shards (alvo {target_chunk_mb} MB)")
+    
+    return new_files
+
+
+def write_cache_manifest(output_dir: str) -> dict:
+    """
+    Escreve o manifesto de cache do modelo (tamanhos e SHA-256 de cada arquivo)
+    
+    Apenas o model.json e os shards listados no seu weightsManifest entram no
+    manifesto. Shards com hash no nome são marcados como imutáveis; o
+    model.json deve ser revalidado pelo cliente. A
+    versão do manifesto é o hash do model.json, então clientes podem comparar
+    versões e baixar apenas os shards que ainda não têm em cache.
+    
+    Args:
+        output_dir: Diretório do modelo TF.js
+    
+    Returns:
+        Dicionário do manifesto
+    """
+    output_path = Path(output_dir)
+    
+    with open(output_path / 'model.json', 'r') as f:
+        weights_manifest = json.load(f).get('weightsManifest', [])
+    names = ['model.json'] + [p for group in weights_manifest for p in group['paths']]
+    
+    files = []
+    for name in names:
+        file = output_path / name
+        match = SHARD_FILE_PATTERN.match(file.name)
+        immutable = bool(match and match.group(1))
+        files.append({
+            "path": file.name,
+            "bytes": file.stat().st_size,
+            "sha256": _sha256_file(file),
+            "cacheControl": ("public, max-age=31536000, immutable" if immutable
+                             else "no-cache")
+        })
+    
+    manifest = {
+        "version": files[0]['sha256'][:16],
+        "createdAt": datetime.now().isoformat(timespec='seconds'),
+        "totalBytes": sum(f['bytes'] for f in files),
+        "files": files
+    }
+    
+    manifest_path = output_path / MANIFEST_NAME
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    
+    print(f"✅ Manifesto de cache criado: {manifest_path}")
+    print(f"   Versão: {manifest['version']} | {len(files)} arquivos | "
+          f"{manifest['totalBytes'] / (1024 * 1024):.2f} MB")
+    
+    return manifest
+
+
 def convert_model_to_tfjs(input_model_path: str,
                           output_dir: str,
                           quantization: bool = True,
-                          weight_shard_size_mb: int = 4):
+                          weight_shard_size_mb: int = 4,
+                          target_chunk_mb: float = None,
+                          output_format: str = 'layers',
+                          parity_check: bool = True,
+                          parity_atol: float = None):
     """
     Converte modelo Keras/TensorFlow para formato TensorFlow.js
     
@@ -24,18 +393,34 @@ def convert_model_to_tfjs(input_model_path: str,
         input_model_path: Caminho do modelo .h5 ou SavedModel
         output_dir: Diretório de saída para modelo convertido
         quantization: Se deve aplicar quantização uint8
-        weight_shard_size_mb: Tamanho dos shards em MB
+        weight_shard_size_mb: Tamanho dos shards em MB (usado pelo conversor)
+        target_chunk_mb: Se definido, reempacota os pesos em shards desse
+            tamanho com nomes por hash de conteúdo (ver pack_weight_shards)
+        output_format: 'layers' (tf.loadLayersModel) ou 'graph'
+            (tf.loadGraphModel, grafo congelado com BatchNorm dobrado e
+            Dropout removido)
+        parity_check: Se deve comparar o modelo TF.js convertido com o
+            modelo Keras (apenas entrada .h5)
+        parity_atol: Tolerância absoluta da verificação de paridade
+            (padrão depende da quantização)
     """
     input_path = Path(input_model_path)
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
+    if output_format not in ('layers', 'graph'):
+        raise ValueError(f"Formato de saída não suportado: {output_format}")
+    
     print("🔄 Conversão de Modelo para TensorFlow.js")
     print("="*60)
     print(f"📥 Input:  {input_path}")
     print(f"📤 Output: {output_path}")
+    print(f"🧩 Formato: {'tfjs_graph_model' if output_format == 'graph' else 'tfjs_layers_model'}")
     print(f"🗜️  Quantização: {'Sim (uint8)' if quantization else 'Não'}")
-    print(f"📦 Shard size: {weight_shard_size_mb} MB")
+    if target_chunk_mb:
+        print(f"📦 Shard size: automático (alvo {target_chunk_mb} MB, nomes por hash)")
+    else:
+        print(f"📦 Shard size: {weight_shard_size_mb} MB")
     print("="*60)
     
     # Determinar formato do modelo
@@ -48,13 +433,30 @@ def convert_model_to_tfjs(input_model_path: str,
     else:
         raise ValueError(f"Formato de modelo não suportado: {input_path}")
     
-    # Montar comando
-    cmd = [
-        'tensorflowjs_converter',
-        '--input_format', input_format,
-        '--output_format', 'tfjs_layers_model',
-        '--weight_shard_size_bytes', str(weight_shard_size_mb * 1024 * 1024)
-    ]
+    saved_model_tmp = None
+    if output_format == 'graph':
+        # O conversor de grafo só aceita SavedModel: congelar o .h5 primeiro
+        if input_format == 'keras':
+            saved_model_tmp = tempfile.mkdtemp(prefix='bioacustic_saved_model_')
+            export_inference_saved_model(str(input_path), saved_model_tmp)
+            input_path = Path(saved_model_tmp)
+            input_format = 'tf_saved_model'
+        
+        cmd = [
+            'tensorflowjs_converter',
+            '--input_format', input_format,
+            '--output_format', 'tfjs_graph_model',
+            '--signature_name', 'serving_default',
+            '--saved_model_tags', 'serve',
+            '--weight_shard_size_bytes', str(weight_shard_size_mb * 1024 * 1024)
+        ]
+    else:
+        cmd = [
+            'tensorflowjs_converter',
+            '--input_format', input_format,
+            '--output_format', 'tfjs_layers_model',
+            '--weight_shard_size_bytes', str(weight_shard_size_mb * 1024 * 1024)
+        ]
     
     # Adicionar quantização se solicitado
     if quantization:
@@ -78,6 +480,9 @@ def convert_model_to_tfjs(input_model_path: str,
         print("✅ Conversão concluída com sucesso!")
         print(result.stdout)
         
+        if target_chunk_mb:
+            pack_weight_shards(str(output_path), target_chunk_mb=target_chunk_mb)
+        
         # Listar arquivos gerados
         generated_files = list(output_path.iterdir())
         print(f"\n📁 Arquivos gerados ({len(generated_files)}):")
@@ -91,8 +496,16 @@ def convert_model_to_tfjs(input_model_path: str,
         
         print(f"\n📊 Tamanho total: {total_size / (1024 * 1024):.2f} MB")
         
-        return True
+        if output_format == 'graph':
+            summarize_graph_model_ops(str(output_path / 'model.json'))
         
+        if parity_check and Path(input_model_path).suffix == '.h5':
+            parity = verify_converted_parity(input_model_path, str(output_path), output_format,
+                                             quantized=quantization, atol=parity_atol)
+            return parity is not False
+        
+        return True
+    
     except subprocess.CalledProcessError as e:
         print(f"❌ Erro na conversão:")
         print(e.stderr)
@@ -101,12 +514,16 @@ def convert_model_to_tfjs(input_model_path: str,
         print("❌ Erro: tensorflowjs_converter não encontrado!")
         print("   Instale com: pip install tensorflowjs")
         return False
+    finally:
+        if saved_model_tmp:
+            shutil.rmtree(saved_model_tmp, ignore_errors=True)
 
 
 def create_model_metadata(model_dir: str, 
                           class_names_path: str,
                           config_path: str,
-                          output_dir: str):
+                          output_dir: str,
+                          model_format: str = 'layers'):
     """
     Cria arquivo de metadados para o modelo web
     
@@ -115,6 +532,7 @@ def create_model_metadata(model_dir: str,
         class_names_path: Caminho do arquivo class_names.json
         config_path: Caminho do arquivo config.json
         output_dir: Diretório de saída (onde está o modelo TF.js)
+        model_format: 'layers' ou 'graph' (define o loader no navegador)
     """
     print("\n📝 Criando metadados do modelo...")
     
@@ -126,19 +544,25 @@ def create_model_metadata(model_dir: str,
     with open(config_path, 'r') as f:
         config = json.load(f)
     
+    input_shape = list(config.get('input_shape', [128, 128, 3]))
+    
+    # Configuração de 02_preprocess_audio gravada no treino (padrões se ausente)
+    preprocessing = config.get('preprocessing') or {}
+    
     # Criar metadados completos
     metadata = {
         "modelInfo": {
             "name": "Amphibian Bioacoustic Classifier",
             "version": config.get('timestamp', '1.0.0'),
             "architecture": config.get('architecture', 'mobilenet'),
+            "format": model_format,
             "description": "Classificador de espécies de anfíbios baseado em vocalizações"
         },
         "inputSpec": {
-            "shape": config.get('input_shape', [128, 128, 3]),
+            "shape": input_shape,
             "dtype": "float32",
             "range": [0, 1],
-            "description": "Mel-espectrograma normalizado (128x128x3)"
+            "description": f"Mel-espectrograma normalizado ({'x'.join(map(str, input_shape))})"
         },
         "outputSpec": {
             "shape": [config.get('num_classes', len(class_names))],
@@ -148,24 +572,39 @@ def create_model_metadata(model_dir: str,
         "classes": class_names,
         "numClasses": len(class_names),
         "preprocessing": {
-            "sampleRate": 22050,
-            "duration": 3.0,
-            "nMels": 128,
-            "nFFT": 2048,
-            "hopLength": 512,
-            "fmin": 50,
-            "fmax": 8000
+            "sampleRate": preprocessing.get('sample_rate', 22050),
+            "duration": preprocessing.get('duration', 3.0),
+            "nMels": preprocessing.get('n_mels', 128),
+            "nFFT": preprocessing.get('n_fft', 2048),
+            "hopLength": preprocessing.get('hop_length', 512),
+            "fmin": preprocessing.get('fmin', 50),
+            "fmax": preprocessing.get('fmax', 8000),
+            "resampleProfile": preprocessing.get('resample_profile', 'soxr_hq')
         },
         "performance": {
             "trainingEpochs": config.get('epochs_trained', 'N/A'),
             "learningRate": config.get('learning_rate', 0.0001)
         },
         "usage": {
-            "loadModel": "tf.loadLayersModel('./model.json')",
+            "loadModel": ("tf.loadGraphModel('./model.json')" if model_format == 'graph'
+                          else "tf.loadLayersModel('./model.json')"),
             "predict": "model.predict(tf.tensor4d([melSpectrogram]))"
         }
     }
     
+    # Limiares open-set (03_train_model.OpenSetDetector). O navegador recebe
+    # apenas probabilidades, então aplica o limiar de max_softmax.
+    open_set = config.get('open_set')
+    if open_set and 'max_softmax' in open_set.get('thresholds', {}):
+        metadata["openSet"] = {
+            "method": "max_softmax",
+            "threshold": open_set['thresholds']['max_softmax'],
+            "targetTpr": open_set.get('target_tpr'),
+            "trainingMethod": open_set.get('method'),
+            "thresholds": open_set['thresholds'],
+            "description": "Predições com probabilidade máxima abaixo do limiar são marcadas como espécie desconhecida"
+        }
+    
     # Salvar metadados
     metadata_path = Path(output_dir) / 'metadata.json'
     with open(metadata_path, 'w', encoding='utf-8') as f:
@@ -242,11 +681,11 @@ def create_test_html(output_dir: str):
         
         <div id="results"></div>
     </div>
-
+    
     <script>
         let model = null;
         let metadata = null;
-
+        
         async function loadAndTest() {
             const statusDiv = document.getElementById('status');
             const resultsDiv = document.getElementById('results');
@@ -264,7 +703,9 @@ def create_test_html(output_dir: str):
                 // Carregar modelo
                 statusDiv.innerHTML = '⏳ Carregando modelo TensorFlow.js...';
                 
-                model = await tf.loadLayersModel('./model.json');
+                model = metadata.modelInfo.format === 'graph'
+                    ? await tf.loadGraphModel('./model.json')
+                    : await tf.loadLayersModel('./model.json');
                 
                 statusDiv.innerHTML = '✅ Modelo carregado com sucesso!';
                 statusDiv.className = 'status success';
@@ -315,14 +756,14 @@ def create_test_html(output_dir: str):
                 predictions.dispose();
                 
                 resultsDiv.innerHTML = info;
-                
+            
             } catch (error) {
                 statusDiv.innerHTML = `❌ Erro: ${error.message}`;
                 statusDiv.className = 'status error';
                 console.error('Erro completo:', error);
             }
         }
-
+        
         // Auto-carregar ao abrir a página
         window.addEventListener('load', () => {
             setTimeout(loadAndTest, 500);
@@ -347,6 +788,8 @@ def main():
     # Configurações - AJUSTAR CONFORME SEU AMBIENTE
     MODEL_PATH = "./backend/models/best_model.h5"  # ou caminho do SavedModel
     OUTPUT_DIR = "./frontend/assets/model"
+    OUTPUT_FORMAT = 'layers'  # 'layers' ou 'graph' (grafo congelado, mais rápido no navegador)
+    TARGET_CHUNK_MB = 1.0  # Tamanho alvo dos shards (None = shards fixos do conversor)
     
     # Caminhos de metadados
     MODEL_DIR = Path(MODEL_PATH).parent
@@ -367,7 +810,9 @@ def main():
         input_model_path=MODEL_PATH,
         output_dir=OUTPUT_DIR,
         quantization=True,  # Reduz tamanho em ~4x
-        weight_shard_size_mb=4
+        weight_shard_size_mb=4,
+        target_chunk_mb=TARGET_CHUNK_MB,
+        output_format=OUTPUT_FORMAT
     )
     
     if not success:
@@ -380,7 +825,8 @@ def main():
             model_dir=str(MODEL_DIR),
             class_names_path=str(CLASS_NAMES_PATH),
             config_path=str(CONFIG_PATH),
-            output_dir=OUTPUT_DIR
+            output_dir=OUTPUT_DIR,
+            model_format=OUTPUT_FORMAT
         )
     else:
         print("⚠️  Arquivos de metadados não encontrados, pulando...")
@@ -388,6 +834,9 @@ def main():
     # 3. Criar HTML de teste
     create_test_html(OUTPUT_DIR)
     
+    # 4. Manifesto de cache (tamanhos + SHA-256 de cada arquivo)
+    write_cache_manifest(OUTPUT_DIR)
+    
     print("\n" + "="*60)
     print("✅ CONVERSÃO COMPLETA!")
     print("="*60)
@@ -0,0 +1,410 @@
+"""
+Script de Busca de Hiperparâmetros
+Fase 3b: Sweep paralelo com Successive Halving / Hyperband
+
+Autor: Projeto BioAcustic
+Data: Novembro 2025
+"""
+
+import os
+import json
+import math
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+from pipeline_utils import import_script
+import warnings
+warnings.filterwarnings('ignore')
+
+
+def _memmap_sequence_class():
+    """
+    Cria a classe de batches sobre memmap (depende do Keras, importado só nos workers)
+    """
+    from tensorflow import keras
+    
+    class MemmapSequence(keras.utils.Sequence):
+        """
+        Batches lidos sob demanda de arrays memory-mapped
+        
+        Os workers compartilham o page cache do sistema em vez de cada um
+        carregar sua própria cópia do dataset.
+        """
+        
+        def __init__(self, X, y, batch_size, shuffle=False, seed=42):
+            super().__init__()
+            self.X = X
+            self.y = y
+            self.batch_size = batch_size
+            self.shuffle = shuffle
+            self.rng = np.random.default_rng(seed)
+            self.indices = np.arange(len(y))
+            self.on_epoch_end()
+        
+        def __len__(self):
+            return math.ceil(len(self.y) / self.batch_size)
+        
+        def __getitem__(self, i):
+            # Índices ordenados: leitura sequencial dentro do memmap
+            idx = np.sort(self.indices[i * self.batch_size:(i + 1) * self.batch_size])
+            return np.asarray(self.X[idx], dtype=np.float32), np.asarray(self.y[idx])
+        
+        def on_epoch_end(self):
+            if self.shuffle:
+                self.rng.shuffle(self.indices)
+    
+    return MemmapSequence
+
+
+def run_trial(task: dict) -> dict:
+    """
+    Executa (ou continua) um trial em um processo do pool
+    
+    O modelo é salvo em `trial_dir/model.h5` ao fim de cada rung; no rung
+    seguinte ele é recarregado (com o estado do otimizador) e treinado
+    apenas pelas épocas adicionais.
+    
+    Args:
+        task: Dicionário com trial_id, params, data_dir, trial_dir,
+            initial_epoch, epochs, class_names, input_shape, seed e threads
+    
+    Returns:
+        Dicionário com as métricas do trial no rung
+    """
+    import tensorflow as tf
+    
+    if task.get('threads'):
+        tf.config.threading.set_intra_op_parallelism_threads(task['threads'])
+        tf.config.threading.set_inter_op_parallelism_threads(2)
+    
+    train_module = import_script('03_train_model')
+    keras = train_module.keras
+    # Semente deslocada pela época inicial: cada rung continua os sorteios
+    # (embaralhamento, dropout) em vez de repetir os do rung anterior
+    seed = task['seed'] + task['initial_epoch']
+    keras.utils.set_random_seed(seed)
+    MemmapSequence = _memmap_sequence_class()
+    
+    data_dir = Path(task['data_dir'])
+    X_train = np.load(data_dir / 'X_train.npy', mmap_mode='r')
+    y_train = np.load(data_dir / 'y_train.npy')
+    X_val = np.load(data_dir / 'X_val.npy', mmap_mode='r')
+    y_val = np.load(data_dir / 'y_val.npy')
+    
+    params = task['params']
+    trial_dir = Path(task['trial_dir'])
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    model_path = trial_dir / 'model.h5'
+    
+    if task['initial_epoch'] > 0 and model_path.exists():
+        model = keras.models.load_model(str(model_path))
+    else:
+        classifier = train_module.AmphibianClassifier(
+            input_shape=tuple(task['input_shape']),
+            num_classes=len(task['class_names']),
+            architecture=params['architecture'],
+            learning_rate=params['learning_rate']
+        )
+        model = classifier.build_model()
+    
+    history = model.fit(
+        MemmapSequence(X_train, y_train, params['batch_size'], shuffle=True, seed=seed),
+        validation_data=MemmapSequence(X_val, y_val, params['batch_size']),
+        epochs=task['epochs'],
+        initial_epoch=task['initial_epoch'],
+        verbose=0
+    )
+    model.save(str(model_path))
+    
+    result = {
+        'trial_id': task['trial_id'],
+        'bracket': task['bracket'],
+        'rung': task['rung'],
+        'epochs_trained': task['epochs'],
+        'val_accuracy': float(history.history['val_accuracy'][-1]),
+        'val_loss': float(history.history['val_loss'][-1]),
+        'params': int(model.count_params())
+    }
+    
+    config = {
+        'architecture': params['architecture'],
+        'input_shape': list(task['input_shape']),
+        'num_classes': len(task['class_names']),
+        'learning_rate': params['learning_rate'],
+        'batch_size': params['batch_size'],
+        'epochs_trained': task['epochs'],
+        'timestamp': datetime.now().strftime("%Y%m%d_%H%M%S"),
+        'sweep': result
+    }
+    train_module.save_model_contract(trial_dir, task['class_names'], config)
+    
+    return result
+
+
+class HyperbandSweep:
+    """
+    Busca de hiperparâmetros com Hyperband (brackets de Successive Halving)
+    
+    O dataset é carregado uma única vez e salvo como .npy; os trials rodam em
+    um pool de processos e leem os dados via memory map. Em cada rung apenas
+    a fração 1/eta melhor dos trials continua treinando.
+    """
+    
+    def __init__(self,
+                 search_space: dict,
+                 sweep_dir: str,
+                 max_epochs: int = 27,
+                 min_epochs: int = 1,
+                 eta: int = 3,
+                 n_workers: int = 2,
+                 seed: int = 42):
+        """
+        Inicializa o sweep
+        
+        Args:
+            search_space: {'nome': lista de opções ou ('log', min, max)}
+            sweep_dir: Diretório de saída (dados, trials e leaderboard)
+            max_epochs: Épocas máximas de um trial (recurso R do Hyperband)
+            min_epochs: Épocas do primeiro rung do bracket mais agressivo
+            eta: Fator de redução entre rungs
+            n_workers: Número de trials treinando em paralelo
+            seed: Semente da amostragem de configurações
+        """
+        self.search_space = search_space
+        self.sweep_dir = Path(sweep_dir)
+        self.max_epochs = max_epochs
+        self.min_epochs = min_epochs
+        self.eta = eta
+        self.n_workers = n_workers
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.data_dir = self.sweep_dir / 'data'
+        self.class_names = []
+        self.input_shape = (128, 128, 3)
+        self.results = {}
+        self._next_trial = 0
+        
+        self.sweep_dir.mkdir(parents=True, exist_ok=True)
+        
+        print("🔬 Inicializando Sweep de Hiperparâmetros (Hyperband)")
+        print(f"   Épocas: {min_epochs} → {max_epochs} (eta={eta})")
+        print(f"   Workers paralelos: {n_workers}")
+    
+    def prepare_data(self, data_dir: str, test_size=0.15, val_size=0.15):
+        """
+        Carrega o dataset uma única vez e salva os splits para memory map
+        
+        Args:
+            data_dir: Diretório com pastas de espécies
+            test_size: Proporção do conjunto de teste
+            val_size: Proporção do conjunto de validação
+        """
+        train_module = import_script('03_train_model')
+        classifier = train_module.AmphibianClassifier(input_shape=self.input_shape)
+        X_train, X_val, _, y_train, y_val, _ = classifier.load_dataset(
+            data_dir=data_dir,
+            test_size=test_size,
+            val_size=val_size
+        )
+        self.class_names = classifier.class_names
+        
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        np.save(self.data_dir / 'X_train.npy', X_train)
+        np.save(self.data_dir / 'y_train.npy', y_train)
+        np.save(self.data_dir / 'X_val.npy', X_val)
+        np.save(self.data_dir / 'y_val.npy', y_val)
+        with open(self.data_dir / 'class_names.json', 'w') as f:
+            json.dump(self.class_names, f, indent=2)
+        
+        print(f"💾 Splits salvos para memory map em: {self.data_dir}")
+    
+    def sample_params(self) -> dict:
+        """
+        Amostra uma configuração do espaço de busca
+        
+        Returns:
+            Dicionário de hiperparâmetros
+        """
+        params = {}
+        for name, space in self.search_space.items():
+            if isinstance(space, tuple) and space[0] == 'log':
+                _, low, high = space
+                params[name] = float(math.exp(self.rng.uniform(math.log(low), math.log(high))))
+            else:
+                params[name] = space[int(self.rng.integers(len(space)))]
+                if isinstance(params[name], np.generic):
+                    params[name] = params[name].item()
+        return params
+    
+    def _run_rung(self, trials: list, epochs: int, bracket: int, rung: int) -> list:
+        """
+        Treina todos os trials de um rung até `epochs` épocas, em paralelo
+        
+        Args:
+            trials: Lista de dicts {'trial_id', 'params', 'epochs_trained'}
+            epochs: Total de épocas ao fim do rung
+            bracket: Índice do bracket
+            rung: Índice do rung dentro do bracket
+        
+        Returns:
+            Lista de resultados na mesma ordem dos trials
+        """
+        threads = max(1, (os.cpu_count() or 1) // self.n_workers)
+        tasks = [{
+            'trial_id': t['trial_id'],
+            'bracket': bracket,
+            'rung': rung,
+            'params': t['params'],
+            'data_dir': str(self.data_dir),
+            'trial_dir': str(self.sweep_dir / 'trials' / t['trial_id']),
+            'initial_epoch': t['epochs_trained'],
+            'epochs': epochs,
+            'class_names': self.class_names,
+            'input_shape': list(self.input_shape),
+            'seed': self.seed,
+            'threads': threads
+        } for t in trials]
+        
+        print(f"\n🏃 Bracket {bracket} | Rung {rung}: {len(tasks)} trials até {epochs} épocas")
+        
+        # spawn: TensorFlow não é seguro após fork
+        with ProcessPoolExecutor(max_workers=self.n_workers,
+                                 mp_context=mp.get_context('spawn')) as pool:
+            results = list(pool.map(run_trial, tasks))
+        
+        for trial, result in zip(trials, results):
+            trial['epochs_trained'] = epochs
+            self.results[trial['trial_id']] = {**result, **trial['params'],
+                                               'trial_dir': str(self.sweep_dir / 'trials' / trial['trial_id'])}
+            print(f"   {trial['trial_id']}: val_acc={result['val_accuracy']:.4f} "
+                  f"val_loss={result['val_loss']:.4f}")
+        
+        self.write_leaderboard()
+        
+        return results
+    
+    def successive_halving(self, n_trials: int, min_epochs: int, bracket: int = 0) -> list:
+        """
+        Executa um bracket de Successive Halving
+        
+        Args:
+            n_trials: Número de configurações iniciais
+            min_epochs: Épocas do primeiro rung
+            bracket: Índice do bracket (para nomes e leaderboard)
+        
+        Returns:
+            Trials sobreviventes do último rung
+        """
+        trials = []
+        for _ in range(n_trials):
+            trials.append({
+                'trial_id': f"trial_{self._next_trial:03d}",
+                'params': self.sample_params(),
+                'epochs_trained': 0
+            })
+            self._next_trial += 1
+        
+        epochs = min_epochs
+        rung = 0
+        while trials:
+            results = self._run_rung(trials, min(epochs, self.max_epochs), bracket, rung)
+            
+            n_keep = len(trials) // self.eta
+            if n_keep < 1 or epochs >= self.max_epochs:
+                break
+            
+            # Poda antecipada: só o melhor 1/eta continua
+            order = np.argsort([-r['val_accuracy'] for r in results])
+            trials = [trials[i] for i in order[:n_keep]]
+            epochs *= self.eta
+            rung += 1
+        
+        return trials
+    
+    def run(self) -> pd.DataFrame:
+        """
+        Executa todos os brackets do Hyperband
+        
+        Returns:
+            Leaderboard ordenado por acurácia de validação
+        """
+        if not self.class_names:
+            raise ValueError("Execute prepare_data antes de run")
+        
+        s_max = int(math.floor(math.log(self.max_epochs / self.min_epochs, self.eta) + 1e-9))
+        
+        for s in range(s_max, -1, -1):
+            n_trials = int(math.ceil((s_max + 1) / (s + 1) * self.eta ** s))
+            min_epochs = max(1, int(round(self.max_epochs * self.eta ** (-s))))
+            print(f"\n🎰 Bracket s={s}: {n_trials} trials, {min_epochs} épocas iniciais")
+            self.successive_halving(n_trials, min_epochs, bracket=s_max - s)
+        
+        return self.write_leaderboard()
+    
+    def write_leaderboard(self) -> pd.DataFrame:
+        """
+        Salva leaderboard.csv/json com as entradas de config.json dos trials
+        
+        Returns:
+            DataFrame ordenado por acurácia de validação
+        """
+        df = pd.DataFrame(list(self.results.values()))
+        if df.empty:
+            return df
+        
+        df = df.sort_values(['val_accuracy', 'epochs_trained'], ascending=[False, True])
+        df.to_csv(self.sweep_dir / 'leaderboard.csv', index=False)
+        
+        with open(self.sweep_dir / 'leaderboard.json', 'w') as f:
+            json.dump(df.to_dict(orient='records'), f, indent=2)
+        
+        return df
+
+
+def main():
+    """
+    Função principal do sweep
+    """
+    # Configurações
+    DATA_DIR = "./backend/data/processed/spectrograms"
+    SWEEP_DIR = f"./backend/models/sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    
+    # Espaço de busca
+    SEARCH_SPACE = {
+        'architecture': ['mobilenet', 'efficientnet'],
+        'learning_rate': ('log', 1e-5, 1e-3),
+        'batch_size': [16, 32, 64]
+    }
+    
+    # Hyperband
+    MAX_EPOCHS = 27
+    ETA = 3
+    N_WORKERS = 2  # Trials em paralelo (cada um usa cpu_count / N_WORKERS threads)
+    
+    print("🐸 Sistema de Classificação de Anfíbios - Sweep de Hiperparâmetros")
+    print("="*60)
+    
+    sweep = HyperbandSweep(
+        SEARCH_SPACE,
+        sweep_dir=SWEEP_DIR,
+        max_epochs=MAX_EPOCHS,
+        eta=ETA,
+        n_workers=N_WORKERS
+    )
+    sweep.prepare_data(DATA_DIR)
+    leaderboard = sweep.run()
+    
+    print("\n" + "="*60)
+    print("🏆 LEADERBOARD")
+    print("="*60)
+    print(leaderboard.head(10).to_string(index=False))
+    
+    print("\n✅ Sweep completo!")
+    print(f"📁 Resultados salvos em: {SWEEP_DIR}")
+
+
+if __name__ == "__main__":
+    main()
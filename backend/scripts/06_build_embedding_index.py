@@ -0,0 +1,496 @@
+"""
+Script de Extração de Embeddings e Índice de Similaridade
+Fase 4b: Busca de vocalizações semelhantes (vizinhos mais próximos)
+
+Autor: Projeto BioAcustic
+Data: Novembro 2025
+"""
+
+import json
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from tqdm import tqdm
+from pipeline_utils import import_script
+import warnings
+warnings.filterwarnings('ignore')
+
+
+def _l2_normalize(X: np.ndarray) -> np.ndarray:
+    """
+    Normaliza as linhas para norma 1 (produto interno = similaridade de cosseno)
+    """
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.maximum(norms, 1e-12)
+
+
+class EmbeddingExtractor:
+    """
+    Extrai embeddings do backbone treinado (saída do GlobalAveragePooling2D)
+    """
+    
+    def __init__(self, model_dir: str, model_file='best_model.h5', batch_size=128):
+        """
+        Inicializa o extrator
+        
+        Args:
+            model_dir: Diretório gerado por 03_train_model (amphibian_classifier_*)
+            model_file: Arquivo do modelo dentro do diretório
+            batch_size: Espectrogramas processados por batch
+        """
+        self.train_module = import_script('03_train_model')
+        self.model_dir = Path(model_dir)
+        self.batch_size = batch_size
+        
+        model, self.class_names, self.config = self.train_module.load_model_dir(model_dir, model_file)
+        self.embedding_model, self.layer_name = self.build_embedding_model(model)
+        self.embedding_dim = int(self.embedding_model.output_shape[-1])
+        self.channels = int(model.input_shape[-1])
+        
+        classifier = self.train_module.AmphibianClassifier(
+            input_shape=tuple(self.config.get('input_shape', (128, 128, 3)))
+        )
+        self._prepare_rgb = classifier._prepare_spectrogram
+        
+        print(f"🧬 Embeddings de {self.layer_name} ({self.embedding_dim} dimensões)")
+    
+    @staticmethod
+    def build_embedding_model(model):
+        """
+        Corta o modelo na saída do GlobalAveragePooling2D
+        
+        Args:
+            model: Modelo Keras treinado
+        
+        Returns:
+            Tupla (modelo de embeddings, nome da camada)
+        """
+        from tensorflow import keras
+        
+        for layer in model.layers:
+            if isinstance(layer, keras.layers.GlobalAveragePooling2D):
+                return keras.Model(model.inputs, layer.output, name='AmphibianEmbedding'), layer.name
+        
+        raise ValueError(f"Modelo {model.name} não tem camada GlobalAveragePooling2D")
+    
+    def prepare_spectrogram(self, mel_spec: np.ndarray) -> np.ndarray:
+        """
+        Mesmo pré-processamento do treino, com o número de canais do modelo
+        """
+        return self._prepare_rgb(mel_spec)[..., :self.channels]
+    
+    def index_segments(self, data_dir: str):
+        """
+        Lista todos os segmentos, incluindo espécies fora do modelo
+        
+        Returns:
+            Tupla (files, labels, groups, species) do índice do dataset
+        """
+        data_path = Path(data_dir)
+        folders = sorted(d.name for d in data_path.iterdir() if d.is_dir())
+        species = list(self.class_names) + [f for f in folders if f not in self.class_names]
+        
+        splitter = self.train_module.RecordingSplitter()
+        return splitter.index_files(data_dir, class_names=species)
+    
+    def normalization_stats(self, data_dir: str, files) -> dict:
+        """
+        Estatísticas de normalização do treino (config.json) ou recalculadas
+        """
+        if self.config.get('normalization'):
+            return self.config['normalization']
+        
+        print("⚠️  config.json sem 'normalization': recalculando no dataset")
+        x_min, x_max = np.inf, -np.inf
+        for spec_file in tqdm(files, desc="Estatísticas de normalização"):
+            mel_spec = self.train_module.load_spectrogram(spec_file)
+            x_min = min(x_min, float(mel_spec.min()))
+            x_max = max(x_max, float(mel_spec.max()))
+        return {'min': x_min, 'max': x_max}
+    
+    def extract(self, data_dir: str, output_dir: str) -> dict:
+        """
+        Calcula os embeddings de todos os espectrogramas processados
+        
+        Os vetores são normalizados (L2) e gravados em batches direto em
+        um .npy float16 memory-mapped, sem manter o dataset em memória.
+        
+        Args:
+            data_dir: Diretório com pastas de espécies (.npy)
+            output_dir: Diretório de saída
+        
+        Returns:
+            Dicionário com caminhos e tamanho da matriz
+        """
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        
+        files, labels, groups, species = self.index_segments(data_dir)
+        if len(files) == 0:
+            raise ValueError(f"Nenhum espectrograma encontrado em {data_dir}")
+        
+        stats = self.normalization_stats(data_dir, files)
+        sequence = self.train_module.SpectrogramSequence(
+            files, labels, np.arange(len(files)),
+            prepare_fn=self.prepare_spectrogram,
+            stats=stats,
+            batch_size=self.batch_size
+        )
+        
+        embeddings_path = output_path / 'embeddings.npy'
+        embeddings = np.lib.format.open_memmap(
+            embeddings_path, mode='w+', dtype=np.float16,
+            shape=(len(files), self.embedding_dim)
+        )
+        
+        print(f"\n🎧 Extraindo embeddings de {len(files)} segmentos...")
+        start = time.perf_counter()
+        row = 0
+        for X, _ in tqdm(sequence.as_dataset(), total=len(sequence), desc="Embeddings"):
+            batch = self.embedding_model(X, training=False).numpy()
+            embeddings[row:row + len(batch)] = _l2_normalize(batch)
+            row += len(batch)
+        embeddings.flush()
+        elapsed = time.perf_counter() - start
+        
+        data_path = Path(data_dir)
+        segments = pd.DataFrame({
+            'file': [str(Path(f).relative_to(data_path)) for f in files],
+            'species': [species[label] for label in labels],
+            'recording': groups,
+            'in_model': labels < len(self.class_names)
+        })
+        segments.to_csv(output_path / 'segments.csv', index_label='row')
+        
+        info = {
+            'model_dir': str(self.model_dir),
+            'layer': self.layer_name,
+            'embedding_dim': self.embedding_dim,
+            'num_segments': int(len(files)),
+            'dtype': 'float16',
+            'normalized': 'l2',
+            'normalization': stats,
+            'size_mb': round(embeddings_path.stat().st_size / (1024 * 1024), 2)
+        }
+        with open(output_path / 'embeddings.json', 'w') as f:
+            json.dump(info, f, indent=2)
+        
+        print(f"✅ {len(files)} embeddings em {elapsed:.1f}s ({len(files) / elapsed:.0f} segmentos/s)")
+        print(f"   Matriz: {embeddings.shape} float16 ({info['size_mb']:.1f} MB)")
+        
+        return info
+    
+    def embed_files(self, files, stats: dict) -> np.ndarray:
+        """
+        Embeddings (normalizados) de espectrogramas avulsos, para consultas
+        
+        Args:
+            files: Caminhos de .npy
+            stats: {'min', 'max'} usados na extração
+        
+        Returns:
+            Array float32 (len(files), dim)
+        """
+        X = np.stack([self.prepare_spectrogram(self.train_module.load_spectrogram(f)) for f in files]).astype(np.float32)
+        X = (X - stats['min']) / (stats['max'] - stats['min'])
+        return _l2_normalize(self.embedding_model.predict(X, batch_size=self.batch_size, verbose=0))
+
+
+class BruteForceIndex:
+    """
+    Busca exata por produto interno, em blocos (fallback sem treino)
+    """
+    
+    def __init__(self, embeddings: np.ndarray, chunk_size=65536):
+        """
+        Args:
+            embeddings: Matriz (N, dim) normalizada (float16/memmap)
+            chunk_size: Linhas comparadas por bloco
+        """
+        self.embeddings = embeddings
+        self.chunk_size = chunk_size
+    
+    def search(self, queries: np.ndarray, k=10):
+        """
+        Retorna os k vizinhos mais similares de cada consulta
+        
+        Args:
+            queries: Array (Q, dim) normalizado
+            k: Número de vizinhos
+        
+        Returns:
+            Tupla (ids (Q, k), similaridades (Q, k))
+        """
+        queries = _l2_normalize(queries)
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        
+        for start in range(0, len(self.embeddings), self.chunk_size):
+            block = np.asarray(self.embeddings[start:start + self.chunk_size], dtype=np.float32)
+            scores = queries @ block.T
+            top = min(k, scores.shape[1])
+            part = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            best_ids = np.concatenate([best_ids, part + start], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+            
+            keep = np.argsort(-best_scores, axis=1)[:, :k]
+            best_ids = np.take_along_axis(best_ids, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        
+        return best_ids, best_scores
+
+
+class IVFIndex:
+    """
+    Índice aproximado IVF (inverted file) sobre embeddings normalizados
+    
+    Um k-means esférico divide os vetores em n_lists células; a consulta
+    compara apenas os vetores das n_probe células mais próximas.
+    """
+    
+    def __init__(self, n_lists=None, n_probe=8, kmeans_iters=10, train_size=65536, seed=42):
+        """
+        Inicializa o índice
+        
+        Args:
+            n_lists: Número de células (None = 4·√N)
+            n_probe: Células visitadas por consulta (recall × velocidade)
+            kmeans_iters: Iterações do k-means
+            train_size: Máximo de vetores amostrados para treinar o k-means
+            seed: Semente da amostragem e inicialização
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.kmeans_iters = kmeans_iters
+        self.train_size = train_size
+        self.seed = seed
+        
+        self.centroids = None
+        self.list_ids = None
+        self.list_offsets = None
+        self.embeddings = None
+    
+    def _assign(self, X: np.ndarray, chunk_size=65536) -> np.ndarray:
+        """
+        Célula (centróide de maior similaridade) de cada vetor
+        """
+        assignments = np.empty(len(X), dtype=np.int64)
+        for start in range(0, len(X), chunk_size):
+            block = np.asarray(X[start:start + chunk_size], dtype=np.float32)
+            assignments[start:start + chunk_size] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+    
+    def build(self, embeddings: np.ndarray):
+        """
+        Treina o quantizador e monta as listas invertidas
+        
+        Args:
+            embeddings: Matriz (N, dim) normalizada (float16/memmap)
+        """
+        rng = np.random.default_rng(self.seed)
+        n = len(embeddings)
+        n_lists = min(self.n_lists or max(1, int(4 * np.sqrt(n))), n)
+        
+        sample_ids = np.sort(rng.choice(n, min(n, max(self.train_size, n_lists)), replace=False))
+        sample = np.asarray(embeddings[sample_ids], dtype=np.float32)
+        
+        print(f"\n🗂️  Treinando IVF: {n_lists} células, k-means em {len(sample)} vetores...")
+        self.centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assignments = np.argmax(sample @ self.centroids.T, axis=1)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignments, sample)
+            empty = np.bincount(assignments, minlength=n_lists) == 0
+            # Células vazias recebem vetores aleatórios da amostra
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            self.centroids = _l2_normalize(sums)
+        
+        assignments = self._assign(embeddings)
+        self.list_ids = np.argsort(assignments, kind='stable')
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+        self.embeddings = embeddings
+        
+        sizes = np.diff(self.list_offsets)
+        print(f"   Tamanho das células: média {sizes.mean():.0f}, máx {sizes.max()}")
+        
+        return self
+    
+    def search(self, queries: np.ndarray, k=10, n_probe=None):
+        """
+        Retorna os k vizinhos aproximados de cada consulta
+        
+        Args:
+            queries: Array (Q, dim)
+            k: Número de vizinhos
+            n_probe: Sobrescreve o número de células visitadas
+        
+        Returns:
+            Tupla (ids (Q, k), similaridades (Q, k)); -1 se faltarem candidatos
+        """
+        queries = _l2_normalize(queries)
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :n_probe]
+        
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        
+        for q, (query, cells) in enumerate(zip(queries, probes)):
+            candidates = np.sort(np.concatenate([
+                self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in cells
+            ]))
+            if len(candidates) == 0:
+                continue
+            
+            sims = np.asarray(self.embeddings[candidates], dtype=np.float32) @ query
+            top = min(k, len(sims))
+            part = np.argpartition(-sims, top - 1)[:top]
+            part = part[np.argsort(-sims[part])]
+            ids[q, :top] = candidates[part]
+            scores[q, :top] = sims[part]
+        
+        return ids, scores
+    
+    def save(self, index_dir: str):
+        """
+        Salva o quantizador e as listas (os embeddings ficam em embeddings.npy)
+        """
+        np.savez(
+            Path(index_dir) / 'ivf_index.npz',
+            centroids=self.centroids.astype(np.float32),
+            list_ids=self.list_ids,
+            list_offsets=self.list_offsets,
+            n_probe=self.n_probe
+        )
+    
+    @classmethod
+    def load(cls, index_dir: str, mmap=True):
+        """
+        Carrega um índice salvo com os embeddings memory-mapped
+        """
+        index_path = Path(index_dir)
+        data = np.load(index_path / 'ivf_index.npz')
+        
+        index = cls(n_lists=len(data['centroids']), n_probe=int(data['n_probe']))
+        index.centroids = data['centroids']
+        index.list_ids = data['list_ids']
+        index.list_offsets = data['list_offsets']
+        index.embeddings = np.load(index_path / 'embeddings.npy', mmap_mode='r' if mmap else None)
+        return index
+
+
+def load_index(index_dir: str):
+    """
+    Abre o índice de um diretório: IVF se existir, senão busca exata
+    
+    Returns:
+        Tupla (índice, segments DataFrame)
+    """
+    index_path = Path(index_dir)
+    segments = pd.read_csv(index_path / 'segments.csv', index_col='row')
+    
+    if (index_path / 'ivf_index.npz').exists():
+        return IVFIndex.load(index_dir), segments
+    return BruteForceIndex(np.load(index_path / 'embeddings.npy', mmap_mode='r')), segments
+
+
+def evaluate_index(index, exact: BruteForceIndex, embeddings, n_queries=200, k=10, seed=42) -> dict:
+    """
+    Mede recall@k e latência do índice em relação à busca exata
+    
+    Returns:
+        Dicionário com recall e latências médias por consulta (ms)
+    """
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(embeddings), min(n_queries, len(embeddings)), replace=False)
+    queries = np.asarray(embeddings[np.sort(query_ids)], dtype=np.float32)
+    
+    start = time.perf_counter()
+    true_ids, _ = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    
+    start = time.perf_counter()
+    approx_ids, _ = index.search(queries, k)
+    approx_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    
+    recall = np.mean([len(np.intersect1d(a, t)) / len(t) for a, t in zip(approx_ids, true_ids)])
+    return {
+        f'recall@{k}': round(float(recall), 4),
+        'exact_ms_per_query': round(exact_ms, 3),
+        'index_ms_per_query': round(approx_ms, 3)
+    }
+
+
+def main():
+    """
+    Função principal: embeddings + índice + consulta de exemplo
+    """
+    # Configurações
+    MODEL_DIR = "./backend/models/amphibian_classifier_mobilenet_YYYYMMDD_HHMMSS"
+    DATA_DIR = "./backend/data/processed/spectrograms"
+    OUTPUT_DIR = "./backend/models/embedding_index"
+    
+    # Índice
+    BATCH_SIZE = 128
+    MIN_SEGMENTS_FOR_IVF = 20000  # Abaixo disso a busca exata já leva poucos ms
+    N_LISTS = None  # None = 4·√N
+    N_PROBE = 8
+    TOP_K = 10
+    
+    print("🐸 Sistema de Classificação de Anfíbios - Índice de Similaridade")
+    print("="*60)
+    
+    # Procurar modelo mais recente se não especificado
+    if "YYYYMMDD" in MODEL_DIR:
+        models_path = Path("./backend/models")
+        model_dirs = sorted(models_path.glob("amphibian_classifier_*"))
+        if not model_dirs:
+            print("❌ Nenhum modelo encontrado!")
+            print("   Execute primeiro: python 03_train_model.py")
+            return
+        MODEL_DIR = str(model_dirs[-1])
+        print(f"📁 Usando modelo mais recente: {MODEL_DIR}")
+    
+    # 1. Embeddings
+    extractor = EmbeddingExtractor(MODEL_DIR, batch_size=BATCH_SIZE)
+    info = extractor.extract(DATA_DIR, OUTPUT_DIR)
+    embeddings = np.load(Path(OUTPUT_DIR) / 'embeddings.npy', mmap_mode='r')
+    exact = BruteForceIndex(embeddings)
+    
+    # 2. Índice aproximado
+    ivf_path = Path(OUTPUT_DIR) / 'ivf_index.npz'
+    if len(embeddings) >= MIN_SEGMENTS_FOR_IVF:
+        index = IVFIndex(n_lists=N_LISTS, n_probe=N_PROBE).build(embeddings)
+        index.save(OUTPUT_DIR)
+        info['index'] = {'type': 'ivf', 'n_lists': len(index.centroids), 'n_probe': index.n_probe}
+        info['index'].update(evaluate_index(index, exact, embeddings, k=TOP_K))
+        print(f"📈 recall@{TOP_K}: {info['index'][f'recall@{TOP_K}']:.3f} | "
+              f"IVF {info['index']['index_ms_per_query']:.2f} ms vs "
+              f"exata {info['index']['exact_ms_per_query']:.2f} ms por consulta")
+    else:
+        if ivf_path.exists():
+            ivf_path.unlink()  # Índice antigo não corresponde mais aos embeddings
+        info['index'] = {'type': 'brute_force'}
+        print(f"\n🗂️  {len(embeddings)} segmentos: usando busca exata (NumPy)")
+    
+    with open(Path(OUTPUT_DIR) / 'embeddings.json', 'w') as f:
+        json.dump(info, f, indent=2)
+    
+    # 3. Consulta de exemplo
+    index, segments = load_index(OUTPUT_DIR)
+    query_row = 0
+    ids, scores = index.search(np.asarray(embeddings[[query_row]]), k=TOP_K + 1)
+    
+    print(f"\n🔎 Vocalizações mais similares a {segments.loc[query_row, 'file']}:")
+    for rank, (row, score) in enumerate(zip(ids[0], scores[0])):
+        if row < 0 or row == query_row:
+            continue
+        print(f"   {rank:2d}. {score:.3f}  {segments.loc[row, 'species']:30s} {segments.loc[row, 'file']}")
+    
+    print("\n✅ Índice de similaridade pronto!")
+    print(f"📁 Arquivos salvos em: {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
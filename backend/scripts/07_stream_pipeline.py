@@ -0,0 +1,478 @@
+"""
+Script de Pipeline em Streaming: Download → Pré-processamento
+Fases 1+2 sobrepostas: cada gravação baixada é processada imediatamente
+
+Autor: Projeto BioAcustic
+Data: Novembro 2025
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict
+from pipeline_utils import import_script
+import warnings
+warnings.filterwarnings('ignore')
+
+
+# Preprocessador de cada processo do pool (criado uma vez no initializer)
+_WORKER_PREPROCESSOR = None
+
+
+def _init_process_worker(preprocessor_config: dict):
+    global _WORKER_PREPROCESSOR
+    preprocessing = import_script('02_preprocess_audio')
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull  # Configuração já impressa pelo processo principal
+        try:
+            _WORKER_PREPROCESSOR = preprocessing.AudioPreprocessor(**preprocessor_config)
+        finally:
+            sys.stdout = stdout
+
+
+def _process_recording(task: dict) -> dict:
+    """
+    Gera os espectrogramas de uma gravação (executado no pool de processos)
+    
+    Args:
+        task: Dicionário com audio_path, output_dir, save_images e overlap
+    
+    Returns:
+        Dicionário com número de segmentos e tempo de processamento
+    """
+    start = time.perf_counter()
+    # load_audio devolve None em vez de propagar o erro: um download
+    # corrompido não pode ser registrado como processado com 0 segmentos
+    audio, _ = _WORKER_PREPROCESSOR.load_audio(task['audio_path'])
+    if audio is None:
+        raise RuntimeError(f"Falha ao decodificar {Path(task['audio_path']).name}")
+    
+    n_segments = _WORKER_PREPROCESSOR.process_audio_file(
+        task['audio_path'],
+        task['output_dir'],
+        save_images=task['save_images'],
+        overlap=task['overlap'],
+        audio=audio
+    )
+    return {'segments': n_segments, 'seconds': time.perf_counter() - start}
+
+
+class RecordingLedger:
+    """
+    Registro de conclusão por gravação (JSON Lines, apenas acréscimos)
+    
+    Cada linha registra um estado ('downloaded', 'processed', 'failed') de
+    uma gravação; ao reiniciar, o último estado de cada uma define o que
+    ainda falta fazer. Uma interrupção perde no máximo a linha em escrita.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Inicializa o ledger, carregando o estado de execuções anteriores
+        
+        Args:
+            path: Caminho do arquivo .jsonl
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.entries = {}
+        
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Linha truncada por uma interrupção
+                    self.entries[entry['key']] = entry
+            # Garante que a próxima linha não se junte a uma linha truncada
+            with open(self.path, 'rb+') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+    
+    def status(self, key: str) -> str:
+        """
+        Último estado registrado da gravação (None se nunca vista)
+        """
+        entry = self.entries.get(key)
+        return entry['state'] if entry else None
+    
+    def mark(self, key: str, state: str, **info):
+        """
+        Registra um novo estado da gravação
+        
+        Args:
+            key: Identificador 'Especie/XC123'
+            state: 'downloaded', 'processed' ou 'failed'
+            **info: Campos extras (segmentos, etapa do erro, ...)
+        """
+        entry = {'key': key, 'state': state, 'time': time.time(), **info}
+        with self.lock:
+            self.entries[key] = entry
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def counts(self) -> Dict[str, int]:
+        """
+        Número de gravações em cada estado
+        """
+        counts = {}
+        for entry in self.entries.values():
+            counts[entry['state']] = counts.get(entry['state'], 0) + 1
+        return counts
+
+
+class StreamingPipeline:
+    """
+    Download e pré-processamento sobrepostos com filas limitadas
+    
+    Threads de download (E/S) alimentam uma fila limitada; threads
+    consumidoras enviam cada gravação para um pool de processos que roda
+    AudioPreprocessor.process_audio_file. Com a fila cheia os downloads
+    esperam (backpressure), então o disco e a memória ficam limitados e o
+    tempo total tende ao máximo das duas etapas, não à soma.
+    """
+    
+    def __init__(self,
+                 raw_dir: str,
+                 output_dir: str,
+                 preprocessor_config: dict = None,
+                 n_download_workers: int = 2,
+                 n_process_workers: int = None,
+                 queue_size: int = 8,
+                 rate_limit: float = 0.5,
+                 save_images: bool = False,
+                 overlap: float = 0.0,
+                 ledger_path: str = None):
+        """
+        Inicializa o pipeline
+        
+        Args:
+            raw_dir: Diretório dos áudios baixados (pastas por espécie)
+            output_dir: Diretório dos espectrogramas (pastas por espécie)
+            preprocessor_config: Argumentos de AudioPreprocessor
+            n_download_workers: Downloads simultâneos
+            n_process_workers: Processos de pré-processamento (padrão: CPUs - 1)
+            queue_size: Gravações baixadas aguardando processamento (backpressure)
+            rate_limit: Pausa (s) de cada thread de download entre gravações
+            save_images: Se deve salvar PNGs dos espectrogramas
+            overlap: Sobreposição da segmentação
+            ledger_path: Arquivo de conclusão por gravação (padrão: em output_dir)
+        """
+        downloading = import_script('01_download_data')
+        preprocessing = import_script('02_preprocess_audio')
+        
+        self.downloader = downloading.XenoCantoDownloader(output_dir=raw_dir)
+        self.preprocessor_config = preprocessor_config or {}
+        # Valida e imprime a configuração
+        self.preprocessing_config = preprocessing.AudioPreprocessor(**self.preprocessor_config).describe()
+        
+        self.raw_dir = Path(raw_dir)
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.n_download_workers = n_download_workers
+        self.n_process_workers = n_process_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.queue_size = queue_size
+        self.rate_limit = rate_limit
+        self.save_images = save_images
+        self.overlap = overlap
+        self.ledger = RecordingLedger(ledger_path or self.output_dir / 'pipeline_ledger.jsonl')
+        
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'downloaded': 0,
+            'processed': 0,
+            'skipped': 0,
+            'failed': 0,
+            'segments': 0,
+            'download_seconds': 0.0,
+            'process_seconds': 0.0,
+            'queue_wait_seconds': 0.0
+        }
+    
+    def _add_stats(self, **values):
+        with self.stats_lock:
+            for key, value in values.items():
+                self.stats[key] += value
+    
+    @staticmethod
+    def recording_key(species_safe_name: str, recording: Dict) -> str:
+        return f"{species_safe_name}/XC{recording.get('id')}"
+    
+    def plan(self, species_list: List[str], recordings_per_species: int,
+             country: str = "Brazil", quality: str = "A") -> List[Dict]:
+        """
+        Busca as gravações e separa o que ainda falta fazer
+        
+        Returns:
+            Lista de tarefas {key, species, recording, species_dir, downloaded}
+        """
+        tasks = []
+        for species in species_list:
+            species_safe_name = species.replace(" ", "_")
+            species_dir = self.raw_dir / species_safe_name
+            species_dir.mkdir(parents=True, exist_ok=True)
+            
+            recordings = self.downloader.search_species(
+                species, country=country, quality=quality, max_results=recordings_per_species
+            )
+            for recording in recordings:
+                key = self.recording_key(species_safe_name, recording)
+                status = self.ledger.status(key)
+                if status == 'processed':
+                    self._add_stats(skipped=1)
+                    continue
+                tasks.append({
+                    'key': key,
+                    'species': species_safe_name,
+                    'recording': recording,
+                    'species_dir': species_dir,
+                    'downloaded': status == 'downloaded'
+                })
+        
+        print(f"\n📋 {len(tasks)} gravações a fazer ({self.stats['skipped']} já concluídas)")
+        return tasks
+    
+    def _audio_path(self, task: Dict) -> Path:
+        return task['species_dir'] / f"XC{task['recording'].get('id')}.mp3"
+    
+    def _download_worker(self, tasks: queue.Queue, ready: queue.Queue):
+        """
+        Baixa gravações e as coloca na fila de processamento
+        """
+        while True:
+            try:
+                task = tasks.get_nowait()
+            except queue.Empty:
+                return
+            
+            audio_path = self._audio_path(task)
+            if not task['downloaded']:
+                # Áudio sem o JSON de metadados = download interrompido
+                metadata_path = audio_path.with_name(f"{audio_path.stem}_metadata.json")
+                if audio_path.exists() and not metadata_path.exists():
+                    audio_path.unlink()
+                
+                start = time.perf_counter()
+                ok = self.downloader.download_recording(task['recording'], task['species_dir'])
+                self._add_stats(download_seconds=time.perf_counter() - start)
+                
+                if not ok:
+                    self.ledger.mark(task['key'], 'failed', stage='download')
+                    self._add_stats(failed=1)
+                    continue
+                
+                self.ledger.mark(task['key'], 'downloaded')
+                self._add_stats(downloaded=1)
+                time.sleep(self.rate_limit)  # Ser gentil com o servidor
+            
+            # Bloqueia enquanto a fila está cheia (backpressure)
+            start = time.perf_counter()
+            ready.put(task)
+            self._add_stats(queue_wait_seconds=time.perf_counter() - start)
+    
+    def _process_consumer(self, ready: queue.Queue, pool: ProcessPoolExecutor, progress):
+        """
+        Envia gravações baixadas ao pool e registra a conclusão
+        """
+        while True:
+            task = ready.get()
+            if task is None:
+                return
+            
+            try:
+                result = pool.submit(_process_recording, {
+                    'audio_path': str(self._audio_path(task)),
+                    'output_dir': str(self.output_dir / task['species']),
+                    'save_images': self.save_images,
+                    'overlap': self.overlap
+                }).result()
+            except Exception as e:
+                print(f"❌ Erro ao processar {task['key']}: {e}")
+                self.ledger.mark(task['key'], 'failed', stage='process', error=str(e))
+                self._add_stats(failed=1)
+            else:
+                self.ledger.mark(task['key'], 'processed', segments=result['segments'])
+                self._add_stats(processed=1, segments=result['segments'],
+                                process_seconds=result['seconds'])
+            progress()
+    
+    def preprocessing_summary(self) -> dict:
+        """
+        Resumo no formato de AudioPreprocessor.process_dataset (lido pelo treino)
+        
+        Conta todas as gravações processadas do ledger, incluindo execuções
+        anteriores, pois todas estão no mesmo diretório de saída.
+        
+        Returns:
+            Dicionário com config, species, audio_files, spectrograms_generated
+            e total_spectrograms
+        """
+        per_species = {}
+        for entry in self.ledger.entries.values():
+            if entry['state'] != 'processed':
+                continue
+            species = entry['key'].split('/')[0]
+            files, segments = per_species.get(species, (0, 0))
+            per_species[species] = (files + 1, segments + entry.get('segments', 0))
+        
+        species = sorted(per_species)
+        return {
+            'config': self.preprocessing_config,
+            'species': species,
+            'audio_files': [per_species[name][0] for name in species],
+            'spectrograms_generated': [per_species[name][1] for name in species],
+            'total_spectrograms': sum(per_species[name][1] for name in species)
+        }
+    
+    def run(self, species_list: List[str], recordings_per_species: int = 50,
+            country: str = "Brazil", quality: str = "A") -> dict:
+        """
+        Executa download e pré-processamento em streaming
+        
+        Args:
+            species_list: Espécies a baixar
+            recordings_per_species: Gravações por espécie
+            country: País
+            quality: Qualidade mínima
+        
+        Returns:
+            Dicionário com estatísticas da execução
+        """
+        from tqdm import tqdm
+        
+        wall_start = time.perf_counter()
+        tasks = self.plan(species_list, recordings_per_species, country, quality)
+        
+        pending = queue.Queue()
+        for task in tasks:
+            pending.put(task)
+        ready = queue.Queue(maxsize=self.queue_size)
+        
+        print(f"🚚 {self.n_download_workers} downloads simultâneos → fila de {self.queue_size} → "
+              f"{self.n_process_workers} processos")
+        
+        bar = tqdm(total=len(tasks), desc="Gravações")
+        bar_lock = threading.Lock()
+        
+        def progress():
+            with bar_lock:
+                bar.update(1)
+        
+        with ProcessPoolExecutor(max_workers=self.n_process_workers,
+                                 initializer=_init_process_worker,
+                                 initargs=(self.preprocessor_config,)) as pool:
+            consumers = [threading.Thread(target=self._process_consumer, args=(ready, pool, progress), daemon=True)
+                         for _ in range(self.n_process_workers)]
+            downloaders = [threading.Thread(target=self._download_worker, args=(pending, ready), daemon=True)
+                           for _ in range(self.n_download_workers)]
+            
+            for thread in consumers + downloaders:
+                thread.start()
+            for thread in downloaders:
+                thread.join()
+            
+            # Downloads terminados: um sinal de fim para cada consumidor
+            for _ in consumers:
+                ready.put(None)
+            for thread in consumers:
+                thread.join()
+        
+        bar.close()
+        
+        stats = dict(self.stats)
+        stats['wall_seconds'] = time.perf_counter() - wall_start
+        stats['ledger'] = self.ledger.counts()
+        
+        # Tempo das etapas normalizado pelo paralelismo de cada uma
+        download_stage = stats['download_seconds'] / self.n_download_workers
+        process_stage = stats['process_seconds'] / self.n_process_workers
+        stats['overlap_efficiency'] = (max(download_stage, process_stage) / stats['wall_seconds']
+                                       if stats['wall_seconds'] > 0 else 0.0)
+        
+        with open(self.output_dir / 'pipeline_summary.json', 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+        with open(self.output_dir / 'preprocessing_summary.json', 'w', encoding='utf-8') as f:
+            json.dump(self.preprocessing_summary(), f, indent=2)
+        
+        print("\n" + "="*60)
+        print("📊 RESUMO DO PIPELINE")
+        print("="*60)
+        print(f"Baixadas:     {stats['downloaded']}")
+        print(f"Processadas:  {stats['processed']} ({stats['segments']} espectrogramas)")
+        print(f"Já concluídas: {stats['skipped']}")
+        print(f"Falhas:       {stats['failed']}")
+        print(f"Tempo total:  {stats['wall_seconds']:.0f}s "
+              f"(download ~{download_stage:.0f}s, processamento ~{process_stage:.0f}s)")
+        print(f"Espera na fila cheia: {stats['queue_wait_seconds']:.0f}s")
+        
+        return stats
+
+
+def main():
+    """
+    Função principal do pipeline em streaming
+    """
+    # Lista de espécies alvo (mesma de 01_download_data.py)
+    SPECIES_LIST = [
+        "Boana faber",
+        "Boana albopunctata",
+        "Scinax fuscomarginatus",
+        "Dendropsophus minutus",
+        "Leptodactylus fuscus",
+        "Physalaemus cuvieri",
+        "Rhinella ornata",
+        "Hypsiboas lundii"
+    ]
+    
+    # Configurações
+    RAW_DIR = "./backend/data/raw"
+    OUTPUT_DIR = "./backend/data/processed/spectrograms"
+    RECORDINGS_PER_SPECIES = 50
+    
+    # Paralelismo
+    N_DOWNLOAD_WORKERS = 2
+    N_PROCESS_WORKERS = None  # None = CPUs - 1
+    QUEUE_SIZE = 8  # Gravações baixadas aguardando processamento
+    
+    print("🐸 Sistema de Classificação de Anfíbios - Pipeline em Streaming")
+    print("="*60)
+    
+    pipeline = StreamingPipeline(
+        raw_dir=RAW_DIR,
+        output_dir=OUTPUT_DIR,
+        preprocessor_config={
+            'sample_rate': 22050,
+            'duration': 3.0,
+            'n_mels': 128,
+            'n_fft': 2048,
+            'hop_length': 512,
+            'fmin': 50.0,
+            'fmax': 8000.0
+        },
+        n_download_workers=N_DOWNLOAD_WORKERS,
+        n_process_workers=N_PROCESS_WORKERS,
+        queue_size=QUEUE_SIZE,
+        save_images=False,
+        overlap=0.0
+    )
+    pipeline.run(SPECIES_LIST, recordings_per_species=RECORDINGS_PER_SPECIES)
+    
+    print("\n✅ Pipeline completo! Execute novamente para retomar gravações pendentes.")
+    print(f"📁 Áudios: {RAW_DIR}")
+    print(f"📁 Espectrogramas: {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+Script de Deduplicação de Gravações por Fingerprint de Áudio
+Fase 1b: Encontrar re-uploads e trechos sobrepostos antes do pré-processamento
+
+Autor: Projeto BioAcustic
+Data: Novembro 2025
+"""
+
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple
+import numpy as np
+from tqdm import tqdm
+import warnings
+warnings.filterwarnings('ignore')
+
+
+# Parâmetros do fingerprint (fixos: mudá-los invalida o cache)
+FINGERPRINT_SR = 16000
+FINGERPRINT_N_FFT = 1024
+FINGERPRINT_HOP = 512
+PEAK_NEIGHBORHOOD = (15, 11)  # (bins de frequência, frames)
+PEAKS_PER_SECOND = 15
+FAN_OUT = 5
+MAX_DT = 63  # 6 bits
+
+
+def file_checksum(file_path: str) -> str:
+    """
+    SHA-1 do conteúdo do arquivo
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compute_fingerprint(y: np.ndarray, sr: int = FINGERPRINT_SR) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula hashes de landmarks (pares de picos espectrais)
+    
+    Cada pico âncora é combinado com os FAN_OUT picos seguintes; o hash
+    codifica (freq. âncora, freq. alvo, Δt) em 24 bits e é robusto a
+    reencoding e ganho. O tempo da âncora permite votar no deslocamento.
+    
+    Args:
+        y: Áudio mono em `sr` Hz
+        sr: Taxa de amostragem
+    
+    Returns:
+        Tupla (hashes uint32, tempos da âncora em frames uint32)
+    """
+    import librosa
+    from scipy.ndimage import maximum_filter
+    
+    empty = (np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32))
+    if len(y) < FINGERPRINT_N_FFT:
+        return empty
+    
+    S_db = librosa.amplitude_to_db(
+        np.abs(librosa.stft(y, n_fft=FINGERPRINT_N_FFT, hop_length=FINGERPRINT_HOP)), ref=np.max
+    )
+    peaks = (maximum_filter(S_db, size=PEAK_NEIGHBORHOOD) == S_db) & (S_db > -60)
+    freqs, times = np.nonzero(peaks)
+    if len(times) < 2:
+        return empty
+    
+    # Limitar a densidade: picos mais fortes primeiro
+    max_peaks = max(2, int(PEAKS_PER_SECOND * len(y) / sr))
+    if len(times) > max_peaks:
+        strongest = np.argsort(S_db[freqs, times])[::-1][:max_peaks]
+        freqs, times = freqs[strongest], times[strongest]
+    order = np.lexsort((freqs, times))
+    freqs = np.minimum(freqs[order], 511).astype(np.uint32)
+    times = times[order].astype(np.uint32)
+    
+    hashes, anchors = [], []
+    for k in range(1, FAN_OUT + 1):
+        dt = times[k:] - times[:-k]
+        valid = (dt > 0) & (dt <= MAX_DT)
+        hashes.append((freqs[:-k][valid] << 15) | (freqs[k:][valid] << 6) | dt[valid])
+        anchors.append(times[:-k][valid])
+    
+    return np.concatenate(hashes).astype(np.uint32), np.concatenate(anchors).astype(np.uint32)
+
+
+def _fingerprint_file(task: Tuple[str, str]) -> Dict:
+    """
+    Fingerprint de um arquivo, com cache por checksum (executado no pool)
+    
+    Args:
+        task: (caminho do áudio, diretório do cache ou '')
+    """
+    audio_path, cache_dir = task
+    checksum = file_checksum(audio_path)
+    cache_path = Path(cache_dir) / f"{checksum}.npz" if cache_dir else None
+    
+    if cache_path is not None and cache_path.exists():
+        with np.load(cache_path) as cached:
+            return {'file': audio_path, 'checksum': checksum, 'hashes': cached['hashes'],
+                    'times': cached['times'], 'duration': float(cached['duration'])}
+    
+    import librosa
+    try:
+        y, _ = librosa.load(audio_path, sr=FINGERPRINT_SR)
+    except Exception as e:
+        return {'file': audio_path, 'checksum': checksum, 'error': str(e)}
+    
+    hashes, times = compute_fingerprint(y)
+    duration = len(y) / FINGERPRINT_SR
+    
+    if cache_path is not None:
+        tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp_path, hashes=hashes, times=times, duration=duration)
+        os.replace(tmp_path, cache_path)
+    
+    return {'file': audio_path, 'checksum': checksum, 'hashes': hashes,
+            'times': times, 'duration': duration}
+
+
+class AudioDeduplicator:
+    """
+    Encontra gravações duplicadas ou sobrepostas no corpus bruto
+    
+    Duplicatas exatas são detectadas pelo checksum do arquivo. Para as
+    quase-duplicatas (re-upload reencodado, trecho de outra gravação), os
+    hashes de landmarks de todas as gravações vão para um índice invertido
+    (arrays ordenados por hash); cada par de gravações que compartilha um
+    hash vota no deslocamento temporal entre elas, e um pico de votos num
+    único deslocamento indica o mesmo áudio.
+    """
+    
+    def __init__(self,
+                 n_workers: int = None,
+                 cache_dir: str = None,
+                 min_votes: int = 15,
+                 min_containment: float = 0.15,
+                 max_postings: int = 64,
+                 max_repeats: int = 16):
+        """
+        Inicializa o deduplicador
+        
+        Args:
+            n_workers: Processos para os fingerprints (padrão: todos os núcleos)
+            cache_dir: Cache dos fingerprints por checksum (None = sem cache)
+            min_votes: Votos mínimos no melhor deslocamento
+            min_containment: Fração mínima dos hashes da gravação menor alinhados
+            max_postings: Hashes presentes em mais gravações são ignorados (ruído comum)
+            max_repeats: Ocorrências de um hash mantidas por gravação (cantos repetitivos)
+        """
+        self.n_workers = n_workers
+        self.cache_dir = cache_dir
+        self.min_votes = min_votes
+        self.min_containment = min_containment
+        self.max_postings = max_postings
+        self.max_repeats = max_repeats
+        
+        if cache_dir:
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    
+    def fingerprint(self, audio_files: List[Path]) -> List[Dict]:
+        """
+        Calcula os fingerprints em paralelo
+        
+        Args:
+            audio_files: Arquivos de áudio
+        
+        Returns:
+            Lista de fingerprints (na ordem dos arquivos)
+        """
+        tasks = [(str(f), self.cache_dir or '') for f in audio_files]
+        chunksize = max(1, len(tasks) // (8 * (self.n_workers or os.cpu_count() or 1)))
+        
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            results = list(tqdm(executor.map(_fingerprint_file, tasks, chunksize=chunksize),
+                                total=len(tasks), desc="Fingerprints"))
+        
+        for result in results:
+            if 'error' in result:
+                print(f"❌ Erro ao carregar {result['file']}: {result['error']}")
+        return results
+    
+    def match(self, fingerprints: List[Dict]) -> List[Dict]:
+        """
+        Encontra pares de gravações com o mesmo áudio (votação de deslocamento)
+        
+        Args:
+            fingerprints: Resultado de fingerprint()
+        
+        Returns:
+            Lista de pares {a, b, votes, containment, offset_s}
+        """
+        n_hashes = np.array([len(fp.get('hashes', ())) for fp in fingerprints])
+        if n_hashes.sum() == 0:
+            return []
+        
+        # Índice invertido: todos os hashes ordenados (hash, gravação, tempo)
+        hashes = np.concatenate([fp['hashes'] for fp in fingerprints if 'hashes' in fp])
+        times = np.concatenate([fp['times'] for fp in fingerprints if 'hashes' in fp]).astype(np.int64)
+        recs = np.repeat(np.arange(len(fingerprints)), n_hashes)
+        
+        order = np.lexsort((times, recs, hashes))
+        hashes, recs, times = hashes[order], recs[order], times[order]
+        
+        # Ignorar hashes presentes em muitas gravações distintas (ruído comum);
+        # repetições dentro de uma gravação não contam, apenas são limitadas
+        new_hash = np.r_[True, hashes[1:] != hashes[:-1]]
+        new_group = new_hash | np.r_[True, recs[1:] != recs[:-1]]
+        hash_id = np.cumsum(new_hash) - 1
+        recs_per_hash = np.bincount(hash_id, weights=new_group)
+        group_start = np.maximum.accumulate(np.where(new_group, np.arange(len(hashes)), 0))
+        keep = (recs_per_hash[hash_id] <= self.max_postings) & \
+               (np.arange(len(hashes)) - group_start < self.max_repeats)
+        hashes, recs, times = hashes[keep], recs[keep], times[keep]
+        if len(hashes) < 2:
+            return []
+        
+        # Todos os pares de postings de cada hash (i < j na lista ordenada)
+        new_hash = np.r_[True, hashes[1:] != hashes[:-1]]
+        hash_start = np.flatnonzero(new_hash)
+        sizes = np.diff(np.r_[hash_start, len(hashes)])
+        n_after = np.repeat(hash_start + sizes, sizes) - np.arange(len(hashes)) - 1
+        left = np.repeat(np.arange(len(hashes)), n_after)
+        right = left + 1 + np.arange(len(left)) - np.repeat(np.cumsum(n_after) - n_after, n_after)
+        
+        # Ordenação por gravação: recs[left] < recs[right] quando diferem
+        cross = recs[left] != recs[right]
+        left, right = left[cross], right[cross]
+        if len(left) == 0:
+            return []
+        
+        n_recs = len(fingerprints)
+        pair_keys = recs[left].astype(np.int64) * n_recs + recs[right]
+        offsets = times[right] - times[left]
+        
+        # Tolerância de ±1 frame: cada par de postings vota no seu deslocamento
+        # e nos vizinhos (cópia central = votos exatos)
+        n_exact = len(pair_keys)
+        pair_keys = np.tile(pair_keys, 3)
+        offsets = np.concatenate([offsets - 1, offsets, offsets + 1])
+        left, right = np.tile(left, 3), np.tile(right, 3)
+        
+        # Cada posting conta no máximo um voto por (par, deslocamento): m
+        # repetições contra n não geram m×n votos
+        shift = offsets.min()
+        span = int(offsets.max() - shift) + 1
+        cells = pair_keys * span + (offsets - shift)
+        votes_keys, votes = self._cell_votes(cells, left, right)
+        exact_keys, exact_votes = self._cell_votes(cells[n_exact:2 * n_exact],
+                                                   left[n_exact:2 * n_exact],
+                                                   right[n_exact:2 * n_exact])
+        exact = np.zeros(len(votes_keys), dtype=np.int64)
+        exact[np.searchsorted(votes_keys, exact_keys)] = exact_votes
+        
+        # Melhor deslocamento de cada par: mais votos e, no empate criado pela
+        # tolerância (deslocamento real e vizinhos), mais votos exatos
+        unique_pairs, pair_idx = np.unique(votes_keys // span, return_inverse=True)
+        ranked = np.lexsort((exact, votes, pair_idx))
+        chosen = ranked[np.r_[pair_idx[ranked][1:] != pair_idx[ranked][:-1], True]]
+        best = votes[chosen]
+        best_offset = (votes_keys[chosen] % span) + shift
+        
+        matches = []
+        for key, n_votes, offset in zip(unique_pairs, best, best_offset):
+            a, b = divmod(int(key), n_recs)
+            containment = n_votes / max(1, min(n_hashes[a], n_hashes[b]))
+            if n_votes >= self.min_votes and containment >= self.min_containment:
+                matches.append({
+                    'a': a,
+                    'b': b,
+                    'votes': int(n_votes),
+                    'containment': float(containment),
+                    'offset_s': float(offset * FINGERPRINT_HOP / FINGERPRINT_SR)
+                })
+        return matches
+    
+    @staticmethod
+    def _cell_votes(cells: np.ndarray, left: np.ndarray, right: np.ndarray):
+        """
+        Votos por célula (par, deslocamento): postings distintos do lado com menos
+        """
+        distinct_left = np.unique(np.stack([cells, left], axis=1), axis=0)[:, 0]
+        distinct_right = np.unique(np.stack([cells, right], axis=1), axis=0)[:, 0]
+        keys, left_votes = np.unique(distinct_left, return_counts=True)
+        _, right_votes = np.unique(distinct_right, return_counts=True)
+        return keys, np.minimum(left_votes, right_votes)
+    
+    def find_duplicates(self, raw_dir: str) -> Dict:
+        """
+        Executa fingerprint + correspondência sobre data/raw e agrupa duplicatas
+        
+        Em cada grupo é mantida a gravação mais longa (mais conteúdo); as
+        demais entram na lista 'exclude', lida por 02_preprocess_audio.
+        
+        Args:
+            raw_dir: Diretório com pastas de espécies
+        
+        Returns:
+            Relatório {config, groups, exclude, stats}
+        """
+        start = time.perf_counter()
+        raw_path = Path(raw_dir)
+        audio_files = sorted(f for ext in ("*.mp3", "*.wav", "*.flac") for f in raw_path.glob(f"*/{ext}"))
+        print(f"\n🔎 {len(audio_files)} gravações em {raw_dir}")
+        
+        fingerprints = self.fingerprint(audio_files)
+        names = [str(Path(fp['file']).relative_to(raw_path)).replace(os.sep, '/') for fp in fingerprints]
+        
+        # Duplicatas exatas (mesmo conteúdo) e quase-duplicatas (landmarks)
+        edges = []
+        by_checksum = {}
+        for i, fp in enumerate(fingerprints):
+            by_checksum.setdefault(fp['checksum'], []).append(i)
+        for group in by_checksum.values():
+            edges += [(group[0], j, {'type': 'exact'}) for j in group[1:]]
+        
+        for m in self.match(fingerprints):
+            if fingerprints[m['a']]['checksum'] != fingerprints[m['b']]['checksum']:
+                edges.append((m['a'], m['b'], {'type': 'near', 'votes': m['votes'],
+                                               'containment': round(m['containment'], 3),
+                                               'offset_s': round(m['offset_s'], 2)}))
+        
+        # Componentes conexos (union-find)
+        parent = list(range(len(fingerprints)))
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        for a, b, _ in edges:
+            parent[find(a)] = find(b)
+        
+        components = {}
+        for a, b, info in edges:
+            components.setdefault(find(a), []).append((a, b, info))
+        
+        groups, exclude = [], []
+        for component in components.values():
+            members = sorted({i for a, b, _ in component for i in (a, b)})
+            keep = max(members, key=lambda i: (fingerprints[i].get('duration', 0.0), -i))
+            species = sorted({names[i].split('/')[0] for i in members})
+            groups.append({
+                'keep': names[keep],
+                'members': [names[i] for i in members],
+                'species': species,
+                'cross_species': len(species) > 1,
+                'matches': [{'a': names[a], 'b': names[b], **info} for a, b, info in component]
+            })
+            exclude += [names[i] for i in members if i != keep]
+        
+        report = {
+            'config': {
+                'sample_rate': FINGERPRINT_SR,
+                'min_votes': self.min_votes,
+                'min_containment': self.min_containment,
+                'max_postings': self.max_postings,
+                'max_repeats': self.max_repeats
+            },
+            'groups': groups,
+            'exclude': sorted(exclude),
+            'stats': {
+                'recordings': len(audio_files),
+                'errors': sum('error' in fp for fp in fingerprints),
+                'exact_pairs': sum(info['type'] == 'exact' for _, _, info in edges),
+                'near_pairs': sum(info['type'] == 'near' for _, _, info in edges),
+                'groups': len(groups),
+                'cross_species_groups': sum(g['cross_species'] for g in groups),
+                'excluded': len(exclude),
+                'seconds': time.perf_counter() - start
+            }
+        }
+        return report
+
+
+def main():
+    """
+    Função principal da deduplicação
+    """
+    # Configurações
+    RAW_DIR = "./backend/data/raw"
+    CACHE_DIR = "./backend/data/cache/fingerprints"
+    REPORT_PATH = "./backend/data/raw/duplicates.json"  # Lido por 02_preprocess_audio
+    
+    # Correspondência
+    MIN_VOTES = 15
+    MIN_CONTAINMENT = 0.15
+    
+    print("🐸 Sistema de Classificação de Anfíbios - Deduplicação de Gravações")
+    print("="*60)
+    
+    deduplicator = AudioDeduplicator(
+        cache_dir=CACHE_DIR,
+        min_votes=MIN_VOTES,
+        min_containment=MIN_CONTAINMENT
+    )
+    report = deduplicator.find_duplicates(RAW_DIR)
+    
+    with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    
+    stats = report['stats']
+    print("\n" + "="*60)
+    print("📊 RESUMO DA DEDUPLICAÇÃO")
+    print("="*60)
+    print(f"Gravações:           {stats['recordings']}")
+    print(f"Pares exatos:        {stats['exact_pairs']}")
+    print(f"Pares sobrepostos:   {stats['near_pairs']}")
+    print(f"Grupos:              {stats['groups']} ({stats['cross_species_groups']} com espécies diferentes)")
+    print(f"Excluídas:           {stats['excluded']}")
+    print(f"Tempo:               {stats['seconds']:.0f}s")
+    
+    for group in report['groups']:
+        if group['cross_species']:
+            print(f"⚠️  Mesmo áudio em espécies diferentes: {', '.join(group['members'])}")
+    
+    print(f"\n✅ Relatório salvo em: {REPORT_PATH}")
+    print("   02_preprocess_audio.py ignora as gravações em 'exclude'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Utilitários compartilhados pelos scripts do pipeline
+
+Autor: Projeto BioAcustic
+Data: Novembro 2025
+"""
+
+import sys
+import importlib
+from pathlib import Path
+
+
+def import_script(name: str):
+    """
+    Importa um dos scripts numerados do pipeline (ex: '02_preprocess_audio')
+    
+    Nomes que começam com dígito não podem ser usados em `import`; o
+    diretório dos scripts entra no sys.path e o módulo é carregado pelo nome.
+    
+    Args:
+        name: Nome do módulo sem extensão
+    
+    Returns:
+        Módulo importado
+    """
+    scripts_dir = str(Path(__file__).resolve().parent)
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    return importlib.import_module(name)
@@ -344,20 +344,22 @@ class BioAcusticApp {
             // Por enquanto, vamos assumir que audio.js produz o tamanho correto
         }
         
-        const tensorData = new Float32Array(1 * height * targetWidth * 3);
+        // Modelos destilados (student) usam um único canal
+        const channels = this.modelManager.model.inputs[0].shape[3] || 3;
+        const tensorData = new Float32Array(1 * height * targetWidth * channels);
         
         for (let i = 0; i < height; i++) {
             for (let j = 0; j < targetWidth; j++) {
-                const idx = (i * targetWidth + j) * 3;
+                const idx = (i * targetWidth + j) * channels;
                 // Usar valor ou 0 se o espectrograma for menor
                 const value = (normalized[i] && normalized[i][j]) ? normalized[i][j] : 0;
-                tensorData[idx] = value;     // R
-                tensorData[idx + 1] = value; // G
-                tensorData[idx + 2] = value; // B
+                for (let c = 0; c < channels; c++) {
+                    tensorData[idx + c] = value; // Mesmo valor em todos os canais
+                }
             }
         }
         
-        return tf.tensor4d(tensorData, [1, height, targetWidth, 3]);
+        return tf.tensor4d(tensorData, [1, height, targetWidth, channels]);
     }
     
     normalizeSpectrogram(spec) {
@@ -43,8 +43,10 @@ export class ModelManager {
                 throw new Error('DEMO_MODE');
             }
             
-            // Carregar modelo
-            this.model = await tf.loadLayersModel(modelPath);
+            // Carregar modelo (grafo congelado ou modelo de camadas)
+            this.model = this.metadata.modelInfo?.format === 'graph'
+                ? await tf.loadGraphModel(modelPath)
+                : await tf.loadLayersModel(modelPath);
             
             // Warmup (primeira inferência é sempre mais lenta)
             await this.warmup();
@@ -181,6 +183,13 @@ export class ModelManager {
         // Ordenar por probabilidade (maior primeiro)
         results.sort((a, b) => b.probability - a.probability);
         
+        // Open-set: limiar calibrado no treino (metadata.openSet)
+        const openSet = this.metadata?.openSet;
+        if (openSet && results.length > 0 && results[0].probability < openSet.threshold) {
+            console.warn(`⚠️ Probabilidade máxima abaixo do limiar open-set (${openSet.threshold.toFixed(3)}): possível espécie desconhecida.`);
+            results[0].possibleUnknown = true;
+        }
+        
         // Filtrar por threshold e retornar top K
         const filtered = results.filter(r => r.passedThreshold);
         
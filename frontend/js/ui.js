@@ -312,10 +312,11 @@ export class UIManager {
 
         // Construir HTML do card
         let cardHTML = '';
+        let alertsHTML = '';
         
         // Adicionar aviso de baixa confiança se presente
         if (prediction.lowConfidence) {
-            cardHTML += `
+            alertsHTML += `
                 <div style="background: linear-gradient(135deg, #fef3c7 0%, #fde68a 100%); border-bottom: 3px solid #f59e0b; padding: 16px;">
                     <div style="display: flex; align-items: start; gap: 12px;">
                         <svg style="width: 24px; height: 24px; color: #d97706; flex-shrink: 0; margin-top: 2px;" fill="currentColor" viewBox="0 0 20 20">
@@ -335,6 +336,20 @@ export class UIManager {
             `;
         }
 
+        // Aviso de possível espécie fora do modelo (limiar open-set do metadata.json)
+        if (prediction.possibleUnknown) {
+            alertsHTML += `
+                <div style="background: linear-gradient(135deg, #ede9fe 0%, #ddd6fe 100%); border-bottom: 3px solid #7c3aed; padding: 16px;">
+                    <h4 style="margin: 0 0 6px 0; font-size: 0.95rem; font-weight: 700; color: #5b21b6;">
+                        ❓ Possível Espécie Desconhecida
+                    </h4>
+                    <p style="margin: 0; font-size: 0.875rem; color: #4c1d95; line-height: 1.5;">
+                        A vocalização é diferente das espécies usadas no treinamento. Recomenda-se revisão manual.
+                    </p>
+                </div>
+            `;
+        }
+
         // Se tiver informações da espécie, mostrar com imagem
         if (speciesInfo) {
             const imageDisplay = speciesInfo.imageUrl ? 
@@ -534,7 +549,8 @@ export class UIManager {
             `;
         }
 
-        card.innerHTML = cardHTML;
+        // Avisos acima do card (os blocos acima substituem cardHTML)
+        card.innerHTML = alertsHTML + cardHTML;
         
         // Hover effect
         card.addEventListener('mouseenter', () => {